@@ -3,7 +3,14 @@ from django.utils.html import format_html
 from django.urls import reverse
 import os
 
-from .models import DownloadRequest
+from .models import (
+    DownloadRequest,
+    ImportCheckpoint,
+    ImportRun,
+    ImportSyncState,
+    LocationYearAvailability,
+    ObservationDailyRollup,
+)
 
 
 @admin.register(DownloadRequest)
@@ -155,3 +162,69 @@ class DownloadRequestAdmin(admin.ModelAdmin):
     @admin.display(boolean=True, description="Email Sent")
     def email_sent_flag(self, obj):
         return obj.email_sent
+
+
+@admin.register(ImportSyncState)
+class ImportSyncStateAdmin(admin.ModelAdmin):
+    list_display = (
+        "model",
+        "resource_name",
+        "resource_id",
+        "row_count",
+        "last_offset",
+        "last_modified",
+        "synced_at",
+    )
+    list_filter = ("model",)
+    search_fields = ("resource_id", "resource_name")
+    ordering = ("model", "resource_name")
+
+
+@admin.register(ImportCheckpoint)
+class ImportCheckpointAdmin(admin.ModelAdmin):
+    list_display = (
+        "model",
+        "resource_id",
+        "range_start",
+        "range_end",
+        "next_offset",
+        "rows",
+        "updated_at",
+    )
+    list_filter = ("model",)
+    search_fields = ("resource_id",)
+    ordering = ("model", "resource_id", "range_start")
+
+
+@admin.register(ImportRun)
+class ImportRunAdmin(admin.ModelAdmin):
+    list_display = (
+        "obs_code",
+        "started_at",
+        "status",
+        "dry_run",
+        "rows",
+        "inserted",
+        "updated",
+        "seconds",
+        "rows_per_sec",
+    )
+    list_filter = ("obs_code", "status", "dry_run")
+    ordering = ("-started_at",)
+    readonly_fields = ("options", "stage_seconds", "error_message")
+
+
+@admin.register(ObservationDailyRollup)
+class ObservationDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ("obs_code", "location_id", "date", "record_count")
+    list_filter = ("obs_code",)
+    search_fields = ("location_id",)
+    ordering = ("obs_code", "location_id", "date")
+
+
+@admin.register(LocationYearAvailability)
+class LocationYearAvailabilityAdmin(admin.ModelAdmin):
+    list_display = ("location_id", "year", "obs_code")
+    list_filter = ("obs_code", "year")
+    search_fields = ("location_id",)
+    ordering = ("location_id", "year", "obs_code")
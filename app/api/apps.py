@@ -9,14 +9,12 @@ class ApiConfig(AppConfig):
         """
         Django 啟動時會呼叫這裡，我們在這裡綁 signals。
         """
-        from django.db.models.signals import post_save, post_delete
+        from django.db.models.signals import post_save, post_delete, pre_save
 
         from .models import Location
         from .obs_config import OBS_CONFIG
-        from .tasks import (
-            rebuild_location_map_filter_cache,
-            rebuild_location_map_list_cache,
-        )
+        from .utils.map_cache import request_map_cache_rebuild
+        from .utils.rollup_refresh import queue_rollup_refresh
 
         # 會影響首頁地圖/下拉的所有 models：
         # Location + OBS_CONFIG 裡面的每一個觀測 model
@@ -26,9 +24,9 @@ class ApiConfig(AppConfig):
             """
             只要有相關 model 被新增/更新/刪除，就丟 Celery 去重建 cache。
             這裡不清 cache，讓舊資料繼續用，重建完成後會直接覆蓋。
+            逐筆異動會被 debounce，批次操作期間則延到結束時只重建一次。
             """
-            rebuild_location_map_filter_cache.delay()
-            rebuild_location_map_list_cache.delay()
+            request_map_cache_rebuild()
 
         for model in tracked_models:
             post_save.connect(
@@ -41,3 +39,48 @@ class ApiConfig(AppConfig):
                 sender=model,
                 dispatch_uid=f"{model.__name__}_delete_cache_rebuild",
             )
+
+        # 逐筆新增/修改/刪除觀測資料（例如 admin）時，重算該筆所在日期的每日彙總
+        # 與該樣站該年份是否有資料（批次匯入不會觸發 signal，由匯入引擎自行更新）。
+        # 修改時連同修改前的 (樣站, 日期) 一起重算：資料被移到別的樣站 / 日期時，
+        # 原本那天的彙總也要更新。同一個 transaction 內的異動在 commit 後合併重算一次
+        def _make_rollup_refresh(code, date_field):
+            def _remember_key(sender, instance, **kwargs):
+                instance._rollup_key_before = (
+                    sender.objects.filter(pk=instance.pk)
+                    .values_list("locationID", date_field)
+                    .first()
+                    if instance.pk
+                    else None
+                )
+
+            def _refresh_rollup(sender, instance, **kwargs):
+                keys = [(instance.locationID, getattr(instance, date_field))]
+                before = getattr(instance, "_rollup_key_before", None)
+                if before:
+                    keys.append(before)
+                queue_rollup_refresh(code, keys)
+
+            return _remember_key, _refresh_rollup
+
+        for code, cfg in OBS_CONFIG.items():
+            model = cfg["model"]
+            remember, handler = _make_rollup_refresh(code, cfg["date_field"])
+            pre_save.connect(
+                remember,
+                sender=model,
+                weak=False,
+                dispatch_uid=f"{model.__name__}_pre_save_rollup_key",
+            )
+            post_save.connect(
+                handler,
+                sender=model,
+                weak=False,
+                dispatch_uid=f"{model.__name__}_save_rollup_refresh",
+            )
+            post_delete.connect(
+                handler,
+                sender=model,
+                weak=False,
+                dispatch_uid=f"{model.__name__}_delete_rollup_refresh",
+            )
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:06
+
+from django.db import migrations, models
+
+
+# 加 unique constraint 之前先清掉自然鍵重複的舊資料（保留 id 最大的那筆，
+# 與重新匯入時 upsert 的結果相同）。刪除的筆數逐表印出；這一步無法還原。
+DEDUPE_SQL = """
+DELETE FROM {table} a
+USING {table} b
+WHERE {match} AND a.id < b.id;
+"""
+
+
+def dedupe(table, fields):
+    match = " AND ".join(f'a."{f}" = b."{f}"' for f in fields)
+
+    def forwards(apps, schema_editor):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(DEDUPE_SQL.format(table=table, match=match))
+            deleted = cursor.rowcount
+        print(
+            f"\n  {table}: deleted {deleted} duplicate row(s) "
+            f"on ({', '.join(fields)})"
+        )
+
+    def backwards(apps, schema_editor):
+        print(
+            f"\n  WARNING: {table}: duplicate rows deleted by this migration "
+            "cannot be restored; only the unique constraint is removed."
+        )
+
+    return migrations.RunPython(forwards, backwards)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_biosounddatafield_filter_widget_and_more'),
+    ]
+
+    operations = [
+        dedupe('api_biosound', ('eventID', 'dataID')),
+        dedupe('api_birdnetsound', ('eventID', 'dataID')),
+        dedupe('api_cameratrap', ('observationID',)),
+        dedupe('api_plantphenology', ('eventID', 'dataID')),
+        dedupe('api_terresoundindex', ('eventID', 'dataID')),
+        dedupe('api_weather', ('eventID', 'dataID')),
+        migrations.AddConstraint(
+            model_name='biosound',
+            constraint=models.UniqueConstraint(fields=('eventID', 'dataID'), name='api_biosound_event_data_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='birdnetsound',
+            constraint=models.UniqueConstraint(fields=('eventID', 'dataID'), name='api_birdnetsound_event_data_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='cameratrap',
+            constraint=models.UniqueConstraint(fields=('observationID',), name='api_cameratrap_observation_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='plantphenology',
+            constraint=models.UniqueConstraint(fields=('eventID', 'dataID'), name='api_plantphenology_event_data_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='terresoundindex',
+            constraint=models.UniqueConstraint(fields=('eventID', 'dataID'), name='api_terresoundindex_event_data_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='weather',
+            constraint=models.UniqueConstraint(fields=('eventID', 'dataID'), name='api_weather_event_data_uniq'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0026_importer_natural_key_constraints"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportSyncState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "model",
+                    models.CharField(
+                        help_text="匯入目標 model（app_label.Model）", max_length=100
+                    ),
+                ),
+                ("resource_id", models.CharField(max_length=64)),
+                ("resource_name", models.CharField(blank=True, max_length=255)),
+                (
+                    "last_modified",
+                    models.CharField(blank=True, max_length=64, null=True),
+                ),
+                (
+                    "metadata_modified",
+                    models.CharField(blank=True, max_length=64, null=True),
+                ),
+                ("row_count", models.PositiveBigIntegerField(default=0)),
+                ("last_offset", models.PositiveBigIntegerField(default=0)),
+                ("synced_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "ImportSyncState",
+                "verbose_name_plural": "ImportSyncStates",
+                "db_table": "api_import_sync_state",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="importsyncstate",
+            constraint=models.UniqueConstraint(
+                fields=("model", "resource_id"), name="api_import_sync_state_uniq"
+            ),
+        ),
+    ]
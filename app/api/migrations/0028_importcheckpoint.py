@@ -0,0 +1,49 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0027_importsyncstate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(max_length=100)),
+                ("resource_id", models.CharField(max_length=64)),
+                ("range_start", models.PositiveBigIntegerField()),
+                ("range_end", models.PositiveBigIntegerField(blank=True, null=True)),
+                ("next_offset", models.PositiveBigIntegerField()),
+                ("rows", models.PositiveBigIntegerField(default=0)),
+                ("inserted", models.PositiveBigIntegerField(default=0)),
+                ("updated", models.PositiveBigIntegerField(default=0)),
+                ("unchanged", models.PositiveBigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "ImportCheckpoint",
+                "verbose_name_plural": "ImportCheckpoints",
+                "db_table": "api_import_checkpoint",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="importcheckpoint",
+            constraint=models.UniqueConstraint(
+                fields=("model", "resource_id", "range_start"),
+                name="api_import_checkpoint_uniq",
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0028_importcheckpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(max_length=100)),
+                ("obs_code", models.CharField(max_length=50)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("success", "成功"), ("failed", "失敗")], max_length=20
+                    ),
+                ),
+                ("dry_run", models.BooleanField(default=False)),
+                ("options", models.JSONField(blank=True, default=dict)),
+                ("started_at", models.DateTimeField()),
+                ("finished_at", models.DateTimeField()),
+                ("seconds", models.FloatField(default=0)),
+                ("resources", models.PositiveIntegerField(default=0)),
+                ("rows", models.PositiveBigIntegerField(default=0)),
+                ("inserted", models.PositiveBigIntegerField(default=0)),
+                ("updated", models.PositiveBigIntegerField(default=0)),
+                ("unchanged", models.PositiveBigIntegerField(default=0)),
+                ("rows_per_sec", models.FloatField(default=0)),
+                ("stage_seconds", models.JSONField(blank=True, default=dict)),
+                ("error_message", models.TextField(blank=True)),
+            ],
+            options={
+                "verbose_name": "ImportRun",
+                "verbose_name_plural": "ImportRuns",
+                "db_table": "api_import_run",
+                "indexes": [
+                    models.Index(
+                        fields=["obs_code", "started_at"],
+                        name="api_import__obs_cod_3c6f35_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:42
+
+from django.db import migrations, models
+
+# 由既有的觀測資料建立每日彙總（之後由匯入引擎逐日更新）
+BACKFILL_SQL = """
+INSERT INTO api_observation_daily_rollup
+    (obs_code, location_id, date, record_count, {columns})
+SELECT '{code}', "locationID", "{date_field}", COUNT(*), {aggregates}
+FROM {table}
+WHERE "locationID" IS NOT NULL AND "{date_field}" IS NOT NULL
+GROUP BY "locationID", "{date_field}";
+"""
+
+SPECIES = {"species_count": 'COUNT(DISTINCT "scientificName")'}
+
+
+def backfill(code, table, date_field, metrics):
+    return migrations.RunSQL(
+        BACKFILL_SQL.format(
+            code=code,
+            table=table,
+            date_field=date_field,
+            columns=", ".join(metrics),
+            aggregates=", ".join(metrics.values()),
+        ),
+        reverse_sql=migrations.RunSQL.noop,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0029_importrun"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ObservationDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("obs_code", models.CharField(max_length=50)),
+                ("location_id", models.CharField(max_length=128)),
+                ("date", models.DateField()),
+                ("record_count", models.PositiveIntegerField(default=0)),
+                ("species_count", models.PositiveIntegerField(blank=True, null=True)),
+                ("aci", models.FloatField(blank=True, null=True)),
+                ("adi", models.FloatField(blank=True, null=True)),
+                ("bi", models.FloatField(blank=True, null=True)),
+                ("ndsi", models.FloatField(blank=True, null=True)),
+                ("air_temperature", models.FloatField(blank=True, null=True)),
+                ("precipitation", models.FloatField(blank=True, null=True)),
+                ("aci_count", models.PositiveIntegerField(blank=True, null=True)),
+                ("adi_count", models.PositiveIntegerField(blank=True, null=True)),
+                ("bi_count", models.PositiveIntegerField(blank=True, null=True)),
+                ("ndsi_count", models.PositiveIntegerField(blank=True, null=True)),
+                (
+                    "air_temperature_count",
+                    models.PositiveIntegerField(blank=True, null=True),
+                ),
+            ],
+            options={
+                "verbose_name": "ObservationDailyRollup",
+                "verbose_name_plural": "ObservationDailyRollups",
+                "db_table": "api_observation_daily_rollup",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="observationdailyrollup",
+            constraint=models.UniqueConstraint(
+                fields=("obs_code", "location_id", "date"),
+                name="api_observation_daily_rollup_uniq",
+            ),
+        ),
+        backfill("plantphenology", "api_plantphenology", "eventDate", SPECIES),
+        backfill("cameratrap", "api_cameratrap", "eventDate", SPECIES),
+        backfill(
+            "terresoundindex",
+            "api_terresoundindex",
+            "measurementDeterminedDate",
+            {
+                "aci": 'AVG("ACI")',
+                "adi": 'AVG("ADI")',
+                "bi": 'AVG("BI")',
+                "ndsi": 'AVG("NDSI")',
+                "aci_count": 'COUNT("ACI")',
+                "adi_count": 'COUNT("ADI")',
+                "bi_count": 'COUNT("BI")',
+                "ndsi_count": 'COUNT("NDSI")',
+            },
+        ),
+        backfill(
+            "birdnetsound", "api_birdnetsound", "measurementDeterminedDate", SPECIES
+        ),
+        backfill("biosound", "api_biosound", "measurementDeterminedDate", SPECIES),
+        backfill(
+            "weather",
+            "api_weather",
+            "eventDate",
+            {
+                "air_temperature": 'AVG("AirTemperature")',
+                "precipitation": 'SUM("Precipitation")',
+                "air_temperature_count": 'COUNT("AirTemperature")',
+            },
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:43
+
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    RemoveIndexConcurrently,
+)
+from django.db import migrations, models
+
+
+# (locationID, 日期) 複合 index 取代 locationID 單欄 index（前綴相同，可涵蓋原本的查詢）
+# 觀測資料表很大，先建新 index 再移除舊的，並以 CONCURRENTLY 避免鎖住寫入
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("api", "0030_observationdailyrollup"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="biosound",
+            index=models.Index(
+                fields=["locationID", "measurementDeterminedDate"],
+                name="api_biosoun_locatio_68ec0d_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="birdnetsound",
+            index=models.Index(
+                fields=["locationID", "measurementDeterminedDate"],
+                name="api_birdnet_locatio_41cbbd_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="cameratrap",
+            index=models.Index(
+                fields=["locationID", "eventDate"],
+                name="api_camerat_locatio_ef0304_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="plantphenology",
+            index=models.Index(
+                fields=["locationID", "eventDate"],
+                name="api_plantph_locatio_7a3c40_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="terresoundindex",
+            index=models.Index(
+                fields=["locationID", "measurementDeterminedDate"],
+                name="api_terreso_locatio_35afb2_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="weather",
+            index=models.Index(
+                fields=["locationID", "eventDate"],
+                name="api_weather_locatio_39b6d8_idx",
+            ),
+        ),
+        RemoveIndexConcurrently(
+            model_name="biosound",
+            name="api_biosoun_locatio_4c0fa1_idx",
+        ),
+        RemoveIndexConcurrently(
+            model_name="birdnetsound",
+            name="api_birdnet_locatio_7268e4_idx",
+        ),
+        RemoveIndexConcurrently(
+            model_name="cameratrap",
+            name="api_camerat_locatio_887855_idx",
+        ),
+        RemoveIndexConcurrently(
+            model_name="plantphenology",
+            name="api_plantph_locatio_18cc80_idx",
+        ),
+        RemoveIndexConcurrently(
+            model_name="terresoundindex",
+            name="api_terreso_locatio_0c421d_idx",
+        ),
+        RemoveIndexConcurrently(
+            model_name="weather",
+            name="api_weather_locatio_3d04c0_idx",
+        ),
+    ]
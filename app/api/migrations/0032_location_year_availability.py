@@ -0,0 +1,68 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:52
+
+from django.db import migrations, models
+
+# 由既有的觀測資料建立樣站年份（之後由匯入引擎隨資料更新）
+BACKFILL_SQL = """
+INSERT INTO api_location_year_availability (location_id, year, obs_code)
+SELECT DISTINCT "locationID", EXTRACT(YEAR FROM "{date_field}")::int, '{code}'
+FROM {table}
+WHERE "locationID" IS NOT NULL AND "{date_field}" IS NOT NULL;
+"""
+
+
+def backfill(code, table, date_field):
+    return migrations.RunSQL(
+        BACKFILL_SQL.format(code=code, table=table, date_field=date_field),
+        reverse_sql=migrations.RunSQL.noop,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0031_observation_location_date_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LocationYearAvailability",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("location_id", models.CharField(max_length=128)),
+                ("year", models.PositiveSmallIntegerField()),
+                ("obs_code", models.CharField(max_length=50)),
+            ],
+            options={
+                "verbose_name": "LocationYearAvailability",
+                "verbose_name_plural": "LocationYearAvailabilities",
+                "db_table": "api_location_year_availability",
+                "indexes": [
+                    models.Index(
+                        fields=["year", "obs_code"], name="api_locatio_year_97a1ae_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="locationyearavailability",
+            constraint=models.UniqueConstraint(
+                fields=("location_id", "year", "obs_code"),
+                name="api_location_year_availability_uniq",
+            ),
+        ),
+        backfill("plantphenology", "api_plantphenology", "eventDate"),
+        backfill("cameratrap", "api_cameratrap", "eventDate"),
+        backfill("terresoundindex", "api_terresoundindex", "measurementDeterminedDate"),
+        backfill("birdnetsound", "api_birdnetsound", "measurementDeterminedDate"),
+        backfill("biosound", "api_biosound", "measurementDeterminedDate"),
+        backfill("weather", "api_weather", "eventDate"),
+    ]
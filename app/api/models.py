@@ -211,7 +211,13 @@ class PlantPhenology(models.Model):
         db_table = "api_plantphenology"
         indexes = [
             models.Index(fields=["eventDate"]),
-            models.Index(fields=["locationID"]),
+            models.Index(fields=["locationID", "eventDate"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["eventID", "dataID"],
+                name="api_plantphenology_event_data_uniq",
+            ),
         ]
         verbose_name = "PlantPhenology"
         verbose_name_plural = "PlantPhenology"
@@ -370,7 +376,13 @@ class Cameratrap(models.Model):
         db_table = "api_cameratrap"
         indexes = [
             models.Index(fields=["eventDate"]),
-            models.Index(fields=["locationID"]),
+            models.Index(fields=["locationID", "eventDate"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["observationID"],
+                name="api_cameratrap_observation_uniq",
+            ),
         ]
         verbose_name = "Cameratrap"
         verbose_name_plural = "Cameratrap"
@@ -470,7 +482,13 @@ class TerreSoundIndex(models.Model):
         db_table = "api_terresoundindex"
         indexes = [
             models.Index(fields=["measurementDeterminedDate"]),
-            models.Index(fields=["locationID"]),
+            models.Index(fields=["locationID", "measurementDeterminedDate"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["eventID", "dataID"],
+                name="api_terresoundindex_event_data_uniq",
+            ),
         ]
         verbose_name = "TerreSoundIndex"
         verbose_name_plural = "TerreSoundIndex"
@@ -633,7 +651,13 @@ class BirdnetSound(models.Model):
         db_table = "api_birdnetsound"
         indexes = [
             models.Index(fields=["measurementDeterminedDate"]),
-            models.Index(fields=["locationID"]),
+            models.Index(fields=["locationID", "measurementDeterminedDate"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["eventID", "dataID"],
+                name="api_birdnetsound_event_data_uniq",
+            ),
         ]
         verbose_name = "BirdnetSound"
         verbose_name_plural = "BirdnetSound"
@@ -752,7 +776,13 @@ class BioSound(models.Model):
         db_table = "api_biosound"
         indexes = [
             models.Index(fields=["measurementDeterminedDate"]),
-            models.Index(fields=["locationID"]),
+            models.Index(fields=["locationID", "measurementDeterminedDate"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["eventID", "dataID"],
+                name="api_biosound_event_data_uniq",
+            ),
         ]
         verbose_name = "BioSound"
         verbose_name_plural = "BioSound"
@@ -893,7 +923,13 @@ class Weather(models.Model):
         db_table = "api_weather"
         indexes = [
             models.Index(fields=["eventDate"]),
-            models.Index(fields=["locationID"]),
+            models.Index(fields=["locationID", "eventDate"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["eventID", "dataID"],
+                name="api_weather_event_data_uniq",
+            ),
         ]
         verbose_name = "Weather"
         verbose_name_plural = "Weather"
@@ -964,3 +1000,194 @@ class DownloadRequest(models.Model):
 
     def __str__(self):
         return f"{self.email} - {self.items} - {self.mode}"
+
+
+class ImportSyncState(models.Model):
+    """
+    CKAN 匯入的同步進度，每個 (model, resource) 一筆。
+    """
+
+    model = models.CharField(
+        max_length=100, help_text="匯入目標 model（app_label.Model）"
+    )
+    resource_id = models.CharField(max_length=64)
+    resource_name = models.CharField(max_length=255, blank=True)
+
+    # 上次完整同步時 CKAN resource 的修改時間（原字串），用來判斷上游是否有變
+    last_modified = models.CharField(max_length=64, null=True, blank=True)
+    metadata_modified = models.CharField(max_length=64, null=True, blank=True)
+
+    row_count = models.PositiveBigIntegerField(default=0)
+    # 下一次要抓的 offset（append-only resource 只抓這之後的新資料）
+    last_offset = models.PositiveBigIntegerField(default=0)
+
+    synced_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "api_import_sync_state"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["model", "resource_id"],
+                name="api_import_sync_state_uniq",
+            ),
+        ]
+        verbose_name = "ImportSyncState"
+        verbose_name_plural = "ImportSyncStates"
+
+    def __str__(self):
+        return f"{self.model} - {self.resource_name or self.resource_id}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    匯入進行中的 checkpoint，每個 (model, resource, offset 區段) 一筆。
+    與該批資料在同一個 transaction 內寫入，resource 同步完成後刪除。
+    """
+
+    model = models.CharField(max_length=100)
+    resource_id = models.CharField(max_length=64)
+    range_start = models.PositiveBigIntegerField()
+    range_end = models.PositiveBigIntegerField(null=True, blank=True)
+    next_offset = models.PositiveBigIntegerField()
+
+    # 這個區段到目前為止的累計統計，--resume 時接續
+    rows = models.PositiveBigIntegerField(default=0)
+    inserted = models.PositiveBigIntegerField(default=0)
+    updated = models.PositiveBigIntegerField(default=0)
+    unchanged = models.PositiveBigIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "api_import_checkpoint"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["model", "resource_id", "range_start"],
+                name="api_import_checkpoint_uniq",
+            ),
+        ]
+        verbose_name = "ImportCheckpoint"
+        verbose_name_plural = "ImportCheckpoints"
+
+    def __str__(self):
+        return f"{self.model} - {self.resource_id}@{self.next_offset}"
+
+
+class ImportRun(models.Model):
+    """
+    匯入執行紀錄（--history），每次執行每個觀測項目一筆，用來追蹤匯入效能的變化。
+    """
+
+    STATUS_SUCCESS = "success"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_SUCCESS, "成功"),
+        (STATUS_FAILED, "失敗"),
+    ]
+
+    model = models.CharField(max_length=100)
+    obs_code = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    dry_run = models.BooleanField(default=False)
+    # 分頁方式、每頁筆數、workers 等執行參數
+    options = models.JSONField(default=dict, blank=True)
+
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    seconds = models.FloatField(default=0)
+
+    resources = models.PositiveIntegerField(default=0)
+    rows = models.PositiveBigIntegerField(default=0)
+    inserted = models.PositiveBigIntegerField(default=0)
+    updated = models.PositiveBigIntegerField(default=0)
+    unchanged = models.PositiveBigIntegerField(default=0)
+    rows_per_sec = models.FloatField(default=0)
+    # 各階段累計秒數：fetch / decode / coerce / write
+    stage_seconds = models.JSONField(default=dict, blank=True)
+
+    error_message = models.TextField(blank=True)
+
+    class Meta:
+        db_table = "api_import_run"
+        indexes = [
+            models.Index(fields=["obs_code", "started_at"]),
+        ]
+        verbose_name = "ImportRun"
+        verbose_name_plural = "ImportRuns"
+
+    def __str__(self):
+        return f"{self.obs_code} @ {self.started_at:%Y-%m-%d %H:%M} ({self.status})"
+
+
+class ObservationDailyRollup(models.Model):
+    """
+    觀測資料每個 (觀測項目, 樣站, 日期) 的每日彙總，供各觀測項目的圖表 API 使用。
+    由匯入引擎與 signals 逐日更新（utils.daily_rollup），
+    全部重建：python manage.py rebuild_daily_rollups
+    """
+
+    obs_code = models.CharField(max_length=50)
+    location_id = models.CharField(max_length=128)
+    date = models.DateField()
+    record_count = models.PositiveIntegerField(default=0)
+
+    # 物種數（植物物候 / 自動相機 / 鳥音辨識 / 生物辨識）
+    species_count = models.PositiveIntegerField(null=True, blank=True)
+    # 聲音指數日平均
+    aci = models.FloatField(null=True, blank=True)
+    adi = models.FloatField(null=True, blank=True)
+    bi = models.FloatField(null=True, blank=True)
+    ndsi = models.FloatField(null=True, blank=True)
+    # 氣象：日平均氣溫 / 日累積降雨量
+    air_temperature = models.FloatField(null=True, blank=True)
+    precipitation = models.FloatField(null=True, blank=True)
+    # 各日平均欄位當天有值的筆數，週 / 月 / 年平均以此加權
+    aci_count = models.PositiveIntegerField(null=True, blank=True)
+    adi_count = models.PositiveIntegerField(null=True, blank=True)
+    bi_count = models.PositiveIntegerField(null=True, blank=True)
+    ndsi_count = models.PositiveIntegerField(null=True, blank=True)
+    air_temperature_count = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        db_table = "api_observation_daily_rollup"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["obs_code", "location_id", "date"],
+                name="api_observation_daily_rollup_uniq",
+            ),
+        ]
+        verbose_name = "ObservationDailyRollup"
+        verbose_name_plural = "ObservationDailyRollups"
+
+    def __str__(self):
+        return f"{self.obs_code} - {self.location_id} @ {self.date}"
+
+
+class LocationYearAvailability(models.Model):
+    """
+    每個 (樣站, 年份, 觀測項目) 有沒有觀測資料，供首頁地圖的樣站列表與下拉選單使用。
+    匯入引擎只新增有資料的年份，signals 會重算並刪除已經沒有資料的年份（utils.location_years），
+    全部重建：python manage.py rebuild_daily_rollups
+    """
+
+    location_id = models.CharField(max_length=128)
+    year = models.PositiveSmallIntegerField()
+    obs_code = models.CharField(max_length=50)
+
+    class Meta:
+        db_table = "api_location_year_availability"
+        indexes = [
+            models.Index(fields=["year", "obs_code"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["location_id", "year", "obs_code"],
+                name="api_location_year_availability_uniq",
+            ),
+        ]
+        verbose_name = "LocationYearAvailability"
+        verbose_name_plural = "LocationYearAvailabilities"
+
+    def __str__(self):
+        return f"{self.location_id} @ {self.year} - {self.obs_code}"
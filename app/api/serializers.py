@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from .models import *
+from .utils.daily_rollup import CHART_INTERVALS
+from .utils.downsample import DEFAULT_MAX_POINTS, DOWNSAMPLE_METHODS, RAW_CHART_INTERVAL
 
 
 class PlantPhenologySerializer(serializers.ModelSerializer):
@@ -75,6 +77,11 @@ class PlantPhenologyChartSerializer(serializers.Serializer):
 class PlantPhenologyChartQuerySerializer(serializers.Serializer):
     locationID = serializers.CharField(required=True, help_text="指定地點代號")
     year = serializers.IntegerField(required=False, help_text="指定年份（西元年）")
+    interval = serializers.ChoiceField(
+        choices=CHART_INTERVALS,
+        default="day",
+        help_text="時間粒度：day / week / month / year（在資料庫中彙總）",
+    )
 
 
 class CameratrapSerializer(serializers.ModelSerializer):
@@ -182,6 +189,11 @@ class CameratrapChartSerializer(serializers.Serializer):
 class CameratrapChartQuerySerializer(serializers.Serializer):
     locationID = serializers.CharField(required=True, help_text="指定地點代號")
     year = serializers.IntegerField(required=False, help_text="指定年份（西元年）")
+    interval = serializers.ChoiceField(
+        choices=CHART_INTERVALS,
+        default="day",
+        help_text="時間粒度：day / week / month / year（在資料庫中彙總）",
+    )
 
 
 class TerreSoundIndexSerializer(serializers.ModelSerializer):
@@ -264,6 +276,25 @@ class TerreSoundIndexChartSerializer(serializers.Serializer):
 class TerreSoundIndexChartQuerySerializer(serializers.Serializer):
     locationID = serializers.CharField(required=True, help_text="指定地點代號")
     year = serializers.IntegerField(required=False, help_text="指定年份（西元年）")
+    interval = serializers.ChoiceField(
+        choices=CHART_INTERVALS + (RAW_CHART_INTERVAL,),
+        default="day",
+        help_text=(
+            "時間粒度：day / week / month / year（在資料庫中彙總）；"
+            "raw 為原始資料降採樣"
+        ),
+    )
+    max_points = serializers.IntegerField(
+        default=DEFAULT_MAX_POINTS,
+        min_value=10,
+        max_value=10000,
+        help_text="interval=raw 時最多回傳的點數",
+    )
+    downsample = serializers.ChoiceField(
+        choices=DOWNSAMPLE_METHODS,
+        default="lttb",
+        help_text="interval=raw 時的降採樣方式：lttb（保留形狀）/ minmax（保留峰值）",
+    )
 
 
 class BirdnetSoundSerializer(serializers.ModelSerializer):
@@ -355,6 +386,11 @@ class BirdnetSoundChartSerializer(serializers.Serializer):
 class BirdnetSoundChartQuerySerializer(serializers.Serializer):
     locationID = serializers.CharField(required=True, help_text="指定地點代號")
     year = serializers.IntegerField(required=False, help_text="指定年份（西元年）")
+    interval = serializers.ChoiceField(
+        choices=CHART_INTERVALS,
+        default="day",
+        help_text="時間粒度：day / week / month / year（在資料庫中彙總）",
+    )
 
 
 class BioSoundSerializer(serializers.ModelSerializer):
@@ -371,6 +407,11 @@ class BioSoundChartSerializer(serializers.Serializer):
 class BioSoundChartQuerySerializer(serializers.Serializer):
     locationID = serializers.CharField(required=True, help_text="指定地點代號")
     year = serializers.IntegerField(required=False, help_text="指定年份（西元年）")
+    interval = serializers.ChoiceField(
+        choices=CHART_INTERVALS,
+        default="day",
+        help_text="時間粒度：day / week / month / year（在資料庫中彙總）",
+    )
 
 
 class WeatherSerializer(serializers.ModelSerializer):
@@ -461,6 +502,7 @@ class WeatherQuerySerializer(serializers.Serializer):
 
 class WeatherChartSerializer(serializers.Serializer):
     date = serializers.DateField()
+    time = serializers.CharField(required=False, help_text="interval=raw 時的觀測時間")
     air_temperature = serializers.FloatField()
     precipitation = serializers.FloatField()
 
@@ -468,6 +510,61 @@ class WeatherChartSerializer(serializers.Serializer):
 class WeatherChartQuerySerializer(serializers.Serializer):
     locationID = serializers.CharField(required=True, help_text="指定地點代號")
     year = serializers.IntegerField(required=False, help_text="指定年份（西元年）")
+    interval = serializers.ChoiceField(
+        choices=CHART_INTERVALS + (RAW_CHART_INTERVAL,),
+        default="day",
+        help_text=(
+            "時間粒度：day / week / month / year（在資料庫中彙總）；"
+            "raw 為原始資料降採樣"
+        ),
+    )
+    max_points = serializers.IntegerField(
+        default=DEFAULT_MAX_POINTS,
+        min_value=10,
+        max_value=10000,
+        help_text="interval=raw 時最多回傳的點數",
+    )
+    downsample = serializers.ChoiceField(
+        choices=DOWNSAMPLE_METHODS,
+        default="lttb",
+        help_text="interval=raw 時的降採樣方式：lttb（保留形狀）/ minmax（保留峰值）",
+    )
+
+
+# 多樣站比較圖表一次最多幾個樣站
+MAX_COMPARE_STATIONS = 50
+
+
+class ObservationCompareChartQuerySerializer(serializers.Serializer):
+    locationID = serializers.CharField(
+        required=True,
+        help_text=f"地點代號，多個以逗號分隔（最多 {MAX_COMPARE_STATIONS} 個）",
+    )
+    metrics = serializers.CharField(
+        required=False,
+        help_text="要比較的欄位，多個以逗號分隔；未指定時為該觀測項目圖表的所有欄位",
+    )
+    year = serializers.IntegerField(required=False, help_text="指定年份（西元年）")
+    interval = serializers.ChoiceField(
+        choices=CHART_INTERVALS,
+        default="day",
+        help_text="時間粒度：day / week / month / year（在資料庫中彙總）",
+    )
+
+    def validate_locationID(self, value):
+        location_ids = list(
+            dict.fromkeys(v.strip() for v in value.split(",") if v.strip())
+        )
+        if not location_ids:
+            raise serializers.ValidationError("請提供至少一個地點代號")
+        if len(location_ids) > MAX_COMPARE_STATIONS:
+            raise serializers.ValidationError(
+                f"一次最多比較 {MAX_COMPARE_STATIONS} 個樣站"
+            )
+        return location_ids
+
+    def validate_metrics(self, value):
+        return [v.strip() for v in value.split(",") if v.strip()]
 
 
 class BaseDataFieldSerializer(serializers.ModelSerializer):
@@ -2,7 +2,6 @@ import os
 import csv
 import io
 import zipfile
-from collections import defaultdict
 from datetime import datetime, timedelta
 
 from celery import shared_task
@@ -13,7 +12,9 @@ from django.urls import reverse
 
 from .utils.cache_keys import (
     location_map_list_key,
+    location_map_list_variants_key,
     location_map_filter_key,
+    map_cache_rebuild_pending_key,
     segis_cache_key,
 )
 from .utils.transform_segis_data import (
@@ -28,61 +29,106 @@ from .utils.call_segis import (
     get_industry_data,
 )
 from .utils.download import build_obs_maps
+from .utils.date_filters import year_filter
+from .utils.location_years import location_map_filter_data, location_map_list_variants
 
-from .models import Location, DownloadRequest
-from .serializers import LocationMapSerializer
+from .models import DownloadRequest
 from .obs_config import OBS_CONFIG
 
 
 @shared_task
 def rebuild_location_map_filter_cache():
-    year_map = defaultdict(set)
-
-    for code, cfg in OBS_CONFIG.items():
-        model = cfg["model"]
-        date_field = cfg["date_field"]
+    result = location_map_filter_data()
+    cache.set(location_map_filter_key(), result, timeout=None)
 
-        year_dates = model.objects.dates(date_field, "year", order="ASC")
-        for d in year_dates:
-            year = d.year
-            year_map[year].add(code)
 
+@shared_task
+def rebuild_location_map_list_cache():
+    """
+    一次算好所有 (年份, 觀測項目) 組合的樣站列表，用一個 set_many（Redis pipeline）寫入；
+    上次有、這次已經沒有資料的組合一併刪除。
+    """
     result = {
-        str(year): [OBS_CONFIG[code]["label"] for code in sorted(obs_codes)]
-        for year, obs_codes in sorted(year_map.items())
+        location_map_list_key(year, code): data
+        for (year, code), data in location_map_list_variants().items()
     }
+    variants_key = location_map_list_variants_key()
+    previous = cache.get(variants_key) or []
+    cache.set_many({**result, variants_key: list(result)}, timeout=None)
 
-    cache.set(location_map_filter_key(), result, timeout=None)
+    stale = set(previous) - set(result)
+    if stale:
+        cache.delete_many(stale)
 
 
 @shared_task
-def rebuild_location_map_list_cache():
-    year = None
-    item = None
+def rebuild_location_map_caches():
+    """
+    一次重建首頁地圖下拉選單與樣站列表的 cache。
+    由 utils.map_cache 做 debounce 後排入，開始前先清掉 pending 標記，
+    重建期間的新異動就會再排下一次。
+    """
+    cache.delete(map_cache_rebuild_pending_key())
+    rebuild_location_map_filter_cache()
+    rebuild_location_map_list_cache()
 
-    obs_codes = list(OBS_CONFIG.keys())
-    locations = Location.objects.order_by("location_id").distinct("location_id")
-    result = []
 
-    for loc in locations:
-        base = LocationMapSerializer(loc).data
-        years_map = defaultdict(list)
+@shared_task
+def refresh_chart_cache_task(code, location_id, year=None, params=None):
+    """
+    圖表 cache 過期時由 utils.chart_cache 排入，在背景重算（stale-while-revalidate）。
+    """
+    from .utils.chart_cache import refresh_chart_cache
 
-        for code in obs_codes:
-            cfg = OBS_CONFIG[code]
-            model = cfg["model"]
-            date_field = cfg["date_field"]
+    refresh_chart_cache(code, location_id, year, **(params or {}))
 
-            qs = model.objects.filter(locationID=loc.location_id)
-            year_dates = qs.dates(date_field, "year", order="ASC")
-            for d in year_dates:
-                y = d.year
-                years_map[y].append(cfg["label"])
 
-        base["years"] = {str(y): items for y, items in sorted(years_map.items())}
-        result.append(base)
+# 觀測資料同步（utils.import_workflow）；匯入引擎會 import 本模組，所以在函式內載入
+@shared_task
+def sync_observations(codes=None, options=None):
+    """
+    同步 settings.CKAN_PACKAGE_IDS 中設定的觀測項目（codes 未給時全部）。
+    每個 resource 依 shard_size 切成分段，各段一個 sync_observation_chunk task，
+    全部結束後由 finish_observation_sync 彙整並只重建一次地圖 cache。
+    options 為 ObservationImporter 的參數（例如 {"full": True, "shard_size": 50000}）。
+    """
+    from celery import chord
+
+    from .utils.import_workflow import plan_observation_sync, sync_packages
+
+    plans = [
+        plan_observation_sync(code, package_id=package_id, options=options)
+        for code, package_id in sync_packages(codes).items()
+    ]
+    header = [
+        sync_observation_chunk.s(plan["code"], plan["options"], shard)
+        for plan in plans
+        for shard in plan["shards"]
+    ]
+    for plan in plans:
+        # 分段統計已經放進 header，callback 不需要
+        plan.pop("shards")
+    if not header:
+        return finish_observation_sync([], plans)
+    chord(header)(finish_observation_sync.s(plans))
+    return len(header)
+
+
+@shared_task
+def sync_observation_chunk(code, options, stats):
+    """
+    同步一個 resource 分段，回傳 [code, stats]；失敗時 stats 帶 error，不會讓 chord 中斷。
+    """
+    from .utils.ckan_import_worker import sync_shard
+
+    return [code, sync_shard(code, options, stats)]
+
+
+@shared_task
+def finish_observation_sync(results, plans):
+    from .utils.import_workflow import finish_observation_sync as finish
 
-    cache.set(location_map_list_key(year, item), result, timeout=None)
+    return finish(results, plans)
 
 
 @shared_task
@@ -132,7 +178,7 @@ def generate_download_zip(download_request_id):
                 date_field = cfg["date_field"]
 
                 qs = model.objects.filter(locationID=dl.location_id)
-                qs = qs.filter(**{f"{date_field}__year": dl.year})
+                qs = qs.filter(year_filter(date_field, dl.year))
 
                 if not qs.exists():
                     continue
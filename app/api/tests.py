@@ -1,3 +1,792 @@
-from django.test import TestCase
+import datetime
+import json
+import math
+import shutil
+import tempfile
+from collections import Counter
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.db import models
+from django.test import SimpleTestCase
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .obs_config import OBS_CONFIG
+from .utils.cache_keys import chart_cache_key, location_map_list_key
+from .utils.ckan_import import SYNC_COUNTERS, get_importer, new_sync_stats
+from .utils.ckan_prefetch import (
+    AdaptivePageSize,
+    background_pages,
+    iter_pages,
+    prefetch_pages,
+)
+from .utils.ckan_replay import PageRecorder, PageReplay
+from .utils.coercion import coerce_records, coercion_plan
+from .utils.date_filters import year_filter
+from .utils.duplicates import DuplicateKeyError, dedupe_rows, differing_columns
+from .utils.downsample import downsample_series, row_timestamp, spread_within_day
+from .utils.json_stream import iter_json_records
+from .utils.location_years import location_map_list_params
+from .utils.rollup_refresh import queue_rollup_refresh
+
+
+def _baseline_coerce_value(model, field_name, value):
+    """
+    改用 coercion plan 之前逐格轉型的 coerce_value，作為對照組。
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        v = value.strip()
+        if v == "":
+            return None
+    else:
+        v = value
+
+    field = model._meta.get_field(field_name)
+
+    if isinstance(field, models.IntegerField):
+        try:
+            return int(v)
+        except Exception:
+            return None
+
+    if isinstance(field, (models.FloatField, models.DecimalField)):
+        try:
+            return float(v)
+        except Exception:
+            return None
+
+    if isinstance(field, models.BooleanField):
+        if isinstance(v, bool):
+            return v
+        sv = str(v).lower()
+        if sv in ("1", "true", "t", "yes", "y"):
+            return True
+        if sv in ("0", "false", "f", "no", "n"):
+            return False
+        return None
+
+    if isinstance(field, models.DateField) and not isinstance(v, (int, float)):
+        d = parse_date(str(v))
+        if d:
+            return d
+        dt = parse_datetime(str(v))
+        return dt.date() if dt else None
+
+    return str(v)
+
+
+class CoercionPlanTests(SimpleTestCase):
+    VALUES = [
+        None,
+        "",
+        "  ",
+        "12",
+        " 7 ",
+        "-3",
+        "3.5",
+        "1e3",
+        "abc",
+        "true",
+        "N",
+        "yes",
+        "y",
+        "F",
+        "0",
+        "no",
+        "maybe",
+        "2023-01-02",
+        " 2023-01-02T03:04:05 ",
+        "2023-01-02T03:04:05+08:00",
+        5,
+        2.5,
+        True,
+        "阿里山 x",
+    ]
+
+    def test_matches_baseline_coerce_value(self):
+        for code, cfg in OBS_CONFIG.items():
+            model = cfg["model"]
+            names = [f.name for f in model._meta.get_fields() if hasattr(f, "attname")]
+            # 每一筆各欄位輪流填入不同的值，另外放一個不在 model 上的欄位
+            records = [
+                {
+                    name: self.VALUES[(i + j) % len(self.VALUES)]
+                    for j, name in enumerate(names)
+                    if (i + j) % 5
+                }
+                | {"not_a_field": i}
+                for i in range(len(self.VALUES) * 3)
+            ]
+            expected = [
+                {
+                    key: _baseline_coerce_value(model, key, value)
+                    for key, value in row.items()
+                    if key in names
+                }
+                for row in records
+            ]
+            got = coerce_records(coercion_plan(model), records, Counter(), Counter())
+            with self.subTest(code=code):
+                self.assertEqual(got, expected)
+
+    def test_counts_dropped_and_coerced(self):
+        model = OBS_CONFIG["terresoundindex"]["model"]
+        dropped, coerced = Counter(), Counter()
+        records = [{"ACI": "1.5"}, {"ACI": "abc"}, {"ACI": 2.0}, {"ACI": ""}]
+        got = coerce_records(coercion_plan(model), records, dropped, coerced)
+        self.assertEqual([r["ACI"] for r in got], [1.5, None, 2.0, None])
+        self.assertEqual(dropped, Counter({"ACI": 1}))
+        self.assertEqual(coerced, Counter({"ACI": 1}))
+
+    def test_invalid_calendar_date_is_dropped(self):
+        # 舊版遇到格式正確但不存在的日期會丟 ValueError 中斷整批；現在視為無法轉型
+        model = OBS_CONFIG["weather"]["model"]
+        dropped = Counter()
+        got = coerce_records(
+            coercion_plan(model), [{"eventDate": "2023-02-30"}], dropped, Counter()
+        )
+        self.assertEqual(got, [{"eventDate": None}])
+        self.assertEqual(dropped, Counter({"eventDate": 1}))
+
+
+def _chunks(raw: bytes, size: int):
+    return [raw[i : i + size] for i in range(0, len(raw), size)]
+
+
+class JsonStreamTests(SimpleTestCase):
+    RECORDS = [
+        {"_id": 1, "locationID": "阿里山-01", "ACI": 1.25e-3, "ok": True},
+        {"_id": 2, "note": 'quote " backslash \\ tab \t emoji \U0001f600', "x": None},
+        {"_id": 3, "nested": {"a": [1, [2, {"b": "]}"}]], "c": {}}, "empty": []},
+        {"_id": 12345678901234, "neg": -0.5, "big": 1e300, "s": ""},
+        "plain string",
+        [1, 2, 3],
+        42,
+    ]
+
+    def assert_stream(self, raw: bytes):
+        expected = json.loads(raw)
+        for size in range(1, len(raw) + 1):
+            meta = {}
+            got = list(iter_json_records(_chunks(raw, size), meta))
+            with self.subTest(size=size):
+                self.assertEqual(got, expected["result"]["records"])
+                self.assertEqual(meta.get("total"), expected["result"].get("total"))
+                self.assertEqual(meta.get("success"), expected.get("success"))
+
+    def test_matches_json_loads_across_chunk_boundaries(self):
+        doc = {
+            "help": "https://ckan.example/api/3/action/help_show",
+            "success": True,
+            "result": {
+                "records": self.RECORDS,
+                "fields": [{"id": "_id", "type": "int"}],
+                "total": 7,
+            },
+        }
+        # 中文與 emoji 不跳脫時，多位元組字元會被切在兩段之間
+        for ensure_ascii in (True, False):
+            for indent in (None, 2):
+                raw = json.dumps(doc, ensure_ascii=ensure_ascii, indent=indent)
+                with self.subTest(ensure_ascii=ensure_ascii, indent=indent):
+                    self.assert_stream(raw.encode())
+
+    def test_total_before_records(self):
+        raw = b'{"result": {"total": 2, "records": [12345, 6789]}, "success": true}'
+        self.assert_stream(raw)
+
+    def test_no_records(self):
+        self.assertEqual(list(iter_json_records([b'{"result":{"records":[]}}'])), [])
+        meta = {}
+        raw = b'{"success": false, "error": {"message": "x"}}'
+        self.assertEqual(list(iter_json_records(_chunks(raw, 3), meta)), [])
+        self.assertEqual(meta["error"], {"message": "x"})
+
+    def test_truncated_response_raises(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_records(_chunks(b'{"result":{"records":[1,2', 4)))
+
+
+def _reference_lttb(xs, ys, threshold):
+    """
+    教科書版 LTTB（單一欄位、整個序列在記憶體中），回傳選到的 index。
+    """
+    n = len(ys)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    selected = [0]
+    for i in range(threshold - 2):
+        start = int(math.floor((i + 1) * every)) + 1
+        end = min(int(math.floor((i + 2) * every)) + 1, n)
+        if i == threshold - 3:
+            avg_x, avg_y = xs[n - 1], ys[n - 1]
+        else:
+            avg_x = sum(xs[start:end]) / (end - start)
+            avg_y = sum(ys[start:end]) / (end - start)
+        best, best_area = None, -1.0
+        for j in range(int(math.floor(i * every)) + 1, start):
+            area = abs(
+                (xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a])
+            )
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def _reference_minmax(ys, buckets):
+    size = math.ceil(len(ys) / buckets)
+    selected = set()
+    for start in range(0, len(ys), size):
+        chunk = [(y, i) for i, y in enumerate(ys[start : start + size], start)]
+        selected.update((min(chunk)[1], max(chunk)[1]))
+    return sorted(selected)
+
+
+class DownsampleTests(SimpleTestCase):
+    N = 2000
+
+    def setUp(self):
+        # 每 10 分鐘一筆的氣象資料，中間停機 5 天；數值固定（不用亂數）
+        moment = datetime.datetime(2024, 1, 1)
+        self.rows = []
+        for i in range(self.N):
+            moment += datetime.timedelta(minutes=10)
+            if i == 600:
+                moment += datetime.timedelta(days=5)
+            self.rows.append(
+                {
+                    "i": i,
+                    "date": moment.date(),
+                    "time": moment.strftime("%H:%M:%S"),
+                    "air_temperature": math.sin(i / 9) + (i * 7919 % 101) / 100,
+                    "precipitation": float(i * 31 % 17),
+                }
+            )
+        self.xs = [row_timestamp(row) for row in self.rows]
+
+    def values(self, field):
+        return [row[field] for row in self.rows]
+
+    def indexes(self, rows):
+        return [row["i"] for row in rows]
+
+    def test_row_timestamp(self):
+        day = datetime.date(2024, 1, 1)
+        midnight = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        cases = {
+            None: 0,
+            "": 0,
+            "bad": 0,
+            "12:30:00": 45000,
+            "12:30:00Z": 45000,
+            "12:30:00+08:00": 45000 - 8 * 3600,
+        }
+        for time, offset in cases.items():
+            with self.subTest(time=time):
+                self.assertEqual(
+                    row_timestamp({"date": day, "time": time}),
+                    midnight.timestamp() + offset,
+                )
+        self.assertEqual(row_timestamp({"date": day}), midnight.timestamp())
+
+    def test_lttb_matches_reference_on_timestamps(self):
+        ys = self.values("air_temperature")
+        for threshold in (3, 10, 97, 500):
+            got = downsample_series(
+                iter(self.rows), self.N, threshold, ["air_temperature"]
+            )
+            with self.subTest(threshold=threshold):
+                self.assertEqual(
+                    self.indexes(got), _reference_lttb(self.xs, ys, threshold)
+                )
+        # x 用序號時選點不同：停機前後不能被當成等間距
+        got = downsample_series(iter(self.rows), self.N, 97, ["air_temperature"])
+        self.assertNotEqual(
+            self.indexes(got), _reference_lttb(list(range(self.N)), ys, 97)
+        )
+
+    def test_lttb_multiple_fields_is_union_of_each_field(self):
+        fields = ["air_temperature", "precipitation"]
+        got = downsample_series(iter(self.rows), self.N, 200, fields)
+        expected = set()
+        for field in fields:
+            expected.update(_reference_lttb(self.xs, self.values(field), 100))
+        self.assertEqual(self.indexes(got), sorted(expected))
+
+    def test_minmax_matches_reference(self):
+        ys = self.values("air_temperature")
+        for max_points in (4, 100, 999):
+            got = downsample_series(
+                iter(self.rows), self.N, max_points, ["air_temperature"], "minmax"
+            )
+            with self.subTest(max_points=max_points):
+                self.assertEqual(
+                    self.indexes(got), _reference_minmax(ys, max_points // 2)
+                )
+
+    def date_only_rows(self):
+        # 聲音指數只有日期：30 天、每天 144 筆，第 10 天整天停機，每 97 筆一個尖峰
+        rows = []
+        for i in range(30 * 144):
+            if i // 144 == 10:
+                continue
+            rows.append(
+                {
+                    "i": i,
+                    "date": datetime.date(2024, 1, 1) + datetime.timedelta(i // 144),
+                    "aci": 100.0 if i % 97 == 0 else (i * 7919 % 101) / 500,
+                }
+            )
+        return rows
+
+    def test_spread_within_day(self):
+        rows = self.date_only_rows()
+        x = spread_within_day(Counter(row["date"] for row in rows))
+        xs = [x(row) for row in rows]
+        self.assertEqual(xs[0], row_timestamp(rows[0]))
+        self.assertEqual(xs[1] - xs[0], 600)
+        self.assertEqual(xs, sorted(set(xs)))
+        # 停機的那天仍是缺口
+        self.assertEqual(xs[10 * 144] - xs[10 * 144 - 1], 86400 + 600)
+
+    def test_date_only_rows_keep_peaks(self):
+        rows = self.date_only_rows()
+        counts = Counter(row["date"] for row in rows)
+        got = downsample_series(
+            iter(rows), len(rows), 400, ["aci"], x=spread_within_day(counts)
+        )
+        x = spread_within_day(counts)
+        xs = [x(row) for row in rows]
+        self.assertEqual(
+            self.indexes(got),
+            [rows[i]["i"] for i in _reference_lttb(xs, [r["aci"] for r in rows], 400)],
+        )
+        spikes = {row["i"] for row in rows if row["aci"] == 100.0}
+        self.assertLessEqual(spikes, set(self.indexes(got)))
+
+    def test_short_series_is_returned_unchanged(self):
+        for method in ("lttb", "minmax"):
+            got = downsample_series(
+                iter(self.rows[:50]), 50, 100, ["air_temperature"], method
+            )
+            self.assertEqual(self.indexes(got), list(range(50)))
+
+
+class LocationMapListParamsTests(SimpleTestCase):
+    def test_year(self):
+        cases = {
+            None: (None, None),
+            "": (None, None),
+            "2024": (2024, None),
+            " 2024 ": (2024, None),
+            "0": None,
+            "-1": None,
+            "abc": None,
+        }
+        for year, expected in cases.items():
+            with self.subTest(year=year):
+                self.assertEqual(location_map_list_params(year, None), expected)
+
+    def test_item(self):
+        label = OBS_CONFIG["weather"]["label"]
+        self.assertEqual(location_map_list_params("2024", label), (2024, "weather"))
+        self.assertEqual(location_map_list_params(None, "weather"), (None, "weather"))
+        self.assertIsNone(location_map_list_params("2024", "unknown"))
+
+    def test_cache_key_keeps_year_zero_apart(self):
+        self.assertEqual(location_map_list_key(None, None), "location_map_list:all:all")
+        self.assertNotEqual(
+            location_map_list_key(0, None), location_map_list_key(None, None)
+        )
+
+
+class ChartCacheKeyTests(SimpleTestCase):
+    def test_year_zero_is_not_all_years(self):
+        params = {"interval": "day"}
+        self.assertEqual(
+            chart_cache_key("weather", "A", None, params),
+            "chart:weather:A:all:interval=day",
+        )
+        self.assertEqual(
+            chart_cache_key("weather", "A", 0, params), "chart:weather:A:0:interval=day"
+        )
+
+
+class ResumeShardsTests(SimpleTestCase):
+    """
+    --workers 中斷後 --resume：還沒 commit 過的分段也要接續，不能漏掉 offset 區段。
+    """
+
+    TOTAL = 3500
+
+    def setUp(self):
+        # 以 range_start 為 key 的 ImportCheckpoint 替身
+        self.checkpoints = {}
+
+    def save_checkpoints(self, model, shards):
+        for stats in shards:
+            self.checkpoints[stats["start"]] = SimpleNamespace(
+                resource_id=stats["resource_id"],
+                range_start=stats["start"],
+                range_end=stats["end"],
+                next_offset=stats["next_offset"],
+                **{key: stats[key] for key in SYNC_COUNTERS},
+            )
+
+    def importer(self, **options):
+        importer = get_importer("weather")(
+            "weather", limit=1000, shard_size=1000, stdout=StringIO(), **options
+        )
+        importer.fetch_total = lambda rid: self.TOTAL
+        return importer
+
+    def plan(self, importer, resources):
+        patches = [
+            mock.patch("api.utils.ckan_import.save_checkpoints", self.save_checkpoints),
+            mock.patch(
+                "api.utils.ckan_import.load_checkpoints",
+                lambda model, rids: {
+                    "r": sorted(self.checkpoints.values(), key=lambda c: c.range_start)
+                },
+            ),
+            mock.patch("api.utils.ckan_import.load_sync_states", lambda m, r: {}),
+            mock.patch("api.utils.ckan_import.clear_checkpoints", lambda m, r: None),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        return importer.plan_shards(importer.plan_incremental(resources))
+
+    def test_uncommitted_shards_are_resumed(self):
+        resource = {"id": "r", "name": "r"}
+        shards = self.plan(self.importer(workers=4), [resource])
+        self.assertEqual(
+            [(s["start"], s["end"]) for s in shards],
+            [(0, 1000), (1000, 2000), (2000, 3000), (3000, None)],
+        )
+        # 每一段在開始前都已經有 checkpoint
+        self.assertEqual(sorted(self.checkpoints), [0, 1000, 2000, 3000])
+
+        # 第一段同步完、第二段 commit 了一批後失敗，後兩段還沒 commit 就中斷
+        self.checkpoints[0].next_offset = 1000
+        self.checkpoints[1000].next_offset = 1500
+
+        resumed = self.plan(self.importer(workers=4, resume=True), [resource])
+        self.assertEqual(
+            [(s["next_offset"], s["end"]) for s in resumed],
+            [(1000, 1000), (1500, 2000), (2000, 3000), (3000, None)],
+        )
+
+    def test_finished_shard_is_not_fetched(self):
+        importer = self.importer()
+        importer.page_fetcher = mock.Mock()
+        stats = new_sync_stats("r", "r", 0, 1000)
+        stats["next_offset"] = 1000
+        self.assertEqual(list(importer.iter_batches(stats)), [])
+        importer.page_fetcher.assert_not_called()
+
+    def test_dry_run_saves_no_checkpoint(self):
+        self.plan(self.importer(workers=4, dry_run=True), [{"id": "r", "name": "r"}])
+        self.assertEqual(self.checkpoints, {})
+
+
+class YearFilterTests(SimpleTestCase):
+    def test_year_range(self):
+        self.assertEqual(
+            year_filter("eventDate", "2024"),
+            models.Q(
+                eventDate__gte=datetime.date(2024, 1, 1),
+                eventDate__lt=datetime.date(2025, 1, 1),
+            ),
+        )
+
+    def test_out_of_range_year_matches_nothing(self):
+        for year in (0, -1, 9999, 12345):
+            with self.subTest(year=year):
+                self.assertEqual(year_filter("eventDate", year), models.Q(pk__in=[]))
+
+
+class RollupRefreshTests(SimpleTestCase):
+    """
+    signals 逐筆排的重算在 commit 後合併：一個 transaction 每個觀測項目只重算一次。
+    """
+
+    def setUp(self):
+        self.callbacks = []
+        self.calls = []
+        for name, target in (
+            ("transaction.on_commit", self.callbacks.append),
+            (
+                "refresh_daily_rollups",
+                lambda code, keys: self.calls.append(("rollup", code, sorted(keys))),
+            ),
+            (
+                "refresh_location_years",
+                lambda code, keys: self.calls.append(("years", code, sorted(keys))),
+            ),
+        ):
+            patch = mock.patch(f"api.utils.rollup_refresh.{name}", target)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def commit(self):
+        callbacks, self.callbacks[:] = list(self.callbacks), []
+        for callback in callbacks:
+            callback()
+
+    def test_one_refresh_per_transaction(self):
+        day = datetime.date(2024, 1, 1)
+        for i in range(10000):
+            queue_rollup_refresh("weather", [(f"L{i % 3}", day), (None, day)])
+        queue_rollup_refresh("biosound", [("A", day)])
+        self.assertEqual(self.calls, [])
+        self.commit()
+        self.assertEqual(
+            self.calls,
+            [
+                ("rollup", "weather", [("L0", day), ("L1", day), ("L2", day)]),
+                ("years", "weather", [("L0", 2024), ("L1", 2024), ("L2", 2024)]),
+                ("rollup", "biosound", [("A", day)]),
+                ("years", "biosound", [("A", 2024)]),
+            ],
+        )
+
+    def test_keys_survive_rollback(self):
+        day = datetime.date(2024, 1, 1)
+        queue_rollup_refresh("weather", [("A", day)])
+        # rollback：on_commit 的 callback 被丟掉
+        self.callbacks.clear()
+        queue_rollup_refresh("weather", [("B", day)])
+        self.commit()
+        self.assertEqual(self.calls[0], ("rollup", "weather", [("A", day), ("B", day)]))
+        self.assertEqual(len(self.calls), 2)
+
+
+class FakeDatastore:
+    """
+    datastore_search 的替身：fetch(offset, limit) -> (records, total)。
+    cap：伺服器每頁最多回傳的筆數；with_total=False 時 total 為 None。
+    """
+
+    def __init__(self, n, cap=None, with_total=True):
+        self.records = [{"_id": i} for i in range(n)]
+        self.cap = cap
+        self.with_total = with_total
+        self.calls = []
+
+    def __call__(self, offset, limit):
+        self.calls.append((offset, limit))
+        if self.cap is not None:
+            limit = min(limit, self.cap)
+        total = len(self.records) if self.with_total else None
+        return self.records[offset : offset + limit], total
+
+
+def _ids(pages):
+    return [r["_id"] for page in pages for r in page]
+
+
+class PagingTests(SimpleTestCase):
+    def test_iter_pages(self):
+        server = FakeDatastore(1050)
+        self.assertEqual(_ids(iter_pages(server, 100)), list(range(1050)))
+        self.assertEqual(
+            _ids(iter_pages(server, 100, start=20, max_records=250)),
+            list(range(20, 270)),
+        )
+        # 最後一頁不會超過 max_records，--workers 的分段不重疊
+        self.assertEqual(server.calls[-1], (220, 50))
+
+    def test_iter_pages_server_cap_and_batches(self):
+        server = FakeDatastore(1050, cap=30)
+        pages = list(iter_pages(server, 100, batch_size=20))
+        self.assertEqual(_ids(pages), list(range(1050)))
+        self.assertTrue(all(len(page) <= 20 for page in pages))
+
+    def test_prefetch_pages(self):
+        for depth in (1, 3, 8):
+            for kwargs, expected in (
+                ({}, range(1050)),
+                ({"max_records": 333}, range(333)),
+                ({"start": 500, "max_records": 120}, range(500, 620)),
+                ({"start": 1000}, range(1000, 1050)),
+            ):
+                server = FakeDatastore(1050)
+                with self.subTest(depth=depth, **kwargs):
+                    got = _ids(prefetch_pages(server, 100, depth, **kwargs))
+                    self.assertEqual(got, list(expected))
+
+    def test_prefetch_pages_server_cap(self):
+        # 伺服器每頁只給 30 筆：之後的頁以 30 筆為單位，不會漏掉中間的資料
+        for with_total in (True, False):
+            server = FakeDatastore(1050, cap=30, with_total=with_total)
+            with self.subTest(with_total=with_total):
+                self.assertEqual(
+                    _ids(prefetch_pages(server, 100, 4)), list(range(1050))
+                )
+                self.assertTrue(all(limit <= 100 for _, limit in server.calls))
+
+    def test_prefetch_pages_empty(self):
+        self.assertEqual(list(prefetch_pages(FakeDatastore(0), 100, 4)), [])
+
+    def test_background_pages(self):
+        server = FakeDatastore(1050)
+        got = _ids(background_pages(iter_pages(server, 100), depth=3))
+        self.assertEqual(got, list(range(1050)))
+
+    def test_background_pages_error_and_early_stop(self):
+        def failing():
+            yield [{"_id": 0}]
+            raise ValueError("boom")
+
+        pages = background_pages(failing(), depth=2)
+        self.assertEqual(next(pages), [{"_id": 0}])
+        with self.assertRaises(ValueError):
+            next(pages)
+
+        closed = []
+
+        def endless():
+            try:
+                i = 0
+                while True:
+                    yield [{"_id": i}]
+                    i += 1
+            finally:
+                closed.append(True)
+
+        pages = background_pages(endless(), depth=2)
+        self.assertEqual(next(pages), [{"_id": 0}])
+        # 呼叫端提前停止：背景 thread 結束並關閉來源
+        pages.close()
+        self.assertEqual(closed, [True])
+
+    def test_adaptive_page_size(self):
+        size = AdaptivePageSize(1000, target=2.0, minimum=100, maximum=5000)
+        # 很快：最多放大一倍
+        size.observe(0.1, 1000)
+        self.assertEqual(size.size, 2000)
+        size.observe(0.1, 2000)
+        self.assertEqual(size.size, 4000)
+        # 不超過 maximum
+        size.observe(0.1, 4000)
+        self.assertEqual(size.size, 5000)
+        # 很慢：最多縮小一半
+        size.observe(60, 5000)
+        self.assertEqual(size.size, 2500)
+        # 接近目標：依速度換算
+        size.observe(2.5, 2500)
+        self.assertEqual(size.size, 2000)
+        # 沒有資料或耗時為 0 時不調整
+        size.observe(0, 2000)
+        size.observe(1.0, 0)
+        self.assertEqual(size.size, 2000)
+        # 不低於 minimum
+        for _ in range(10):
+            size.observe(100, size.size)
+        self.assertEqual(size.size, 100)
+
+
+class PageReplayTests(SimpleTestCase):
+    def record(self, pages, total=None):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        recorder = PageRecorder(directory)
+        for i, (offset, count) in enumerate(pages):
+            records = [{"_id": n} for n in range(offset, offset + count)]
+            recorder.save_page("r", offset, records, total if i == 0 else None)
+        return PageReplay(directory)
+
+    def test_reads_across_recorded_pages(self):
+        replay = self.record([(0, 100), (100, 100), (200, 50)], total=250)
+        records, total = replay.fetch_page("r", 50, 120)
+        self.assertEqual([r["_id"] for r in records], list(range(50, 170)))
+        self.assertEqual(total, 250)
+        records, _ = replay.fetch_page("r", 230, 100)
+        self.assertEqual([r["_id"] for r in records], list(range(230, 250)))
+        self.assertEqual(replay.fetch_page("r", 250, 100), ([], 250))
+
+        # 重播時的分頁不必與錄製時對齊
+        def fetch(offset, limit):
+            return replay.fetch_page("r", offset, limit)
+
+        self.assertEqual(_ids(iter_pages(fetch, 37)), list(range(250)))
+
+    def test_missing_page_stops_the_read(self):
+        replay = self.record([(0, 100), (200, 50)])
+        records, total = replay.fetch_page("r", 50, 100)
+        self.assertEqual([r["_id"] for r in records], list(range(50, 100)))
+        # 沒有 total.json 時以最後一頁的結尾為總筆數
+        self.assertEqual(total, 250)
+        self.assertEqual(replay.fetch_page("r", 100, 10), ([], 250))
+        self.assertEqual(replay.fetch_page("other", 0, 10), ([], 0))
+
+    def test_missing_directory(self):
+        with self.assertRaises(FileNotFoundError):
+            PageReplay("/nonexistent/replay")
+
+
+class DedupeRowsTests(SimpleTestCase):
+    ROWS = [
+        {"eventID": "e", "dataID": "1", "v": 1},
+        {"eventID": "e", "dataID": "2", "v": 2},
+        {"eventID": "e", "dataID": "1", "v": 3},
+        {"eventID": "e", "dataID": "3", "v": 4},
+        {"eventID": "e", "dataID": "1", "v": 5},
+        {"eventID": "e", "dataID": "2", "v": 2},
+    ]
+
+    @staticmethod
+    def key(row):
+        return (row["eventID"], row["dataID"])
+
+    def test_policies(self):
+        expected = {
+            "last": ([4, 5, 2], [4, 5]),
+            "first": ([1, 2, 4], [0, 1]),
+            "skip": ([4], [None, None]),
+            "error": ([4], [None, None]),
+        }
+        for policy, (values, kept) in expected.items():
+            rows, duplicates = dedupe_rows(self.ROWS, self.key, policy)
+            with self.subTest(policy=policy):
+                # 保留的列維持原本順序
+                self.assertEqual([r["v"] for r in rows], values)
+                self.assertEqual(
+                    [(d.key, d.positions) for d in duplicates],
+                    [(("e", "1"), [0, 2, 4]), (("e", "2"), [1, 5])],
+                )
+                self.assertEqual([d.kept for d in duplicates], kept)
+
+    def test_no_duplicates_returns_rows_unchanged(self):
+        rows = self.ROWS[:2]
+        self.assertEqual(dedupe_rows(rows, self.key, "skip"), (rows, []))
+
+    def test_differing_columns(self):
+        self.assertEqual(differing_columns([self.ROWS[0], self.ROWS[2]]), ["v"])
+        self.assertEqual(differing_columns([self.ROWS[1], self.ROWS[5]]), [])
+
+    def test_importer_policy(self):
+        offsets = list(range(100, 100 + len(self.ROWS)))
+        for policy in ("last", "first", "skip"):
+            importer = get_importer("weather")(
+                "weather", on_duplicate=policy, stdout=StringIO()
+            )
+            kept = importer.dedupe_batch(list(self.ROWS), offsets, "r")
+            with self.subTest(policy=policy):
+                self.assertEqual(kept, dedupe_rows(self.ROWS, self.key, policy)[0])
+                self.assertEqual(importer.duplicates["in_batch"], 2)
+
+        importer = get_importer("weather")(
+            "weather", on_duplicate="error", stdout=StringIO()
+        )
+        with self.assertRaisesMessage(DuplicateKeyError, "[100, 102, 104]"):
+            importer.dedupe_batch(list(self.ROWS), offsets, "r")
@@ -45,6 +45,11 @@ urlpatterns = [
         WeatherChartView.as_view(),
         name="weather-chart",
     ),
+    path(
+        "<str:model>/chart/compare/",
+        ObservationCompareChartView.as_view(),
+        name="observation-compare-chart",
+    ),
     path(
         "<str:model>/filter-options/",
         observation_filter_options,
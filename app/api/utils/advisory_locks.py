@@ -0,0 +1,32 @@
+import hashlib
+from typing import Any, Iterable, List, Tuple
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def advisory_lock_ids(namespace: str, keys: Iterable[Tuple[Any, ...]]) -> List[int]:
+    """
+    每個 key 對應的 pg advisory lock id（64-bit，跨 process 固定），已排序。
+    """
+    ids = set()
+    for key in keys:
+        text = ":".join([namespace, *(str(part) for part in key)])
+        digest = hashlib.blake2b(text.encode(), digest_size=8).digest()
+        ids.add(int.from_bytes(digest, "big", signed=True))
+    return sorted(ids)
+
+
+def lock_keys(
+    namespace: str, keys: Iterable[Tuple[Any, ...]], using: str = DEFAULT_DB_ALIAS
+):
+    """
+    在目前的 transaction 中取得這些 key 的 advisory lock，commit / rollback 時釋放。
+    依 lock id 排序取得，多個 process 同時鎖重疊的 key 不會互相 deadlock。
+    """
+    ids = advisory_lock_ids(namespace, keys)
+    if not ids:
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(k) FROM unnest(%s::bigint[]) AS k", [ids]
+        )
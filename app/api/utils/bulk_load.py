@@ -0,0 +1,175 @@
+import datetime
+import io
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from django.db import connections, router
+from psycopg2.extras import Json
+
+from .bulk_upsert import UpsertResult, conflict_action, prep_values
+
+# staging table 的額外欄位：來源 resource 與寫入順序（同一自然鍵以最後一筆為準）
+RID_COLUMN = "_resource_id"
+ORD_COLUMN = "_ord"
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_text(value) -> str:
+    """
+    轉成 COPY text 格式的一格。
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, Json):
+        value = value.dumps(value.adapted)
+    elif isinstance(value, (datetime.date, datetime.time)):
+        value = value.isoformat()
+    else:
+        value = str(value)
+    return value.translate(_COPY_ESCAPES)
+
+
+class StagingTable:
+    """
+    --bulk-load 用的 unlogged staging table。
+    - copy_rows()：以 COPY FROM STDIN 把已轉型的 rows 灌進 staging
+    - merge()：每個 resource 一個 INSERT ... SELECT ... ON CONFLICT 合併進正式資料表，
+      比較 / 更新規則與 bulk_upsert 相同
+    - 用完呼叫 drop()
+    """
+
+    def __init__(
+        self, model, unique_fields: Sequence[str], using: Optional[str] = None
+    ):
+        self.model = model
+        self.unique_fields = list(unique_fields)
+        self.conn = connections[using or router.db_for_write(model)]
+        opts = model._meta
+        self.insert_fields = [f for f in opts.concrete_fields if not f.primary_key]
+        self.table = f"{opts.db_table}_staging_{os.getpid()}"
+        # 各 resource 有提供的欄位（ON CONFLICT 時只更新這些欄位）
+        self.provided: Dict[str, Set[str]] = {}
+
+    def create(self):
+        qn = self.conn.ops.quote_name
+        columns = ", ".join(
+            f"{qn(f.column)} {f.db_type(self.conn)}" for f in self.insert_fields
+        )
+        with self.conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {qn(self.table)}")
+            cursor.execute(
+                f"CREATE UNLOGGED TABLE {qn(self.table)} ("
+                f"{qn(ORD_COLUMN)} bigserial, {qn(RID_COLUMN)} text NOT NULL, {columns})"
+            )
+
+    def drop(self):
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                f"DROP TABLE IF EXISTS {self.conn.ops.quote_name(self.table)}"
+            )
+
+    def copy_rows(self, resource_id: str, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        provided = self.provided.setdefault(resource_id, set())
+        for row in rows:
+            provided.update(row)
+
+        rid = _copy_text(resource_id)
+        buf = io.StringIO()
+        for values in prep_values(self.conn, self.model, self.insert_fields, rows):
+            buf.write(rid)
+            for value in values:
+                buf.write("\t")
+                buf.write(_copy_text(value))
+            buf.write("\n")
+        buf.seek(0)
+
+        qn = self.conn.ops.quote_name
+        columns = ", ".join(
+            [qn(RID_COLUMN)] + [qn(f.column) for f in self.insert_fields]
+        )
+        with self.conn.cursor() as cursor:
+            cursor.cursor.copy_expert(
+                f"COPY {qn(self.table)} ({columns}) FROM STDIN", buf
+            )
+
+    def merge(self, resource_id: str) -> UpsertResult:
+        """
+        把 staging 中一個 resource 的資料合併進正式資料表（單一 statement）。
+        """
+        opts = self.model._meta
+        qn = self.conn.ops.quote_name
+        target = qn(opts.db_table)
+        staging = qn(self.table)
+
+        provided = self.provided.get(resource_id, set())
+        compare_fields = [
+            f
+            for f in self.insert_fields
+            if f.name in provided and f.name not in self.unique_fields
+        ]
+        auto_now_fields = [
+            f
+            for f in self.insert_fields
+            if getattr(f, "auto_now", False) and f.name not in provided
+        ]
+        action = conflict_action(
+            self.conn, target, compare_fields, compare_fields + auto_now_fields
+        )
+
+        columns = ", ".join(qn(f.column) for f in self.insert_fields)
+        keys = ", ".join(qn(opts.get_field(k).column) for k in self.unique_fields)
+        sql = (
+            f"WITH merged AS ("
+            f"INSERT INTO {target} ({columns}) "
+            f"SELECT DISTINCT ON ({keys}) {columns} FROM {staging} "
+            f"WHERE {qn(RID_COLUMN)} = %s ORDER BY {keys}, {qn(ORD_COLUMN)} DESC "
+            f"ON CONFLICT ({keys}) {action} "
+            f"RETURNING (xmax = 0) AS is_insert) "
+            f"SELECT count(*) FILTER (WHERE is_insert), count(*) FILTER (WHERE NOT is_insert) "
+            f"FROM merged"
+        )
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT count(*) FROM (SELECT DISTINCT {keys} FROM {staging} "
+                f"WHERE {qn(RID_COLUMN)} = %s) AS k",
+                [resource_id],
+            )
+            (total,) = cursor.fetchone()
+            cursor.execute(sql, [resource_id])
+            inserted, updated = cursor.fetchone()
+
+        return UpsertResult(inserted, updated, total - inserted - updated)
+
+
+@contextmanager
+def deferred_secondary_indexes(model, using: Optional[str] = None):
+    """
+    暫時移除資料表上的次要索引（非 primary key、非 unique），離開時依原定義重建。
+    大量合併時不用逐筆維護索引，最後一次建好。yield 被移除的索引名稱。
+    需在 transaction 中使用：中途失敗時 rollback 會連同 DROP INDEX 一起還原。
+    """
+    conn = connections[using or router.db_for_write(model)]
+    qn = conn.ops.quote_name
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT i.relname, pg_get_indexdef(i.oid) "
+            "FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+            "WHERE x.indrelid = %s::regclass AND NOT x.indisprimary AND NOT x.indisunique",
+            [qn(model._meta.db_table)],
+        )
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute(f"DROP INDEX {qn(name)}")
+
+    yield [name for name, _ in indexes]
+
+    with conn.cursor() as cursor:
+        for _, definition in indexes:
+            cursor.execute(definition)
+        cursor.execute(f"ANALYZE {qn(model._meta.db_table)}")
@@ -0,0 +1,263 @@
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from django.db import connections, models, router
+from psycopg2.extras import execute_values
+
+
+class UpsertResult(NamedTuple):
+    inserted: int
+    updated: int
+    unchanged: int
+
+
+class DiffResult(NamedTuple):
+    """bulk_diff 的結果：實際寫入時會 insert / update / 不變的筆數，以及各欄位會變動的筆數"""
+
+    inserted: int
+    updated: int
+    unchanged: int
+    changed_columns: Counter
+
+
+def natural_key_fields(model) -> Optional[List[str]]:
+    """
+    回傳模型第一個（無條件的）UniqueConstraint 欄位，當作匯入時的自然鍵。
+    """
+    for c in model._meta.constraints:
+        if isinstance(c, models.UniqueConstraint) and c.fields and c.condition is None:
+            return list(c.fields)
+    return None
+
+
+def has_unique_constraint(model, unique_fields: Sequence[str]) -> bool:
+    """
+    ON CONFLICT (...) 需要一個欄位完全相同的 unique index 才能使用。
+    """
+    target = set(unique_fields)
+    if len(target) == 1:
+        field = model._meta.get_field(next(iter(target)))
+        if field.unique:
+            return True
+    for c in model._meta.constraints:
+        if (
+            isinstance(c, models.UniqueConstraint)
+            and c.condition is None
+            and set(c.fields) == target
+        ):
+            return True
+    return False
+
+
+def conflict_action(conn, table: str, compare_fields, update_fields) -> str:
+    """
+    ON CONFLICT 之後的動作：只更新有提供的欄位，且內容沒變的列不改寫。
+    """
+    if not compare_fields:
+        return "DO NOTHING"
+    qn = conn.ops.quote_name
+    set_sql = ", ".join(
+        f"{qn(f.column)} = EXCLUDED.{qn(f.column)}" for f in update_fields
+    )
+    # 內容沒變的列不改寫，省下 dead tuple 與 WAL
+    old = ", ".join(f"{table}.{qn(f.column)}" for f in compare_fields)
+    new = ", ".join(f"EXCLUDED.{qn(f.column)}" for f in compare_fields)
+    return f"DO UPDATE SET {set_sql} WHERE ROW({old}) IS DISTINCT FROM ROW({new})"
+
+
+def prep_values(conn, model, fields, rows: List[Dict[str, Any]]) -> List[tuple]:
+    # 與 ORM save 相同的轉換（default、auto_now、get_db_prep_save）
+    values = []
+    for row in rows:
+        obj = model(**row)
+        values.append(
+            tuple(
+                f.get_db_prep_save(f.pre_save(obj, True), connection=conn)
+                for f in fields
+            )
+        )
+    return values
+
+
+def _dedupe_and_group(
+    rows: List[Dict[str, Any]], unique_fields: Sequence[str]
+) -> Tuple[int, Dict[tuple, List[Dict[str, Any]]]]:
+    """
+    同一批內自然鍵重複時以最後一筆為準，再依提供的欄位分組。
+    回傳 (去重後筆數, {欄位 tuple: rows})。
+    """
+    latest: Dict[tuple, Dict[str, Any]] = {}
+    for row in rows:
+        latest[tuple(row[k] for k in unique_fields)] = row
+
+    # 正常情況一個 resource 的欄位都一樣，只會有一組
+    groups: Dict[tuple, List[Dict[str, Any]]] = defaultdict(list)
+    for row in latest.values():
+        groups[tuple(row)].append(row)
+    return len(latest), groups
+
+
+def _upsert_group(
+    conn,
+    model,
+    row_keys: Sequence[str],
+    rows: List[Dict[str, Any]],
+    unique_fields: Sequence[str],
+    page_size: int,
+):
+    opts = model._meta
+    qn = conn.ops.quote_name
+    table = qn(opts.db_table)
+
+    # INSERT 用所有非自動主鍵欄位，沒給值的欄位走 model default（與 ORM 相同）
+    insert_fields = [f for f in opts.concrete_fields if not f.primary_key]
+    auto_now_fields = [
+        f
+        for f in insert_fields
+        if getattr(f, "auto_now", False) and f.name not in row_keys
+    ]
+    # ON CONFLICT 時只更新 API 有提供的欄位，比照 update_or_create(defaults=...)
+    compare_fields = [opts.get_field(k) for k in row_keys if k not in unique_fields]
+    update_fields = compare_fields + auto_now_fields
+
+    values = prep_values(conn, model, insert_fields, rows)
+
+    columns = ", ".join(qn(f.column) for f in insert_fields)
+    conflict = ", ".join(qn(opts.get_field(k).column) for k in unique_fields)
+
+    action = conflict_action(conn, table, compare_fields, update_fields)
+
+    sql = (
+        f"INSERT INTO {table} ({columns}) VALUES %s "
+        f"ON CONFLICT ({conflict}) {action} "
+        f"RETURNING (xmax = 0)"
+    )
+
+    with conn.cursor() as cursor:
+        returned = execute_values(
+            cursor.cursor, sql, values, page_size=page_size, fetch=True
+        )
+
+    inserted = sum(1 for (is_insert,) in returned if is_insert)
+    updated = len(returned) - inserted
+    return inserted, updated
+
+
+def bulk_upsert(
+    model,
+    rows: List[Dict[str, Any]],
+    unique_fields: Sequence[str],
+    using: Optional[str] = None,
+    page_size: int = 1000,
+) -> UpsertResult:
+    """
+    把一批已轉型的 rows 以 INSERT ... ON CONFLICT (unique_fields) DO UPDATE 一次寫入。
+    - unique_fields 必須對應到模型上的 unique constraint
+    - 同一批內自然鍵重複時以最後一筆為準（同一列在一個 statement 內不能更新兩次）
+    - 既有且內容完全相同的資料不會被改寫，計入 unchanged
+    - 不會觸發 post_save signal
+    """
+    if not rows:
+        return UpsertResult(0, 0, 0)
+
+    conn = connections[using or router.db_for_write(model)]
+
+    total, groups = _dedupe_and_group(rows, unique_fields)
+
+    inserted = 0
+    updated = 0
+    for row_keys, group in groups.items():
+        i, u = _upsert_group(conn, model, row_keys, group, unique_fields, page_size)
+        inserted += i
+        updated += u
+
+    return UpsertResult(inserted, updated, total - inserted - updated)
+
+
+def _diff_group(
+    conn,
+    model,
+    row_keys: Sequence[str],
+    rows: List[Dict[str, Any]],
+    unique_fields: Sequence[str],
+    page_size: int,
+):
+    opts = model._meta
+    qn = conn.ops.quote_name
+    table = qn(opts.db_table)
+
+    key_fields = [opts.get_field(k) for k in unique_fields]
+    compare_fields = [opts.get_field(k) for k in row_keys if k not in unique_fields]
+    fields = key_fields + compare_fields
+
+    values = prep_values(conn, model, fields, rows)
+
+    # VALUES 的每一欄轉成欄位型別，比較規則與 bulk_upsert 的 IS DISTINCT FROM 相同
+    template = (
+        "(" + ", ".join(f"CAST(%s AS {f.cast_db_type(conn)})" for f in fields) + ")"
+    )
+    alias = ", ".join(f"c{i}" for i in range(len(fields)))
+    join = " AND ".join(f"t.{qn(f.column)} = v.c{i}" for i, f in enumerate(key_fields))
+    offset = len(key_fields)
+    diffs = "".join(
+        f", t.{qn(f.column)} IS DISTINCT FROM v.c{offset + i}"
+        for i, f in enumerate(compare_fields)
+    )
+    sql = (
+        f"SELECT t.{qn(opts.pk.column)} IS NULL{diffs} "
+        f"FROM (VALUES %s) AS v ({alias}) "
+        f"LEFT JOIN {table} t ON {join}"
+    )
+
+    with conn.cursor() as cursor:
+        returned = execute_values(
+            cursor.cursor,
+            sql,
+            values,
+            template=template,
+            page_size=page_size,
+            fetch=True,
+        )
+
+    inserted = 0
+    updated = 0
+    changed_columns: Counter = Counter()
+    for is_new, *changed in returned:
+        if is_new:
+            inserted += 1
+            continue
+        if any(changed):
+            updated += 1
+            changed_columns.update(f.name for f, c in zip(compare_fields, changed) if c)
+    return inserted, updated, changed_columns
+
+
+def bulk_diff(
+    model,
+    rows: List[Dict[str, Any]],
+    unique_fields: Sequence[str],
+    using: Optional[str] = None,
+    page_size: int = 1000,
+) -> DiffResult:
+    """
+    不寫入資料，預覽 bulk_upsert 會做的事：每組欄位一個 SELECT（VALUES LEFT JOIN 自然鍵）。
+    - 自然鍵不存在 → inserted；有欄位不同 → updated（並累計 changed_columns）；其餘 unchanged
+    - 去重與比較規則與 bulk_upsert 相同，結果可直接對照實際匯入
+    """
+    if not rows:
+        return DiffResult(0, 0, 0, Counter())
+
+    conn = connections[using or router.db_for_read(model)]
+
+    total, groups = _dedupe_and_group(rows, unique_fields)
+
+    inserted = 0
+    updated = 0
+    changed_columns: Counter = Counter()
+    for row_keys, group in groups.items():
+        i, u, c = _diff_group(conn, model, row_keys, group, unique_fields, page_size)
+        inserted += i
+        updated += u
+        changed_columns.update(c)
+
+    return DiffResult(inserted, updated, total - inserted - updated, changed_columns)
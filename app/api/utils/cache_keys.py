@@ -1,5 +1,11 @@
-def location_map_list_key(year: str | None, item: str | None) -> str:
-    return f"location_map_list:{year or 'all'}:{item or 'all'}"
+def location_map_list_key(year: int | None, item: str | None) -> str:
+    year = "all" if year is None else year
+    return f"location_map_list:{year}:{item or 'all'}"
+
+
+def location_map_list_variants_key() -> str:
+    # 上次重建寫入的所有樣站列表 key，下次重建時刪掉已經不存在的組合
+    return "location_map_list:variants"
 
 
 def location_map_filter_key() -> str:
@@ -8,3 +14,21 @@ def location_map_filter_key() -> str:
 
 def segis_cache_key(name):
     return f"segis:{name}"
+
+
+def map_cache_rebuild_pending_key() -> str:
+    return "location_map_rebuild_pending"
+
+
+def rollup_version_key(code: str) -> str:
+    return f"rollup_version:{code}"
+
+
+def chart_cache_key(code: str, location_id: str, year, params: dict) -> str:
+    year = "all" if year is None else year
+    extra = "".join(f":{k}={params[k]}" for k in sorted(params))
+    return f"chart:{code}:{location_id}:{year}{extra}"
+
+
+def chart_refresh_lock_key(chart_key: str) -> str:
+    return f"{chart_key}:refreshing"
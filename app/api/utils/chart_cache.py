@@ -0,0 +1,184 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.core.cache import cache
+from django.db.models import Count, F
+
+from ..obs_config import OBS_CONFIG
+from ..tasks import refresh_chart_cache_task
+from .cache_keys import chart_cache_key, chart_refresh_lock_key
+from .daily_rollup import resample_daily_rollups, resample_stations, rollup_version
+from .date_filters import year_filter
+from .downsample import (
+    DEFAULT_MAX_POINTS,
+    RAW_CHART_INTERVAL,
+    downsample_series,
+    row_timestamp,
+    spread_within_day,
+)
+
+# 各觀測項目圖表 API 回傳的欄位（皆來自每日彙總表）
+CHART_FIELDS: Dict[str, tuple] = {
+    "plantphenology": ("species_count",),
+    "cameratrap": ("species_count",),
+    "terresoundindex": ("aci", "adi", "bi", "ndsi"),
+    "birdnetsound": ("species_count",),
+    "biosound": ("species_count",),
+    "weather": ("air_temperature", "precipitation"),
+}
+
+# interval=raw 可用的觀測項目（高頻的聲音指數 / 氣象感測）：
+# 原始資料的排序與輸出欄位（圖表欄位 → model 欄位）
+RAW_CHART_SOURCES: Dict[str, Dict[str, Any]] = {
+    "terresoundindex": {
+        "order_by": ("measurementDeterminedDate", "id"),
+        "values": {
+            "date": "measurementDeterminedDate",
+            "aci": "ACI",
+            "adi": "ADI",
+            "bi": "BI",
+            "ndsi": "NDSI",
+        },
+    },
+    "weather": {
+        "order_by": ("eventDate", "eventTime", "id"),
+        "values": {
+            "date": "eventDate",
+            "time": "eventTime",
+            "air_temperature": "AirTemperature",
+            "precipitation": "Precipitation",
+        },
+    },
+}
+# 降採樣參數只影響 raw 模式
+RAW_CHART_PARAMS = ("max_points", "downsample")
+
+# 沒人再查的圖表 cache 過一段時間自然消失
+CHART_CACHE_TIMEOUT = 7 * 24 * 3600
+# 背景重算的鎖，避免同一張圖同時排多次重算
+CHART_REFRESH_LOCK_SECONDS = 60
+
+
+def chart_rows(
+    code: str,
+    location_id: str,
+    year: Optional[int] = None,
+    interval: str = "day",
+    **params: Any,
+) -> List[Dict[str, Any]]:
+    """
+    由每日彙總表取出圖表資料（未經 cache），interval 見 CHART_INTERVALS；
+    interval=raw 時改讀原始資料再降採樣。
+    """
+    if interval == RAW_CHART_INTERVAL:
+        return raw_chart_rows(code, location_id, year, **params)
+    return resample_daily_rollups(
+        code, location_id, CHART_FIELDS[code], year=year, interval=interval
+    )
+
+
+def raw_chart_rows(
+    code: str,
+    location_id: str,
+    year: Optional[int] = None,
+    max_points: int = DEFAULT_MAX_POINTS,
+    downsample: str = "lttb",
+) -> List[Dict[str, Any]]:
+    """
+    原始解析度的圖表資料：依時間順序以 server-side cursor 串流讀取，
+    邊讀邊降採樣（LTTB 或每區間 min / max），最多約 max_points 點。
+    """
+    source = RAW_CHART_SOURCES[code]
+    cfg = OBS_CONFIG[code]
+    qs = cfg["model"].objects.filter(locationID=location_id)
+    if year is not None:
+        qs = qs.filter(year_filter(cfg["date_field"], year))
+
+    x = row_timestamp
+    if "time" in source["values"]:
+        n = qs.count()
+    else:
+        # 只有日期：同一天的資料依筆數平均分散在當天，總筆數由各天筆數加總
+        day_counts = dict(
+            qs.values_list(cfg["date_field"]).annotate(count=Count("pk")).order_by()
+        )
+        n = sum(day_counts.values())
+        x = spread_within_day(day_counts)
+    rows = (
+        qs.order_by(*source["order_by"])
+        .values(**{name: F(field) for name, field in source["values"].items()})
+        .iterator(chunk_size=2000)
+    )
+    return downsample_series(rows, n, max_points, CHART_FIELDS[code], downsample, x)
+
+
+def refresh_chart_cache(
+    code: str, location_id: str, year: Optional[int] = None, **params: Any
+) -> List[Dict[str, Any]]:
+    """
+    重算一張圖並寫入 cache；先記下版本再查詢，查詢期間若有新資料，
+    存進去的仍是舊版本，下次讀取時會再重算。
+    """
+    key = chart_cache_key(code, location_id, year, params)
+    version = rollup_version(code)
+    rows = chart_rows(code, location_id, year, **params)
+    cache.set(
+        key,
+        {"version": version, "rows": rows},
+        timeout=CHART_CACHE_TIMEOUT,
+    )
+    cache.delete(chart_refresh_lock_key(key))
+    return rows
+
+
+def cached_chart_rows(
+    code: str, location_id: str, year: Optional[int] = None, **params: Any
+) -> List[Dict[str, Any]]:
+    """
+    圖表 API 用，key 為 (觀測項目, 樣站, 年份, 其他參數)：
+    - cache 版本與目前資料版本相同 → 直接回傳
+    - 版本較舊（每日彙總更新後）→ 先回傳舊資料，
+      排一個 Celery task 在背景重算（stale-while-revalidate）
+    - 沒有 cache → 當場計算並寫入
+    """
+    if params.get("interval") != RAW_CHART_INTERVAL:
+        # 不同 max_points 的彙總圖表是同一份資料，不分開 cache
+        params = {k: v for k, v in params.items() if k not in RAW_CHART_PARAMS}
+
+    key = chart_cache_key(code, location_id, year, params)
+    entry = cache.get(key)
+    if entry is None:
+        return refresh_chart_cache(code, location_id, year, **params)
+
+    if entry["version"] != rollup_version(code):
+        if cache.add(
+            chart_refresh_lock_key(key), 1, timeout=CHART_REFRESH_LOCK_SECONDS
+        ):
+            refresh_chart_cache_task.delay(code, location_id, year, params)
+    return entry["rows"]
+
+
+def compare_stations(
+    code: str,
+    location_ids: List[str],
+    fields: Iterable[str],
+    year: Optional[int] = None,
+    interval: str = "day",
+) -> Dict[str, Any]:
+    """
+    多樣站比較圖表：一個分組查詢取出所有樣站的資料，對齊到共同的時間軸。
+    回傳 {"dates": [...], "series": {樣站: {欄位: [與 dates 對齊的值，缺值為 None]}}}
+    """
+    fields = list(fields)
+    rows = resample_stations(code, location_ids, fields, year=year, interval=interval)
+    dates = sorted({row["date"] for row in rows})
+    position = {date: i for i, date in enumerate(dates)}
+    series = {
+        location_id: {name: [None] * len(dates) for name in fields}
+        for location_id in location_ids
+    }
+    for row in rows:
+        values = series[row["location_id"]]
+        i = position[row["date"]]
+        for name in fields:
+            values[name][i] = row[name]
+    return {"dates": dates, "series": series}
@@ -0,0 +1,368 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .import_metrics import StageTimer, timed_stage
+from .json_stream import iter_json_records
+
+CKAN_BASE = "https://data.depositar.io/api/3/action"
+CKAN_PACKAGE_SHOW = f"{CKAN_BASE}/package_show"
+CKAN_RESOURCE_SHOW = f"{CKAN_BASE}/resource_show"
+CKAN_DATASTORE_SEARCH = f"{CKAN_BASE}/datastore_search"
+CKAN_DATASTORE_SEARCH_SQL = f"{CKAN_BASE}/datastore_search_sql"
+
+DEFAULT_USER_AGENT = "LTSERImporter/1.0"
+
+# 串流解析時每次從 socket 讀取的 bytes
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class CKANError(Exception):
+    """CKAN API 回傳非 200"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+# ---------- HTTP session with retry/backoff ----------
+def make_session(
+    total_retries: int = 5,
+    backoff: float = 0.5,
+    user_agent: str = DEFAULT_USER_AGENT,
+) -> requests.Session:
+    s = requests.Session()
+    retry = Retry(
+        total=total_retries,
+        connect=total_retries,
+        read=total_retries,
+        status=total_retries,
+        status_forcelist=(429, 500, 502, 503, 504, 520, 521, 522, 524),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        backoff_factor=backoff,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=10, pool_maxsize=10)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    s.headers.update(
+        {
+            "User-Agent": user_agent,
+            "Connection": "keep-alive",
+            "Accept": "application/json",
+        }
+    )
+    return s
+
+
+# ---------- 先用 package_show 取得所有 resource_id ----------
+def fetch_package_resource_ids(
+    session: requests.Session,
+    package_id: str,
+    formats: Optional[List[str]] = None,
+    include_non_datastore: bool = False,
+    timeout: int = 60,
+) -> List[Dict[str, Any]]:
+    """
+    回傳符合條件的資源清單，每個元素至少包含 {'id': <id>, 'name': <name>, 'format': <format>, 'datastore_active': bool}
+    以及判斷上游是否有更新用的 last_modified / metadata_modified
+    - formats: 例如 ["CSV", "JSON"]。大小寫不敏感。
+    - include_non_datastore: True 則不過濾 datastore_active；False 只要 datastore_active=True
+    """
+    r = session.get(CKAN_PACKAGE_SHOW, params={"id": package_id}, timeout=timeout)
+    if r.status_code != 200:
+        raise CKANError(f"package_show failed: HTTP {r.status_code}", r.status_code)
+    data = r.json()
+    resources = (data.get("result") or {}).get("resources") or []
+
+    out = []
+    fmt_set = {f.upper() for f in formats} if formats else None
+    for res in resources:
+        rid = res.get("id")
+        name = res.get("name") or rid
+        fmt = (res.get("format") or "").upper()
+        ds_active = bool(res.get("datastore_active"))
+        if not include_non_datastore and not ds_active:
+            continue
+        if fmt_set and fmt not in fmt_set:
+            continue
+        out.append(
+            {
+                "id": rid,
+                "name": name,
+                "format": fmt,
+                "datastore_active": ds_active,
+                "last_modified": res.get("last_modified"),
+                "metadata_modified": res.get("metadata_modified"),
+            }
+        )
+    return out
+
+
+def fetch_resource_info(
+    session: requests.Session, resource_id: str, timeout: int = 60
+) -> Dict[str, Any]:
+    """
+    直接指定 resource_id 時，用 resource_show 取得名稱與修改時間。
+    取不到時仍照常同步，只是無法判斷是否可以跳過。
+    """
+    info = {
+        "id": resource_id,
+        "name": resource_id,
+        "format": "",
+        "datastore_active": True,  # 既然直接指定，就當作要抓
+        "last_modified": None,
+        "metadata_modified": None,
+    }
+    r = session.get(CKAN_RESOURCE_SHOW, params={"id": resource_id}, timeout=timeout)
+    if r.status_code != 200:
+        return info
+
+    res = r.json().get("result") or {}
+    info.update(
+        {
+            "name": res.get("name") or resource_id,
+            "format": (res.get("format") or "").upper(),
+            "last_modified": res.get("last_modified"),
+            "metadata_modified": res.get("metadata_modified"),
+        }
+    )
+    return info
+
+
+class StreamedRecords:
+    """
+    串流解析的 records：邊從連線讀取邊逐筆產生，整頁不會同時留在記憶體。
+    只能迭代一次；讀完後 total 才有值（CKAN 的 total 排在 records 之後）。
+    有給 timer 時，讀取連線的時間算在 fetch（解析的時間由 iter_pages 整批計入 decode）。
+    """
+
+    def __init__(self, response: requests.Response, timer: Optional[StageTimer] = None):
+        self.response = response
+        self.timer = timer
+        self.meta: Dict[str, Any] = {}
+
+    @property
+    def total(self) -> Optional[int]:
+        return self.meta.get("total")
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        chunks = self.response.iter_content(STREAM_CHUNK_SIZE)
+        try:
+            if self.timer is not None:
+                chunks = self.timer.timed(chunks, "fetch")
+            yield from iter_json_records(chunks, self.meta)
+        finally:
+            self.response.close()
+
+
+Records = Union[List[Dict[str, Any]], StreamedRecords]
+
+
+# ---------- 逐批拉 Datastore records ----------
+def fetch_datastore_page(
+    session: requests.Session,
+    resource_id: str,
+    offset: int,
+    limit: int,
+    timeout: int = 120,
+    stream: bool = False,
+    timer: Optional[StageTimer] = None,
+    **query_params,
+) -> Tuple[Records, Optional[int]]:
+    """
+    抓一頁 datastore_search，回傳 (records, total)。
+    stream=True 時 records 為 StreamedRecords、total 為 None（讀完後看 records.total）。
+    timer：有給時把下載 / 解析的時間分別累計到 fetch / decode。
+    """
+    params = {
+        "resource_id": resource_id,
+        "limit": limit,
+        "offset": offset,
+        **query_params,
+    }
+    with timed_stage(timer, "fetch"):
+        r = session.get(
+            CKAN_DATASTORE_SEARCH, params=params, timeout=timeout, stream=stream
+        )
+    if r.status_code != 200:
+        r.close()
+        raise CKANError(
+            f"datastore_search failed: HTTP {r.status_code} (offset={offset})",
+            r.status_code,
+        )
+    if stream:
+        return StreamedRecords(r, timer), None
+
+    with timed_stage(timer, "decode"):
+        data = r.json()
+    result = data.get("result") or {}
+    return result.get("records") or [], result.get("total")
+
+
+def _quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def fetch_datastore_fields(
+    session: requests.Session,
+    resource_id: str,
+    timeout: int = 120,
+    timer: Optional[StageTimer] = None,
+) -> Tuple[List[str], Optional[int]]:
+    """
+    取得 resource 的欄位名稱與總筆數（datastore_search limit=0）。
+    """
+    with timed_stage(timer, "fetch"):
+        r = session.get(
+            CKAN_DATASTORE_SEARCH,
+            params={"resource_id": resource_id, "limit": 0},
+            timeout=timeout,
+        )
+    if r.status_code != 200:
+        raise CKANError(
+            f"datastore_search failed: HTTP {r.status_code} (fields)", r.status_code
+        )
+    result = r.json().get("result") or {}
+    fields = [f["id"] for f in result.get("fields") or [] if f.get("id")]
+    return fields, result.get("total")
+
+
+def fetch_datastore_sql_page(
+    session: requests.Session,
+    resource_id: str,
+    fields: List[str],
+    after_id: int,
+    limit: int,
+    timeout: int = 120,
+    stream: bool = False,
+    timer: Optional[StageTimer] = None,
+) -> Records:
+    """
+    以 _id keyset 抓一頁：WHERE _id > after_id ORDER BY _id LIMIT limit。
+    伺服器不必掃過前面的資料，深處的頁面也和第一頁一樣快。
+    stream=True 時回傳 StreamedRecords。
+    """
+    # 不取 _full_text（全文檢索用的 tsvector，很大而且用不到）
+    columns = ", ".join(_quote_ident(f) for f in fields if f != "_full_text") or "*"
+    sql = (
+        f"SELECT {columns} FROM {_quote_ident(resource_id)} "
+        f'WHERE "_id" > {int(after_id)} ORDER BY "_id" LIMIT {int(limit)}'
+    )
+    with timed_stage(timer, "fetch"):
+        r = session.get(
+            CKAN_DATASTORE_SEARCH_SQL,
+            params={"sql": sql},
+            timeout=timeout,
+            stream=stream,
+        )
+    if r.status_code != 200:
+        r.close()
+        raise CKANError(
+            f"datastore_search_sql failed: HTTP {r.status_code} (_id > {after_id})",
+            r.status_code,
+        )
+    if stream:
+        return StreamedRecords(r, timer)
+    with timed_stage(timer, "decode"):
+        return (r.json().get("result") or {}).get("records") or []
+
+
+class KeysetPager:
+    """
+    用 _id keyset 分頁的 fetch(offset, limit)，與 fetch_datastore_page 同介面。
+    - offset 接在上一頁之後（或 0）時用 datastore_search_sql 的 _id > last
+    - 其他 offset（從 checkpoint / 切段接續）先用一次依 _id 排序的 offset 查詢找到起點
+    - 伺服器沒開放 datastore_search_sql 時，改回 offset 分頁（依 _id 排序）
+    只適合依序呼叫；offset 與 offset 分頁時的位置相同，checkpoint 可以共用。
+    stream=True 時回傳串流的 records，要讀完這一頁才能接著抓下一頁。
+    """
+
+    # datastore_search_sql 未開放 / 沒有權限
+    FALLBACK_STATUS = (400, 403, 404, 409)
+
+    def __init__(
+        self,
+        get_session: Callable[[], requests.Session],
+        resource_id: str,
+        timeout: int = 120,
+        on_fallback: Optional[Callable[[str], None]] = None,
+        stream: bool = False,
+        timer: Optional[StageTimer] = None,
+    ):
+        self.get_session = get_session
+        self.resource_id = resource_id
+        self.timeout = timeout
+        self.on_fallback = on_fallback
+        self.stream = stream
+        self.timer = timer
+        self.use_sql = True
+        self.fields: Optional[List[str]] = None
+        self.total: Optional[int] = None
+        # 下一頁的 offset -> 前一筆的 _id
+        self.last_ids: Dict[int, int] = {0: 0}
+
+    def fetch(self, offset: int, limit: int) -> Tuple[Records, Optional[int]]:
+        session = self.get_session()
+        stream = self.stream and limit > 0
+        if limit and self.use_sql and offset in self.last_ids:
+            try:
+                if self.fields is None:
+                    self.fields, self.total = fetch_datastore_fields(
+                        session, self.resource_id, self.timeout, self.timer
+                    )
+                records = fetch_datastore_sql_page(
+                    session,
+                    self.resource_id,
+                    self.fields,
+                    self.last_ids.pop(offset),
+                    limit,
+                    self.timeout,
+                    stream=stream,
+                    timer=self.timer,
+                )
+            except CKANError as e:
+                if e.status not in self.FALLBACK_STATUS:
+                    raise
+                self.use_sql = False
+                if self.on_fallback:
+                    self.on_fallback(f"{e}; falling back to offset paging")
+            else:
+                return self._remember(offset, records), self.total
+
+        records, total = fetch_datastore_page(
+            session,
+            self.resource_id,
+            offset,
+            limit,
+            self.timeout,
+            stream=stream,
+            timer=self.timer,
+            sort="_id asc",
+        )
+        if total is not None:
+            self.total = total
+        return self._remember(offset, records), self.total
+
+    def _remember(self, offset: int, records: Records) -> Records:
+        if isinstance(records, StreamedRecords):
+            return self._remember_streamed(offset, records)
+        if records and "_id" in records[-1]:
+            self.last_ids[offset + len(records)] = int(records[-1]["_id"])
+        return records
+
+    def _remember_streamed(
+        self, offset: int, records: StreamedRecords
+    ) -> Iterator[Dict[str, Any]]:
+        # 串流：這一頁讀完才知道最後一筆的 _id
+        count = 0
+        last = None
+        for last in records:
+            count += 1
+            yield last
+        if records.total is not None:
+            self.total = records.total
+        if last is not None and "_id" in last:
+            self.last_ids[offset + count] = int(last["_id"])
@@ -0,0 +1,1116 @@
+import multiprocessing
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+from django.core.management.base import OutputWrapper
+from django.core.management.color import color_style
+from django.db import transaction
+from django.utils import timezone
+
+from ..obs_config import OBS_CONFIG
+from .bulk_load import StagingTable, deferred_secondary_indexes
+from .bulk_upsert import (
+    bulk_diff,
+    bulk_upsert,
+    has_unique_constraint,
+    natural_key_fields,
+)
+from .ckan import (
+    KeysetPager,
+    StreamedRecords,
+    fetch_datastore_page,
+    fetch_package_resource_ids,
+    fetch_resource_info,
+    make_session,
+)
+from .ckan_prefetch import (
+    AdaptivePageSize,
+    Page,
+    background_pages,
+    iter_pages,
+    prefetch_pages,
+)
+from .ckan_replay import PageRecorder, PageReplay
+from .ckan_import_worker import init_sync_worker, sync_shard
+from .coercion import coerce_records, coercion_plan
+from .daily_rollup import refresh_daily_rollups, rollup_keys
+from .duplicates import (
+    DUPLICATE_POLICIES,
+    ConflictReport,
+    DuplicateKeyError,
+    dedupe_rows,
+    differing_columns,
+)
+from .import_metrics import (
+    STAGES,
+    MetricsLog,
+    StageTimer,
+    eta_seconds,
+    stage_delta,
+    timed_stage,
+)
+from .location_years import (
+    location_year_keys,
+    mark_location_years,
+    refresh_location_years,
+)
+from .map_cache import defer_map_cache_rebuild, request_map_cache_rebuild
+from .sync_state import (
+    clear_checkpoints,
+    load_checkpoints,
+    load_sync_states,
+    record_import_run,
+    resource_unchanged,
+    save_checkpoint,
+    save_checkpoints,
+    save_sync_state,
+)
+
+
+class ImporterError(Exception):
+    """匯入參數或資源清單有誤，無法開始同步"""
+
+
+# ---------- 同步區段統計 ----------
+SYNC_COUNTERS = ("rows", "inserted", "updated", "unchanged")
+
+# --stream 未指定 --batch-size 時，每次寫入 DB 的筆數
+STREAM_BATCH_SIZE = 1000
+
+
+def new_sync_stats(
+    resource_id: str, name: str, start: int = 0, end: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    一個 resource 區段 [start, end) 的同步狀態與統計；end 為 None 代表抓到結尾。
+    start 同時是這個區段 checkpoint 的 key。
+    """
+    stats: Dict[str, Any] = {
+        "resource_id": resource_id,
+        "name": name,
+        "start": start,
+        "end": end,
+        "next_offset": start,
+    }
+    stats.update({key: 0 for key in SYNC_COUNTERS})
+    return stats
+
+
+def stats_from_checkpoint(cp, name: str) -> Dict[str, Any]:
+    stats = new_sync_stats(cp.resource_id, name, cp.range_start, cp.range_end)
+    stats["next_offset"] = cp.next_offset
+    stats.update({key: getattr(cp, key) for key in SYNC_COUNTERS})
+    return stats
+
+
+def merge_sync_stats(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    把各分段的統計依 resource 合併。
+    """
+    per_resource: Dict[str, Dict[str, Any]] = {}
+    for stats in results:
+        merged = per_resource.setdefault(
+            stats["resource_id"], new_sync_stats(stats["resource_id"], stats["name"])
+        )
+        for key in SYNC_COUNTERS:
+            merged[key] += stats[key]
+        merged["next_offset"] = max(merged["next_offset"], stats["next_offset"])
+        if stats.get("error"):
+            merged["error"] = stats["error"]
+    return per_resource
+
+
+# ---------- 匯入引擎 ----------
+class ObservationImporter:
+    """
+    CKAN datastore → OBS_CONFIG 觀測資料 model 的匯入引擎。
+    - 以 OBS_CONFIG 的 code 建立，同一套流程適用所有觀測項目
+    - 各 model 不同的地方透過 hook 覆寫：validate()（略過不合理的列）、natural_key()
+    - 輸出寫到 stdout（management command 傳入自己的 self.stdout / self.style）
+    """
+
+    def __init__(
+        self,
+        code: str,
+        unique_fields: Optional[List[str]] = None,
+        limit: int = 1000,
+        timeout: int = 120,
+        max_records: Optional[int] = None,
+        dry_run: bool = False,
+        prefetch: int = 0,
+        workers: int = 1,
+        shard_size: int = 200000,
+        full: bool = False,
+        append_only: bool = False,
+        resume: bool = False,
+        record_dir: Optional[str] = None,
+        replay_dir: Optional[str] = None,
+        bulk_load: bool = False,
+        paging: str = "keyset",
+        target_latency: float = 2.0,
+        max_limit: int = 10000,
+        stream: bool = False,
+        batch_size: Optional[int] = None,
+        on_duplicate: str = "last",
+        conflict_report: Optional[str] = None,
+        metrics: Optional[str] = None,
+        history: bool = False,
+        concurrency: int = 1,
+        stdout=None,
+        style=None,
+        log_prefix: str = "",
+    ):
+        self.code = code
+        self.model = OBS_CONFIG[code]["model"]
+
+        if not unique_fields:
+            unique_fields = natural_key_fields(self.model) or []
+        if not unique_fields:
+            raise ImporterError(
+                "請提供 --unique-fields，例如：--unique-fields eventID,dataID"
+            )
+        if not has_unique_constraint(self.model, unique_fields):
+            raise ImporterError(
+                f"--unique-fields {unique_fields} 沒有對應的 unique constraint，"
+                f"無法批次 upsert（可用：{natural_key_fields(self.model)}）"
+            )
+
+        self.unique_fields = list(unique_fields)
+        self.limit = limit
+        self.timeout = timeout
+        self.max_records = max_records
+        self.dry_run = dry_run
+        self.prefetch = max(prefetch, 0)
+        self.workers = max(workers, 1)
+        self.shard_size = max(shard_size, limit)
+        self.full = full
+        self.append_only = append_only
+        self.resume = resume
+        self.bulk_load = bulk_load
+        self.paging = paging
+        self.target_latency = target_latency
+        self.max_limit = max_limit
+        # --stream：邊下載邊解析，頁面切成 batch_size 筆一批寫入
+        self.stream = stream
+        self.batch_size = batch_size or (STREAM_BATCH_SIZE if stream else None)
+        # --concurrency N：改用 offset 分頁，同一個 resource 最多 N 頁同時抓
+        # （與 offset 分頁的 --prefetch N 是同一套 prefetch_pages）
+        self.concurrency = max(concurrency, 1)
+        if self.concurrency > 1 and stream:
+            raise ImporterError("--stream 不能與 --concurrency 同時使用")
+        if bulk_load and (dry_run or resume or self.workers > 1):
+            raise ImporterError(
+                "--bulk-load 不能與 --dry-run、--resume、--workers 同時使用"
+            )
+        self.record_dir = record_dir
+        self.replay_dir = replay_dir
+        if record_dir and replay_dir:
+            raise ImporterError("--record 與 --from-dir 不能同時使用")
+        # --record：抓到的原始頁面另存一份；--from-dir：從錄製檔讀取，不連網
+        self.recorder = PageRecorder(record_dir) if record_dir else None
+        try:
+            self.replay = PageReplay(replay_dir) if replay_dir else None
+        except FileNotFoundError as e:
+            raise ImporterError(str(e))
+
+        self.stdout = stdout or OutputWrapper(sys.stdout)
+        self.style = style or color_style()
+        self.log_prefix = log_prefix
+        self.session = make_session(user_agent=self.user_agent)
+
+        # 欄位轉型計畫只編譯一次；各欄無法轉型 / 有轉型的格數累計到整次匯入
+        self.coercion_plan = coercion_plan(self.model)
+        self.dropped: Counter = Counter()
+        self.coerced: Counter = Counter()
+        # --dry-run：各欄位會被更新的筆數
+        self.changed_columns: Counter = Counter()
+
+        # 自然鍵重複：批次內依 --on-duplicate 去重；有 --conflict-report 時
+        # 另外記住本次看過的鍵，找出跨頁 / 跨 resource 的重複（每筆一個 key 的記憶體）
+        if on_duplicate not in DUPLICATE_POLICIES:
+            raise ImporterError(
+                f"--on-duplicate 只能是 {', '.join(DUPLICATE_POLICIES)}"
+            )
+        self.on_duplicate = on_duplicate
+        self.conflict_report = conflict_report
+        self.conflicts = ConflictReport(conflict_report) if conflict_report else None
+        self.seen_keys: Dict[Tuple, Tuple[str, int]] = {}
+        self.duplicates: Counter = Counter()
+
+        # 各階段耗時；--metrics 每批寫一行 JSON，--history 每次執行存一筆 ImportRun
+        self.timer = StageTimer()
+        self.metrics_path = metrics
+        self.metrics = MetricsLog(metrics) if metrics else None
+        self.history = history
+        # CKAN 回傳的各 resource 總筆數（估計 ETA 用）
+        self.totals: Dict[str, int] = {}
+
+    @property
+    def user_agent(self) -> str:
+        return f"{self.model.__name__}Importer/1.0"
+
+    def options(self) -> Dict[str, Any]:
+        """
+        重新建立同設定 importer 所需的參數（傳給 worker process 用）。
+        """
+        return {
+            "unique_fields": self.unique_fields,
+            "limit": self.limit,
+            "timeout": self.timeout,
+            "dry_run": self.dry_run,
+            "prefetch": self.prefetch,
+            "record_dir": self.record_dir,
+            "replay_dir": self.replay_dir,
+            "paging": self.paging,
+            "target_latency": self.target_latency,
+            "max_limit": self.max_limit,
+            "stream": self.stream,
+            "batch_size": self.batch_size,
+            "on_duplicate": self.on_duplicate,
+            "conflict_report": self.conflict_report,
+            "metrics": self.metrics_path,
+            "concurrency": self.concurrency,
+            "log_prefix": self.log_prefix,
+        }
+
+    def write(self, msg: str, style_func=None):
+        msg = f"{self.log_prefix}{msg}"
+        self.stdout.write(style_func(msg) if style_func else msg)
+
+    # ---------- 各 model 可覆寫的 hook ----------
+    def validate(self, values: Dict[str, Any], row: Dict[str, Any]) -> Optional[str]:
+        """
+        回傳略過這一列的原因；None 代表可以寫入。
+        """
+        return None
+
+    def natural_key(self, values: Dict[str, Any]) -> Tuple:
+        return tuple(values.get(k) for k in self.unique_fields)
+
+    # ---------- 流程 ----------
+    def fetch_resources(
+        self,
+        package_id: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        formats: Optional[List[str]] = None,
+        include_non_datastore: bool = False,
+    ) -> List[Dict[str, Any]]:
+        if self.replay is not None:
+            self.write(f"Replaying recorded pages from: {self.replay_dir}")
+            resources = self.replay.resources()
+            if resource_id:
+                resources = [r for r in resources if r["id"] == resource_id]
+            if not resources:
+                raise ImporterError("No recorded resources found in replay directory.")
+            return resources
+
+        if resource_id:
+            self.write(f"Using single resource_id: {resource_id}")
+            resources = [fetch_resource_info(self.session, resource_id, self.timeout)]
+        else:
+            self.write(f"Fetching resources from package: {package_id}")
+            resources = fetch_package_resource_ids(
+                session=self.session,
+                package_id=package_id,
+                formats=formats,
+                include_non_datastore=include_non_datastore,
+                timeout=self.timeout,
+            )
+            if not resources:
+                raise ImporterError("No matching resources found in package.")
+
+        if self.recorder is not None:
+            self.recorder.save_resources(resources)
+        return resources
+
+    def page_fetcher(self, resource_id: str) -> Callable[[int, int], Page]:
+        """
+        回傳 fetch(offset, limit) -> (records, total)，來源是 CKAN 或 --from-dir 錄製檔。
+        每個 thread 各自使用一個 HTTP session（--prefetch 時由背景 threads 呼叫）。
+        """
+        if self.replay is not None:
+
+            def replay_page(offset: int, limit: int) -> Page:
+                with self.timer.stage("fetch"):
+                    return self.replay.fetch_page(resource_id, offset, limit)
+
+            return replay_page
+
+        local = threading.local()
+
+        def get_session():
+            session = getattr(local, "session", None)
+            if session is None:
+                session = local.session = make_session(user_agent=self.user_agent)
+            return session
+
+        if self.keyset:
+            pager = KeysetPager(
+                get_session,
+                resource_id,
+                self.timeout,
+                on_fallback=lambda msg: self.write(msg, self.style.WARNING),
+                stream=self.stream,
+                timer=self.timer,
+            )
+            fetch_page = pager.fetch
+        else:
+
+            def fetch_page(offset: int, limit: int) -> Page:
+                return fetch_datastore_page(
+                    get_session(),
+                    resource_id,
+                    offset,
+                    limit,
+                    self.timeout,
+                    stream=self.stream and limit > 0,
+                    timer=self.timer,
+                )
+
+        def fetch(offset: int, limit: int) -> Page:
+            records, total = fetch_page(offset, limit)
+            if self.recorder is not None:
+                if not isinstance(records, list):
+                    # 錄製要存整頁，串流的頁面在這裡先讀完
+                    streamed = records
+                    records = list(streamed)
+                    if total is None:
+                        total = getattr(streamed, "total", None)
+                self.recorder.save_page(resource_id, offset, records, total)
+            if isinstance(records, StreamedRecords):
+                records = self._note_streamed_total(resource_id, records)
+            elif total is not None:
+                self.totals[resource_id] = total
+            return records, total
+
+        return fetch
+
+    def _note_streamed_total(
+        self, resource_id: str, records: StreamedRecords
+    ) -> Iterable[Dict[str, Any]]:
+        # 串流的頁面讀完才知道 total
+        yield from records
+        if records.total is not None:
+            self.totals[resource_id] = records.total
+
+    @property
+    def keyset(self) -> bool:
+        # 錄製檔重播本來就沒有深 offset 的問題；同時抓多頁時必須用 offset
+        return self.paging == "keyset" and self.replay is None and self.concurrency <= 1
+
+    @property
+    def concurrent(self) -> bool:
+        return self.concurrency > 1 and self.replay is None
+
+    @property
+    def paging_label(self) -> str:
+        if self.keyset:
+            return "keyset (_id)"
+        if self.concurrent:
+            return f"offset, {self.concurrency} concurrent requests"
+        return "offset"
+
+    def fetch_total(self, resource_id: str) -> int:
+        """
+        只取 resource 的總筆數（limit=0）。
+        """
+        _, total = self.page_fetcher(resource_id)(0, 0)
+        return total or 0
+
+    def run(
+        self,
+        package_id: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        formats: Optional[List[str]] = None,
+        include_non_datastore: bool = False,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        同步 package（或單一 resource）的所有資源，回傳每個 resource 的統計。
+        --history 時不論成功或失敗都記一筆 ImportRun。
+        """
+        started_at = timezone.now()
+        started = time.monotonic()
+        try:
+            per_resource = self.sync_package(
+                package_id, resource_id, formats, include_non_datastore
+            )
+        except Exception as e:
+            if self.history:
+                self.save_history(
+                    started_at, time.monotonic() - started, {}, error=str(e)
+                )
+            raise
+        if self.history:
+            self.save_history(started_at, time.monotonic() - started, per_resource)
+        return per_resource
+
+    def sync_package(
+        self,
+        package_id: Optional[str],
+        resource_id: Optional[str],
+        formats: Optional[List[str]],
+        include_non_datastore: bool,
+    ) -> Dict[str, Dict[str, Any]]:
+        resources = self.prepare(
+            package_id, resource_id, formats, include_non_datastore
+        )
+
+        # 每批一個 transaction；整次匯入只重建一次地圖 cache
+        with defer_map_cache_rebuild():
+            if self.bulk_load:
+                results = self.bulk_load_resources(resources)
+            elif self.workers > 1:
+                results = self.sync_parallel(resources)
+            else:
+                results = []
+                for res in resources:
+                    rid = res["id"]
+                    name = res.get("name") or rid
+                    self.write(f"Sync resource [{name}] ({rid})", self.style.HTTP_INFO)
+                    for stats in res["ranges"]:
+                        self.sync_resource(stats)
+                        results.append(stats)
+
+        per_resource = merge_sync_stats(results)
+        self.finish_resources(resources, per_resource)
+        return per_resource
+
+    def prepare(
+        self,
+        package_id: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        formats: Optional[List[str]] = None,
+        include_non_datastore: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        取得資源清單、輸出設定，回傳需要同步的 resources（各帶 ranges 區段）。
+        """
+        resources = self.fetch_resources(
+            package_id, resource_id, formats, include_non_datastore
+        )
+
+        self.write("-" * 60)
+        self.write(f"Model: {self.model._meta.label}")
+        if package_id:
+            self.write(f"Package ID: {package_id}")
+        self.write(f"Unique fields: {self.unique_fields}")
+        self.write(
+            f"Batch limit: {self.limit}, Max records: {self.max_records or 'ALL'}"
+        )
+        self.write(f"Prefetch pages: {self.prefetch or 'OFF'}")
+        if self.stream:
+            self.write(f"Streaming JSON decode: ON, write batch: {self.batch_size}")
+        adaptive = "OFF"
+        if self.target_latency > 0 and self.replay is None:
+            adaptive = f"target {self.target_latency}s, max {self.max_limit}"
+        self.write(f"Paging: {self.paging_label}, adaptive page size: {adaptive}")
+        self.write(f"Workers: {self.workers}")
+        self.write(f"Resources in scope: {len(resources)}")
+
+        resources = self.plan_incremental(resources)
+        self.write(f"Resources to sync: {len(resources)}")
+        return resources
+
+    def finish_resources(
+        self,
+        resources: List[Dict[str, Any]],
+        per_resource: Dict[str, Dict[str, Any]],
+    ):
+        """
+        同步結束：記錄成功 resource 的同步進度，完整同步的清掉 checkpoint。
+        """
+        if not self.dry_run:
+            complete = self.max_records is None
+            for res in resources:
+                stats = per_resource.get(res["id"])
+                if stats is None or stats.get("error"):
+                    continue
+                save_sync_state(
+                    self.model, res, next_offset=stats["next_offset"], complete=complete
+                )
+                if complete:
+                    clear_checkpoints(self.model, res["id"])
+
+    def plan_incremental(self, resources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        依同步紀錄與 checkpoint 決定每個 resource 要不要同步、要同步哪些區段。
+        回傳的每個 resource 帶 res["ranges"]（區段統計，見 new_sync_stats）。
+        """
+        rids = [r["id"] for r in resources]
+        states = {} if self.full else load_sync_states(self.model, rids)
+        checkpoints = load_checkpoints(self.model, rids) if self.resume else {}
+
+        planned = []
+        for res in resources:
+            rid = res["id"]
+            name = res.get("name") or rid
+            state = states.get(rid)
+            start = 0
+
+            if checkpoints.get(rid):
+                ranges = [stats_from_checkpoint(cp, name) for cp in checkpoints[rid]]
+                offsets = ", ".join(str(s["next_offset"]) for s in ranges)
+                self.write(f"Resume resource [{name}] from offset(s) {offsets}")
+                planned.append({**res, "ranges": ranges})
+                continue
+
+            if state is not None and resource_unchanged(state, res):
+                self.write(f"Skip unchanged resource [{name}] ({rid})")
+                continue
+
+            if self.append_only and state is not None and state.last_offset:
+                total = self.fetch_total(rid)
+                if total >= state.last_offset:
+                    start = state.last_offset
+                    self.write(
+                        f"Resource [{name}] append-only: fetch from offset {start} (total {total})"
+                    )
+                else:
+                    # 上游筆數變少，不是單純往後新增，整份重抓
+                    self.write(
+                        f"Resource [{name}] shrank ({state.last_offset} -> {total}), full resync",
+                        self.style.WARNING,
+                    )
+
+            # 不是接續上次，舊的 checkpoint 作廢
+            if not self.dry_run:
+                clear_checkpoints(self.model, rid)
+            planned.append({**res, "ranges": [new_sync_stats(rid, name, start)]})
+        return planned
+
+    def clean_row(
+        self, values: Dict[str, Any], row: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        檢查一列已轉型的值；不能寫入時輸出原因並回傳 None。
+        """
+        if not values:
+            return None
+
+        reason = self.validate(values, row)
+        if reason:
+            self.write(f"Skip {reason} row={row}", self.style.WARNING)
+            return None
+
+        key = self.natural_key(values)
+        if any(v is None for v in key):
+            lookup = dict(zip(self.unique_fields, key))
+            self.write(f"Skip row missing unique fields: {lookup}", self.style.WARNING)
+            return None
+        return values
+
+    def iter_batches(self, stats: Dict[str, Any]) -> Iterable[List[Dict[str, Any]]]:
+        """
+        依區段統計（next_offset / end）逐頁取回原始 records。
+        """
+        offset = stats["next_offset"]
+        max_records = self.max_records
+        if stats["end"] is not None:
+            max_records = stats["end"] - offset
+            if max_records <= 0:
+                # --resume 時已經同步完的分段
+                return []
+
+        fetch = self.page_fetcher(stats["resource_id"])
+        depth = max(self.prefetch, self.concurrency if self.concurrent else 0)
+        if depth and not (self.keyset or self.stream):
+            # 背景 threads 同時預先抓後面幾頁，讓 HTTP 與寫入 DB 重疊進行
+            return prefetch_pages(
+                fetch,
+                limit=self.limit,
+                depth=depth,
+                max_records=max_records,
+                start=offset,
+            )
+
+        page_size = None
+        if self.target_latency > 0 and self.replay is None:
+            page_size = AdaptivePageSize(
+                self.limit, self.target_latency, maximum=self.max_limit
+            )
+        pages = iter_pages(
+            fetch,
+            limit=self.limit,
+            max_records=max_records,
+            start=offset,
+            page_size=page_size,
+            batch_size=self.batch_size,
+            timer=self.timer,
+        )
+        if self.prefetch:
+            # keyset / 串流必須依序抓：由一個背景 thread 先抓好後面幾批
+            return background_pages(pages, depth=self.prefetch)
+        return pages
+
+    def clean_batch(
+        self, records: List[Dict[str, Any]], stats: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """
+        整批轉型並逐列檢查，再去除自然鍵重複的列，回傳可以寫入的 rows。
+        stats 為這批所屬的區段統計（stats["next_offset"] 為這批第一筆的 offset）。
+        """
+        with self.timer.stage("coerce"):
+            batch_values = coerce_records(
+                self.coercion_plan, records, self.dropped, self.coerced
+            )
+            pending: List[Dict[str, Any]] = []
+            offsets: List[int] = []
+            for i, (values, row) in enumerate(zip(batch_values, records)):
+                values = self.clean_row(values, row)
+                if values is not None:
+                    pending.append(values)
+                    offsets.append(stats["next_offset"] + i)
+            return self.dedupe_batch(pending, offsets, stats["resource_id"])
+
+    def dedupe_batch(
+        self, rows: List[Dict[str, Any]], offsets: List[int], resource_id: str
+    ) -> List[Dict[str, Any]]:
+        """
+        依 --on-duplicate 處理批次內重複的自然鍵（同一批不能對同一列 upsert 兩次），
+        有 --conflict-report 時把重複的鍵寫進報告。
+        """
+        kept, duplicates = dedupe_rows(rows, self.natural_key, self.on_duplicate)
+        entries = []
+        for dup in duplicates:
+            key = dict(zip(self.unique_fields, dup.key))
+            at = [offsets[i] for i in dup.positions]
+            if self.on_duplicate == "error":
+                raise DuplicateKeyError(
+                    f"duplicate natural key {key} in resource {resource_id} at offsets {at}"
+                )
+            self.duplicates["in_batch"] += 1
+            if self.conflicts is not None:
+                entries.append(
+                    {
+                        "code": self.code,
+                        "scope": "batch",
+                        "resource_id": resource_id,
+                        "key": key,
+                        "offsets": at,
+                        "kept": None if dup.kept is None else offsets[dup.kept],
+                        "policy": self.on_duplicate,
+                        "columns": differing_columns(rows[i] for i in dup.positions),
+                    }
+                )
+
+        if self.conflicts is not None:
+            # 跨批次的重複不會讓 upsert 失敗（後寫的蓋掉先寫的），只記錄下來
+            dropped = {i for d in duplicates for i in d.positions if i != d.kept}
+            kept_offsets = [o for i, o in enumerate(offsets) if i not in dropped]
+            for row, offset in zip(kept, kept_offsets):
+                key = self.natural_key(row)
+                first = self.seen_keys.setdefault(key, (resource_id, offset))
+                if first == (resource_id, offset):
+                    continue
+                self.duplicates["across_batches"] += 1
+                entries.append(
+                    {
+                        "code": self.code,
+                        "scope": "run",
+                        "resource_id": resource_id,
+                        "key": dict(zip(self.unique_fields, key)),
+                        "offsets": [offset],
+                        "first": {"resource_id": first[0], "offset": first[1]},
+                    }
+                )
+            self.conflicts.write(entries)
+        return kept
+
+    def sync_resource(
+        self,
+        stats: Dict[str, Any],
+        label: str = "",
+    ) -> Dict[str, Any]:
+        """
+        同步一個 resource 區段：從 stats["next_offset"] 抓到 stats["end"]
+        （None 則抓到結尾，最多 max_records 筆），統計累加到 stats。
+        非 dry-run 時每批與資料同一個 transaction 寫入 checkpoint。
+        """
+        started = last = time.monotonic()
+        start_rows = stats["rows"]
+        stages = self.timer.snapshot()
+        for records in self.iter_batches(stats):
+            batch_rows = len(records)
+            batch_offset = stats["next_offset"]
+            pending = self.clean_batch(records, stats)
+
+            # 資料與 checkpoint 同一個 transaction：要嘛一起 commit，要嘛一起 rollback
+            with self.timer.stage("write"), transaction.atomic():
+                if self.dry_run:
+                    # 整批一個查詢比對，不寫入
+                    result = bulk_diff(self.model, pending, self.unique_fields)
+                    self.changed_columns.update(result.changed_columns)
+                else:
+                    result = bulk_upsert(self.model, pending, self.unique_fields)
+                inserted, updated, unchanged = result[:3]
+                if not self.dry_run and (inserted or updated):
+                    # 這批涉及的 (樣站, 日期) 重算每日彙總、標記樣站年份，與資料一起 commit
+                    keys = rollup_keys(self.code, pending)
+                    refresh_daily_rollups(self.code, keys)
+                    mark_location_years(self.code, location_year_keys(keys))
+
+                progress = {
+                    **stats,
+                    "rows": stats["rows"] + batch_rows,
+                    "inserted": stats["inserted"] + inserted,
+                    "updated": stats["updated"] + updated,
+                    "unchanged": stats["unchanged"] + unchanged,
+                    "next_offset": stats["next_offset"] + batch_rows,
+                }
+                if not self.dry_run:
+                    save_checkpoint(self.model, progress)
+
+            stats.update(progress)
+            if not self.dry_run and (inserted or updated):
+                # 批次寫入不會觸發 post_save，整次匯入結束時合併成一次重建
+                request_map_cache_rebuild()
+
+            # 這一批的耗時（含等待抓取）、各階段耗時與依平均速度估計的剩餘時間
+            now = time.monotonic()
+            seconds, last = now - last, now
+            current = self.timer.snapshot()
+            stage_seconds, stages = stage_delta(stages, current), current
+            target = self.target_offset(stats)
+            eta = eta_seconds(
+                None if target is None else target - stats["next_offset"],
+                stats["rows"] - start_rows,
+                now - started,
+            )
+            rate = batch_rows / seconds if seconds > 0 else 0.0
+
+            self.write(
+                f"{label}{'Batch checked' if self.dry_run else 'Batch committed'}: rows={batch_rows}, inserted={inserted}, updated={updated}, unchanged={unchanged}, resource_so_far={stats['rows']}, rows/s={rate:.0f}"
+                + ("" if eta is None else f", eta={eta:.0f}s"),
+                self.style.HTTP_INFO,
+            )
+            if self.metrics is not None:
+                self.metrics.batch(
+                    ts=timezone.now().isoformat(),
+                    code=self.code,
+                    resource_id=stats["resource_id"],
+                    offset=batch_offset,
+                    dry_run=self.dry_run,
+                    rows=batch_rows,
+                    inserted=inserted,
+                    updated=updated,
+                    unchanged=unchanged,
+                    seconds=round(seconds, 4),
+                    **stage_seconds,
+                    rows_per_sec=round(rate, 1),
+                    resource_rows=stats["rows"],
+                    total=target,
+                    eta_seconds=eta,
+                )
+
+        return stats
+
+    def target_offset(self, stats: Dict[str, Any]) -> Optional[int]:
+        """
+        這個區段預計同步到的 offset（區段結尾、CKAN total、max_records 取最小）；
+        都不知道時為 None。
+        """
+        limits = [stats["end"], self.totals.get(stats["resource_id"])]
+        if self.max_records is not None:
+            limits.append(stats["start"] + self.max_records)
+        limits = [x for x in limits if x is not None]
+        return min(limits) if limits else None
+
+    def bulk_load_resources(
+        self, resources: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        --bulk-load（初次大量匯入）：
+        1. 所有 resource 以 COPY 灌進 unlogged staging table（不寫 WAL、不維護索引）
+        2. 每個 resource 一個 INSERT ... SELECT 合併，合併階段是同一個 transaction；
+           資料表是空的時才暫時移除次要索引、最後重建（移除索引會鎖住整張表）
+        3. transaction 之外重建每日彙總與樣站年份
+        不寫 checkpoint，中斷後需重新執行。
+        """
+        staging = StagingTable(self.model, self.unique_fields)
+        results = []
+        staging.create()
+        try:
+            for res in resources:
+                rid = res["id"]
+                name = res.get("name") or rid
+                self.write(f"Stage resource [{name}] ({rid})", self.style.HTTP_INFO)
+                for stats in res["ranges"]:
+                    for records in self.iter_batches(stats):
+                        rows = self.clean_batch(records, stats)
+                        with self.timer.stage("write"):
+                            staging.copy_rows(rid, rows)
+                        stats["rows"] += len(records)
+                        stats["next_offset"] += len(records)
+                    self.write(f"Staged [{name}]: rows={stats['rows']}")
+                    results.append(stats)
+
+            # 移除索引會以 ACCESS EXCLUSIVE 鎖住整張表直到 commit，期間所有讀取都會被擋住；
+            # 資料表已有資料（線上正在使用）時保留索引，只有空表才延後建索引
+            indexes = (
+                nullcontext([])
+                if self.model.objects.exists()
+                else deferred_secondary_indexes(self.model)
+            )
+            with transaction.atomic():
+                with indexes as dropped:
+                    self.write(
+                        f"Merging into {self.model._meta.db_table} "
+                        f"(deferred {len(dropped)} secondary index(es))"
+                    )
+                    merged = set()
+                    for stats in results:
+                        # 同一個 resource 的各區段在 staging 中一起合併
+                        if stats["resource_id"] in merged:
+                            continue
+                        merged.add(stats["resource_id"])
+                        with self.timer.stage("write"):
+                            result = staging.merge(stats["resource_id"])
+                        stats["inserted"] += result.inserted
+                        stats["updated"] += result.updated
+                        stats["unchanged"] += result.unchanged
+                        self.write(
+                            f"Merged [{stats['name']}]: inserted={result.inserted}, updated={result.updated}, unchanged={result.unchanged}",
+                            self.style.HTTP_INFO,
+                        )
+                if dropped:
+                    self.write("Secondary indexes rebuilt")
+        finally:
+            staging.drop()
+
+        if any(s["inserted"] or s["updated"] for s in results):
+            # 大量匯入時逐日重算不划算，整個觀測項目的彙總重建；
+            # 在合併的 transaction 之外執行，不延長資料表的鎖
+            with self.timer.stage("write"):
+                days = refresh_daily_rollups(self.code)
+                years = refresh_location_years(self.code)
+            self.write(f"Daily rollups rebuilt: {days} day(s)")
+            self.write(f"Location years rebuilt: {years} row(s)")
+
+        if any(s["inserted"] or s["updated"] for s in results):
+            request_map_cache_rebuild()
+        return results
+
+    def plan_shards(self, resources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        把 resources 的同步區段再依 offset 切成每段最多 shard_size 筆，
+        回傳各分段的統計（--workers 與 Celery 分段同步用）。
+        """
+        shards = []
+        for res in resources:
+            rid = res["id"]
+            name = res.get("name") or rid
+            for rng in res["ranges"]:
+                # 從 checkpoint 接續、已有結尾的區段不再切
+                if rng["end"] is not None:
+                    shards.append(rng)
+                    continue
+
+                begin = rng["next_offset"]
+                total = self.fetch_total(rid)
+                if self.max_records is not None:
+                    total = min(total, begin + self.max_records)
+                starts = list(range(begin, total, self.shard_size)) or [begin]
+                for i, start in enumerate(starts):
+                    end: Optional[int] = min(start + self.shard_size, total)
+                    # 最後一段不設上限，同步期間上游新增的資料也會一併抓到
+                    if self.max_records is None and end >= total:
+                        end = None
+                    if i == 0:
+                        # 第一段沿用原區段（與其 checkpoint）
+                        rng["end"] = end
+                        shards.append(rng)
+                    else:
+                        shards.append(new_sync_stats(rid, name, start, end))
+
+        if not self.dry_run:
+            save_checkpoints(self.model, shards)
+        return shards
+
+    def merge_shard_result(self, stats: Dict[str, Any]) -> bool:
+        """
+        併入 sync_shard 回傳的計數（轉型、差異、重複鍵、各階段耗時），
+        回傳這個分段是否有寫入資料。stats 只留下同步統計。
+        """
+        self.dropped.update(stats.pop("dropped", {}))
+        self.coerced.update(stats.pop("coerced", {}))
+        self.changed_columns.update(stats.pop("changed_columns", {}))
+        self.duplicates.update(stats.pop("duplicates", {}))
+        self.timer.merge(stats.pop("stage_seconds", {}))
+        return bool(stats.pop("dirty", False))
+
+    def sync_parallel(self, resources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        把 resources（大的 resource 再依 offset 切段）分給 process pool 同步，
+        回傳每個分段的統計。
+        """
+        shards = self.plan_shards(resources)
+        self.write(
+            f"Shards: {len(shards)} (shard size {self.shard_size}) on {self.workers} workers"
+        )
+
+        # 用 spawn 而不是 fork：--all 時同一個 process 內還有其他 thread 在跑
+        results = []
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_sync_worker,
+        ) as pool:
+            futures = [
+                pool.submit(sync_shard, self.code, self.options(), shard)
+                for shard in shards
+            ]
+            for future in as_completed(futures):
+                stats = future.result()
+                if self.merge_shard_result(stats):
+                    request_map_cache_rebuild()
+                if stats.get("error"):
+                    self.write(
+                        f"Shard failed [{stats['name']}] offset={stats['next_offset']}: {stats['error']}",
+                        self.style.ERROR,
+                    )
+                results.append(stats)
+
+        return results
+
+    def save_history(
+        self,
+        started_at,
+        seconds: float,
+        per_resource: Dict[str, Dict[str, Any]],
+        error: Optional[str] = None,
+    ):
+        """
+        --history：把這次執行的結果與各階段耗時存成一筆 ImportRun。
+        """
+        failed = [s for s in per_resource.values() if s.get("error")]
+        if error is None and failed:
+            error = "; ".join(f"{s['name']}: {s['error']}" for s in failed)
+        options = {
+            **self.options(),
+            "workers": self.workers,
+            "full": self.full,
+            "append_only": self.append_only,
+            "resume": self.resume,
+            "bulk_load": self.bulk_load,
+            "max_records": self.max_records,
+        }
+        options.pop("log_prefix", None)
+        totals = {
+            key: sum(s[key] for s in per_resource.values()) for key in SYNC_COUNTERS
+        }
+        try:
+            record_import_run(
+                self.model,
+                self.code,
+                started_at=started_at,
+                seconds=seconds,
+                error=error,
+                dry_run=self.dry_run,
+                options=options,
+                resources=len(per_resource),
+                stage_seconds={
+                    k: round(v, 3) for k, v in self.timer.snapshot().items()
+                },
+                **totals,
+            )
+        except Exception as e:
+            # 紀錄失敗不影響匯入結果
+            self.write(f"Failed to save import history: {e}", self.style.WARNING)
+
+    def report(self, per_resource: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        輸出每個 resource 與全部的統計，回傳失敗的 resource。
+        """
+        self.write("-" * 60)
+        for stats in per_resource.values():
+            line = (
+                f"[{stats['name']}] rows={stats['rows']}, inserted={stats['inserted']}, "
+                f"updated={stats['updated']}, unchanged={stats['unchanged']}"
+            )
+            if stats.get("error"):
+                self.write(f"{line}, FAILED: {stats['error']}", self.style.ERROR)
+            else:
+                self.write(line)
+
+        columns = sorted(set(self.dropped) | set(self.coerced))
+        if columns:
+            self.write("Column coercion (dropped = 有值但無法轉型):")
+            for name in columns:
+                line = f"  {name}: dropped={self.dropped[name]}, coerced={self.coerced[name]}"
+                self.write(line, self.style.WARNING if self.dropped[name] else None)
+
+        if self.duplicates:
+            self.write(
+                f"Duplicate natural keys: in batch={self.duplicates['in_batch']} "
+                f"(--on-duplicate {self.on_duplicate}), "
+                f"across batches={self.duplicates['across_batches']}",
+                self.style.WARNING,
+            )
+        if self.conflicts is not None:
+            self.write(f"Conflict report: {self.conflict_report}")
+
+        stage_seconds = self.timer.snapshot()
+        self.write(
+            "Stage time: "
+            + ", ".join(f"{name}={stage_seconds[name]:.1f}s" for name in STAGES)
+        )
+
+        totals = {
+            key: sum(s[key] for s in per_resource.values()) for key in SYNC_COUNTERS
+        }
+
+        if self.dry_run:
+            self.write(
+                f"Dry-run diff: new keys={totals['inserted']}, changed rows={totals['updated']}, unchanged rows={totals['unchanged']}"
+            )
+            for name, count in self.changed_columns.most_common():
+                self.write(f"  {name}: {count} row(s) would change")
+
+        self.write("-" * 60)
+        self.write(
+            f"ALL DONE. total_rows={totals['rows']}, total_inserted={totals['inserted']}, total_updated={totals['updated']}, total_unchanged={totals['unchanged']}",
+            self.style.SUCCESS,
+        )
+        return [s for s in per_resource.values() if s.get("error")]
+
+
+# ---------- 各 model 的 importer ----------
+IMPORTERS: Dict[str, Type[ObservationImporter]] = {}
+
+
+def register_importer(code: str):
+    """
+    註冊某個 OBS_CONFIG code 專用的 importer（覆寫 hook 用）；沒註冊的用 ObservationImporter。
+    """
+
+    def decorator(cls):
+        IMPORTERS[code] = cls
+        return cls
+
+    return decorator
+
+
+def get_importer(code: str) -> Type[ObservationImporter]:
+    if code not in OBS_CONFIG:
+        raise ImporterError(
+            f"未知的觀測項目：{code}（可用：{', '.join(OBS_CONFIG.keys())}）"
+        )
+    return IMPORTERS.get(code, ObservationImporter)
+
+
+@register_importer("plantphenology")
+class PlantPhenologyImporter(ObservationImporter):
+    def validate(self, values, row):
+        lon = values.get("decimalLongitude")
+        lat = values.get("decimalLatitude")
+        if lon is not None and (lon <= Decimal(-180) or lon >= Decimal(180)):
+            return f"bad lon: {lon}"
+        if lat is not None and (lat <= Decimal(-90) or lat >= Decimal(90)):
+            return f"bad lat: {lat}"
+        return None
@@ -0,0 +1,35 @@
+from typing import Any, Dict
+
+import django
+
+# worker process 以 spawn 啟動，django.setup() 之前不能載入 models，
+# 所以這個模組只在函式內 import 匯入引擎
+
+
+def init_sync_worker():
+    django.setup()
+
+
+def sync_shard(code: str, options: Dict[str, Any], stats: Dict[str, Any]):
+    """
+    在 worker process 中同步一個 resource 區段，回傳統計（失敗時帶 error）。
+    """
+    from .ckan_import import get_importer
+    from .map_cache import defer_map_cache_rebuild
+
+    importer = None
+    # 由主程序統一排 cache 重建，這裡只回報有沒有寫入
+    with defer_map_cache_rebuild(schedule=False) as deferred:
+        try:
+            importer = get_importer(code)(code, **options)
+            importer.sync_resource(stats, label=f"[{stats['name']}@{stats['start']}] ")
+        except Exception as e:
+            stats["error"] = str(e)
+    stats["dirty"] = deferred.dirty
+    if importer is not None:
+        stats["dropped"] = dict(importer.dropped)
+        stats["coerced"] = dict(importer.coerced)
+        stats["changed_columns"] = dict(importer.changed_columns)
+        stats["duplicates"] = dict(importer.duplicates)
+        stats["stage_seconds"] = importer.timer.snapshot()
+    return stats
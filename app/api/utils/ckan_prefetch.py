@@ -0,0 +1,223 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .import_metrics import StageTimer, timed_stage
+
+# (records, total)；records 可能是串流的 iterable（見 ckan.StreamedRecords）
+Page = Tuple[Iterable[Dict[str, Any]], Optional[int]]
+
+
+class AdaptivePageSize:
+    """
+    依每頁實際抓取耗時調整下一頁的筆數，讓每個 request 接近 target 秒：
+    伺服器快就加大頁面、減少來回次數；變慢（或快逾時）就縮小。
+    每次最多放大 / 縮小一倍，避免單次抖動造成大幅跳動。
+    """
+
+    def __init__(
+        self, initial: int, target: float, minimum: int = 100, maximum: int = 10000
+    ):
+        self.minimum = min(minimum, initial)
+        self.maximum = max(maximum, initial)
+        self.size = initial
+        self.target = target
+
+    def observe(self, seconds: float, rows: int):
+        if rows <= 0 or seconds <= 0:
+            return
+        want = int(rows / seconds * self.target)
+        want = max(self.size // 2, min(self.size * 2, want))
+        self.size = max(self.minimum, min(self.maximum, want))
+
+
+def iter_pages(
+    fetch_page: Callable[[int, int], Page],
+    limit: int,
+    max_records: Optional[int] = None,
+    start: int = 0,
+    page_size: Optional[AdaptivePageSize] = None,
+    batch_size: Optional[int] = None,
+    timer: Optional[StageTimer] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    依序一頁一頁抓（不預先抓），每次 yield 一個批次的 records list。
+    - fetch_page(offset, limit) 回傳 (records, total)
+    - start / max_records: 從 start 開始最多抓 max_records 筆；None 則抓到結尾
+    - page_size: 有給時每頁筆數依耗時調整，limit 只當第一頁的大小
+    - batch_size: 有給時一頁切成多批 yield；串流的頁面邊讀邊交出，
+      記憶體中只有一批，不會隨每頁筆數成長
+    - timer: 取出每一批的時間算在 decode（串流時即逐筆解析的時間）
+    """
+    pulled = 0
+    offset = start
+
+    while True:
+        page_limit = page_size.size if page_size else limit
+        if max_records is not None:
+            # 不超過 max_records，--workers 切段時才不會跟下一段重疊
+            page_limit = min(page_limit, max_records - pulled)
+        started = time.monotonic()
+        records, _ = fetch_page(offset, page_limit)
+        elapsed = time.monotonic() - started
+
+        count = 0
+        batches = _split_page(records, batch_size)
+        while True:
+            # 只計抓取 / 解析的時間，不含呼叫端處理這一批的時間
+            started = time.monotonic()
+            with timed_stage(timer, "decode"):
+                batch = next(batches, None)
+            elapsed += time.monotonic() - started
+            if batch is None:
+                break
+            count += len(batch)
+            yield batch
+
+        if page_size:
+            page_size.observe(elapsed, count)
+
+        if not count:
+            break
+
+        pulled += count
+        if max_records is not None and pulled >= max_records:
+            break
+
+        offset += count
+
+
+def _split_page(
+    records: Iterable[Dict[str, Any]], batch_size: Optional[int]
+) -> Iterator[List[Dict[str, Any]]]:
+    if isinstance(records, list) and (batch_size is None or len(records) <= batch_size):
+        if records:
+            yield records
+        return
+    it = iter(records)
+    while True:
+        batch = list(islice(it, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def prefetch_pages(
+    fetch_page: Callable[[int, int], Page],
+    limit: int,
+    depth: int,
+    max_records: Optional[int] = None,
+    start: int = 0,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    用背景 thread pool 預先抓後面 depth 頁，依 offset 順序一批一批交給呼叫端。
+    - fetch_page(offset, limit) 回傳 (records, total)；total 為 CKAN 回傳的總筆數
+    - start / max_records: 從 start 開始最多抓 max_records 筆
+    - 呼叫端處理（寫 DB）這一批時，後面的頁已經在下載，
+      總時間接近 max(抓取, 寫入) 而不是兩者相加
+    - 同時在記憶體中的頁數最多 depth + 1，不會因為抓太快而爆記憶體
+    """
+    # 第一頁同步抓，取得 total 與伺服器實際的每頁上限（可能小於 limit）
+    first_limit = limit if max_records is None else min(limit, max_records)
+    records, total = fetch_page(start, first_limit)
+    if not records:
+        return
+
+    step = limit
+    if len(records) < first_limit and (total is None or total > start + len(records)):
+        step = len(records)
+
+    end = total
+    if max_records is not None:
+        end = start + max_records if end is None else min(end, start + max_records)
+
+    pool = ThreadPoolExecutor(max_workers=depth, thread_name_prefix="ckan-prefetch")
+    pending = deque()
+    next_offset = start + len(records)
+
+    def submit():
+        nonlocal next_offset
+        if end is not None and next_offset >= end:
+            return
+        size = step if end is None else min(step, end - next_offset)
+        pending.append(pool.submit(fetch_page, next_offset, size))
+        next_offset += size
+
+    try:
+        for _ in range(depth):
+            submit()
+
+        pulled = len(records)
+        yield records
+
+        while pending and (max_records is None or pulled < max_records):
+            records, _ = pending.popleft().result()
+            if not records:
+                break
+            submit()
+            pulled += len(records)
+            yield records
+            # total 未知時，不足一頁代表已經到底
+            if total is None and len(records) < step:
+                break
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def background_pages(
+    pages: Iterator[List[Dict[str, Any]]], depth: int
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    在一個背景 thread 依序跑 pages，最多先抓好 depth 頁。
+    給必須依序抓的分頁方式（keyset）用：一次只有一個 request，但抓取與寫入 DB 重疊。
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=max(depth, 1))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for page in pages:
+                if not put(page):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_Failed(e))
+        finally:
+            close = getattr(pages, "close", None)
+            if close:
+                close()
+
+    worker = threading.Thread(target=produce, name="ckan-prefetch", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failed):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+        worker.join()
@@ -0,0 +1,140 @@
+import bisect
+import gzip
+import json
+import os
+import re
+import tempfile
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# 錄製目錄結構：
+#   DIR/resources.json                       錄製時的資源清單
+#   DIR/<resource_id>/total.json             datastore_search 回傳的總筆數
+#   DIR/<resource_id>/<offset>-<count>.ndjson.gz   一頁原始 records，一行一筆
+RESOURCES_FILE = "resources.json"
+TOTAL_FILE = "total.json"
+_PAGE_RE = re.compile(r"^(\d{12})-(\d+)\.ndjson\.gz$")
+
+
+def _atomic_write(path: str, data: bytes):
+    # 先寫暫存檔再 rename，中斷時不會留下半個檔案
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class PageRecorder:
+    """
+    --record：把從 CKAN 抓到的 datastore_search 原始頁面存成 gzip NDJSON。
+    可同時被多個 thread / process 寫入（每頁一個檔案）。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def save_resources(self, resources: List[Dict[str, Any]]):
+        data = json.dumps(resources, ensure_ascii=False, indent=2).encode("utf-8")
+        _atomic_write(os.path.join(self.directory, RESOURCES_FILE), data)
+
+    def save_page(
+        self,
+        resource_id: str,
+        offset: int,
+        records: List[Dict[str, Any]],
+        total: Optional[int],
+    ):
+        folder = os.path.join(self.directory, resource_id)
+        os.makedirs(folder, exist_ok=True)
+        if total is not None:
+            _atomic_write(
+                os.path.join(folder, TOTAL_FILE), json.dumps(total).encode("utf-8")
+            )
+        if not records:
+            return
+        lines = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        _atomic_write(
+            os.path.join(folder, f"{offset:012d}-{len(records)}.ndjson.gz"),
+            gzip.compress(lines.encode("utf-8"), compresslevel=6),
+        )
+
+
+@lru_cache(maxsize=8)
+def _read_page(path: str) -> Tuple[Dict[str, Any], ...]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return tuple(json.loads(line) for line in f if line.strip())
+
+
+class PageReplay:
+    """
+    --from-dir：從 PageRecorder 錄下的檔案讀取頁面，完全不連網。
+    fetch_page 與 fetch_datastore_page 同介面（回傳 (records, total)），
+    offset / limit 不必和錄製時的分頁對齊。
+    """
+
+    def __init__(self, directory: str):
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"replay directory not found: {directory}")
+        self.directory = directory
+        self._index: Dict[str, Tuple[List[int], List[Tuple[int, str]]]] = {}
+
+    def resources(self) -> List[Dict[str, Any]]:
+        path = os.path.join(self.directory, RESOURCES_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _pages(self, resource_id: str):
+        index = self._index.get(resource_id)
+        if index is None:
+            folder = os.path.join(self.directory, resource_id)
+            pages = []
+            if os.path.isdir(folder):
+                for name in os.listdir(folder):
+                    m = _PAGE_RE.match(name)
+                    if m:
+                        pages.append(
+                            (
+                                int(m.group(1)),
+                                int(m.group(2)),
+                                os.path.join(folder, name),
+                            )
+                        )
+            pages.sort()
+            index = ([p[0] for p in pages], [(p[1], p[2]) for p in pages])
+            self._index[resource_id] = index
+        return index
+
+    def total(self, resource_id: str) -> Optional[int]:
+        path = os.path.join(self.directory, resource_id, TOTAL_FILE)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        starts, pages = self._pages(resource_id)
+        return starts[-1] + pages[-1][0] if starts else 0
+
+    def fetch_page(
+        self, resource_id: str, offset: int, limit: int
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        starts, pages = self._pages(resource_id)
+        total = self.total(resource_id)
+        records: List[Dict[str, Any]] = []
+        pos = offset
+        # 從包含 offset 的那一頁開始，跨頁湊滿 limit 筆；遇到缺頁就停
+        i = bisect.bisect_right(starts, pos) - 1
+        while len(records) < limit and 0 <= i < len(starts):
+            count, path = pages[i]
+            if not (starts[i] <= pos < starts[i] + count):
+                break
+            page = _read_page(path)
+            take = page[pos - starts[i] : pos - starts[i] + limit - len(records)]
+            records.extend(take)
+            pos += len(take)
+            i += 1
+        return records, total
@@ -0,0 +1,133 @@
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Tuple
+
+from django.db import models
+from django.utils.dateparse import parse_date, parse_datetime
+
+Converter = Callable[[Any], Any]
+CoercionPlan = Tuple[Tuple[str, Converter], ...]
+
+_TRUE = frozenset(("1", "true", "t", "yes", "y"))
+_FALSE = frozenset(("0", "false", "f", "no", "n"))
+
+
+# ---------- 各型別的 converter：輸入已去掉空白、非空值 ----------
+def _to_int(v):
+    try:
+        return int(v)
+    except Exception:
+        return None
+
+
+def _to_float(v):
+    try:
+        return float(v)
+    except Exception:
+        return None
+
+
+def _to_bool(v):
+    if isinstance(v, bool):
+        return v
+    sv = str(v).lower()
+    if sv in _TRUE:
+        return True
+    if sv in _FALSE:
+        return False
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_str(s: str):
+    # 同一個 resource 的日期大量重複，解析結果直接快取
+    d = parse_date(s)
+    if d:
+        return d
+    dt = parse_datetime(s)
+    return dt.date() if dt else None
+
+
+def _to_date(v):
+    if isinstance(v, (int, float)):
+        return str(v)
+    try:
+        return _parse_date_str(str(v))
+    except ValueError:
+        return None
+
+
+def _to_str(v):
+    return str(v)
+
+
+def _converter_for(field) -> Converter:
+    # 判斷順序與原本逐格的 coerce_value 相同（DateTimeField 也是 DateField）
+    if isinstance(field, models.IntegerField):
+        return _to_int
+    if isinstance(field, (models.FloatField, models.DecimalField)):
+        return _to_float
+    if isinstance(field, models.BooleanField):
+        return _to_bool
+    if isinstance(field, models.DateField):
+        return _to_date
+    return _to_str
+
+
+@lru_cache(maxsize=None)
+def coercion_plan(model) -> CoercionPlan:
+    """
+    每個 model 只編譯一次的轉型計畫：((欄位名, converter), ...)。
+    前提：API 欄名 = 模型欄位名。
+    """
+    return tuple(
+        (f.name, _converter_for(f))
+        for f in model._meta.get_fields()
+        if hasattr(f, "attname")
+    )
+
+
+def coerce_records(
+    plan: CoercionPlan,
+    records: List[Dict[str, Any]],
+    dropped: Counter,
+    coerced: Counter,
+) -> List[Dict[str, Any]]:
+    """
+    依轉型計畫逐欄處理一批 API records，回傳只含模型欄位、已轉型的 dict list。
+    - dropped[欄位]：有值但無法轉型、變成 None 的格數
+    - coerced[欄位]：轉成不同型別的格數（例如 "12" -> 12）
+    """
+    out: List[Dict[str, Any]] = [{} for _ in records]
+    if not records:
+        return out
+
+    present = set().union(*records)
+    for name, convert in plan:
+        if name not in present:
+            continue
+        n_dropped = 0
+        n_coerced = 0
+        for row, values in zip(records, out):
+            if name not in row:
+                continue
+            v = row[name]
+            if v is None:
+                values[name] = None
+                continue
+            if isinstance(v, str):
+                v = v.strip()
+                if v == "":
+                    values[name] = None
+                    continue
+            result = convert(v)
+            if result is None:
+                n_dropped += 1
+            elif type(result) is not type(v):
+                n_coerced += 1
+            values[name] = result
+        if n_dropped:
+            dropped[name] += n_dropped
+        if n_coerced:
+            coerced[name] += n_coerced
+    return out
@@ -0,0 +1,263 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, DateField, F, FloatField, Q, Sum
+from django.db.models.functions import NullIf, Trunc
+
+from ..models import ObservationDailyRollup
+from ..obs_config import OBS_CONFIG
+from .advisory_locks import lock_keys
+from .bulk_upsert import bulk_upsert
+from .cache_keys import rollup_version_key
+from .date_filters import year_filter
+
+# 各觀測項目每日彙總的欄位（ObservationDailyRollup 欄位 → 原始資料的聚合）
+# 與原本圖表 API 即時計算的方式相同；*_count 為平均欄位當天有值的筆數
+DAILY_ROLLUP_METRICS: Dict[str, Dict[str, Any]] = {
+    "plantphenology": {"species_count": Count("scientificName", distinct=True)},
+    "cameratrap": {"species_count": Count("scientificName", distinct=True)},
+    "terresoundindex": {
+        "aci": Avg("ACI"),
+        "adi": Avg("ADI"),
+        "bi": Avg("BI"),
+        "ndsi": Avg("NDSI"),
+        "aci_count": Count("ACI"),
+        "adi_count": Count("ADI"),
+        "bi_count": Count("BI"),
+        "ndsi_count": Count("NDSI"),
+    },
+    "birdnetsound": {"species_count": Count("scientificName", distinct=True)},
+    "biosound": {"species_count": Count("scientificName", distinct=True)},
+    "weather": {
+        "air_temperature": Avg("AirTemperature"),
+        "precipitation": Sum("Precipitation"),
+        "air_temperature_count": Count("AirTemperature"),
+    },
+}
+
+# 圖表可用的時間粒度（day 以外在資料庫中以 date_trunc 彙總）
+CHART_INTERVALS = ("day", "week", "month", "year")
+
+
+def _weighted_avg(field: str):
+    # 每日平均依當天有值的筆數（{field}_count）加權，
+    # 等同對原始資料中有值的部分取平均；整段期間都沒有值時為 NULL
+    count = f"{field}_count"
+    return Sum(F(field) * F(count), output_field=FloatField()) / NullIf(Sum(count), 0)
+
+
+# 週 / 月 / 年彙總能由每日彙總再算出來的欄位（加總、加權平均）；
+# 不在這裡的（物種數這類 distinct count 不能跨日相加）改由原始資料計算
+ROLLUP_RESAMPLE: Dict[str, Dict[str, Any]] = {
+    "terresoundindex": {
+        name: _weighted_avg(name) for name in ("aci", "adi", "bi", "ndsi")
+    },
+    "weather": {
+        "air_temperature": _weighted_avg("air_temperature"),
+        "precipitation": Sum("precipitation"),
+    },
+}
+
+ROLLUP_UNIQUE_FIELDS = ["obs_code", "location_id", "date"]
+
+DayKey = Tuple[str, Any]  # (locationID, 日期)
+
+
+def rollup_keys(code: str, rows: Iterable[Dict[str, Any]]) -> Set[DayKey]:
+    """
+    一批原始資料（model 欄位名稱的 dict）涉及的 (locationID, 日期)。
+    """
+    date_field = OBS_CONFIG[code]["date_field"]
+    keys = set()
+    for row in rows:
+        location_id, date = row.get("locationID"), row.get(date_field)
+        if location_id and date:
+            keys.add((location_id, date))
+    return keys
+
+
+def _keys_filter(keys: Iterable[DayKey], location_field: str, date_field: str) -> Q:
+    dates = defaultdict(set)
+    for location_id, date in keys:
+        dates[location_id].add(date)
+    q = Q()
+    for location_id, values in dates.items():
+        q |= Q(**{location_field: location_id, f"{date_field}__in": values})
+    return q
+
+
+def rollup_version(code: str) -> int:
+    """
+    觀測項目每日彙總的資料版本，每次更新 +1；圖表 cache 依此判斷是否過期。
+    """
+    key = rollup_version_key(code)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_rollup_version(code: str):
+    """
+    讓這個觀測項目所有依賴每日彙總的 cache 一次過期（不必逐一找出 key 刪除）。
+    """
+    key = rollup_version_key(code)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # 還沒有版本號（例如 Redis 被清空）：從 2 開始，與版本 1 的舊 cache 區分
+        if not cache.add(key, 2, timeout=None):
+            cache.incr(key)
+
+
+def refresh_daily_rollups(code: str, keys: Optional[Iterable[DayKey]] = None) -> int:
+    """
+    從原始資料重算每日彙總，回傳寫入的筆數。
+    - keys：只重算這些 (locationID, 日期)；None 代表整個觀測項目全部重建
+    - 原始資料已不存在的日期，其彙總一併刪除
+    - 指定 keys 時先對這些 (觀測項目, 樣站, 日期) 取 advisory lock 再讀原始資料：
+      --workers / Celery 分段同時匯入同一天的資料時，後取得鎖的一方
+      會讀到先 commit 的那一方寫入的資料，不會互相覆蓋
+    - transaction commit 後資料版本 +1（commit 前更新的話，
+      重算 cache 的請求可能讀到舊資料卻標成新版本）
+    """
+    metrics = DAILY_ROLLUP_METRICS.get(code)
+    if metrics is None:
+        return 0
+    cfg = OBS_CONFIG[code]
+    date_field = cfg["date_field"]
+
+    # 沒有樣站或日期的資料無法歸到任何一天（彙總表的兩欄都是 NOT NULL）
+    source = cfg["model"].objects.filter(
+        locationID__isnull=False, **{f"{date_field}__isnull": False}
+    )
+    existing = ObservationDailyRollup.objects.filter(obs_code=code)
+    if keys is not None:
+        keys = {(loc, date) for loc, date in keys if loc and date}
+        if not keys:
+            return 0
+        source = source.filter(_keys_filter(keys, "locationID", date_field))
+        existing = existing.filter(_keys_filter(keys, "location_id", "date"))
+
+    with transaction.atomic():
+        if keys is not None:
+            lock_keys(f"rollup:{code}", keys)
+
+        daily = (
+            source.values("locationID", date_field)
+            .annotate(record_count=Count("pk"), **metrics)
+            .order_by("locationID", date_field)
+        )
+        rows: List[Dict[str, Any]] = []
+        for r in daily:
+            rows.append(
+                {
+                    "obs_code": code,
+                    "location_id": r["locationID"],
+                    "date": r[date_field],
+                    "record_count": r["record_count"],
+                    **{name: r[name] for name in metrics},
+                }
+            )
+
+        found = {(r["location_id"], r["date"]) for r in rows}
+        stale = [
+            pk
+            for pk, location_id, date in existing.values_list(
+                "pk", "location_id", "date"
+            )
+            if (location_id, date) not in found
+        ]
+        if stale:
+            ObservationDailyRollup.objects.filter(pk__in=stale).delete()
+        # 依 (樣站, 日期) 排序寫入，各 transaction 鎖住彙總列的順序一致
+        bulk_upsert(ObservationDailyRollup, rows, ROLLUP_UNIQUE_FIELDS)
+        transaction.on_commit(lambda: bump_rollup_version(code))
+    return len(rows)
+
+
+def daily_rollup_queryset(
+    code: str, location_ids: Iterable[str], year: Optional[int] = None
+):
+    """
+    圖表 API 用：指定樣站（某年）的每日彙總。
+    """
+    qs = ObservationDailyRollup.objects.filter(
+        obs_code=code, location_id__in=list(location_ids)
+    )
+    if year is not None:
+        qs = qs.filter(year_filter("date", year))
+    return qs
+
+
+def resample_stations(
+    code: str,
+    location_ids: Iterable[str],
+    fields: Iterable[str],
+    year: Optional[int] = None,
+    interval: str = "day",
+) -> List[Dict[str, Any]]:
+    """
+    多個樣站的圖表資料，一個查詢依 (樣站, 時間) 分組：
+    每筆為 location_id + date + fields，依日期、樣站排序。
+    - day：直接讀每日彙總
+    - 可由每日彙總推得的欄位（ROLLUP_RESAMPLE）：對每日彙總 date_trunc 後再彙總
+    - 其餘（物種數）：對原始資料 date_trunc 後重新計算，走 (locationID, 日期) index
+    """
+    fields = list(fields)
+    location_ids = list(location_ids)
+    if interval == "day":
+        qs = daily_rollup_queryset(code, location_ids, year)
+        return list(
+            qs.order_by("date", "location_id").values("location_id", "date", *fields)
+        )
+
+    resample = ROLLUP_RESAMPLE.get(code, {})
+    if all(name in resample for name in fields):
+        qs = daily_rollup_queryset(code, location_ids, year)
+        location = "location_id"
+        bucket = Trunc("date", interval, output_field=DateField())
+        metrics = {name: resample[name] for name in fields}
+    else:
+        date_field = OBS_CONFIG[code]["date_field"]
+        qs = OBS_CONFIG[code]["model"].objects.filter(locationID__in=location_ids)
+        if year is not None:
+            qs = qs.filter(year_filter(date_field, year))
+        location = "locationID"
+        bucket = Trunc(date_field, interval, output_field=DateField())
+        metrics = {name: DAILY_ROLLUP_METRICS[code][name] for name in fields}
+
+    # 每日彙總本身有 date 欄位，分組用的別名不能同名，取出後再改名
+    rows = (
+        qs.annotate(bucket=bucket)
+        .values(location, "bucket")
+        .annotate(**metrics)
+        .order_by("bucket", location)
+    )
+    return [
+        {
+            "location_id": r[location],
+            "date": r["bucket"],
+            **{name: r[name] for name in fields},
+        }
+        for r in rows
+    ]
+
+
+def resample_daily_rollups(
+    code: str,
+    location_id: str,
+    fields: Iterable[str],
+    year: Optional[int] = None,
+    interval: str = "day",
+) -> List[Dict[str, Any]]:
+    """
+    單一樣站的圖表資料：date + fields，依日期排序（見 resample_stations）。
+    """
+    rows = resample_stations(code, [location_id], fields, year, interval)
+    for row in rows:
+        del row["location_id"]
+    return rows
@@ -0,0 +1,25 @@
+from datetime import MAXYEAR, MINYEAR, date
+from typing import Tuple, Union
+
+from django.db.models import Q
+
+
+def year_range(year: Union[int, str]) -> Tuple[date, date]:
+    """
+    西元年 → [該年 1/1, 隔年 1/1) 的半開區間。
+    年份超出 date 能表示的範圍時丟 ValueError。
+    """
+    year = int(year)
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def year_filter(date_field: str, year: Union[int, str]) -> Q:
+    """
+    取代 {date_field}__year=year：改寫成日期的半開區間，
+    與 locationID 一起查詢時可以直接走 (locationID, 日期) 複合 index 的 range scan。
+    年份超出範圍（例如 0 或負數）時與 __year 相同，查不到任何資料。
+    """
+    if not MINYEAR <= int(year) < MAXYEAR:
+        return Q(pk__in=[])
+    start, end = year_range(year)
+    return Q(**{f"{date_field}__gte": start, f"{date_field}__lt": end})
@@ -0,0 +1,202 @@
+import datetime
+import math
+from itertools import islice, repeat
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+# 圖表原始解析度模式：不依日期彙總，原始資料降採樣到最多 max_points 點
+RAW_CHART_INTERVAL = "raw"
+DEFAULT_MAX_POINTS = 1000
+
+# 降採樣方式
+# - lttb：Largest-Triangle-Three-Buckets，保留曲線形狀
+# - minmax：每個區間保留最小與最大值，保證峰值不會被抹掉
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+Row = Dict[str, Any]
+Point = Tuple[float, Row]  # (x, row)
+
+
+def _chunked(points: Iterator[Point], sizes: Iterable[int]) -> Iterator[List[Point]]:
+    for size in sizes:
+        chunk = list(islice(points, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _average(points: Sequence[Point], field: str) -> Optional[Tuple[float, float]]:
+    values = [(x, row[field]) for x, row in points if row[field] is not None]
+    if not values:
+        return None
+    return (
+        sum(x for x, _ in values) / len(values),
+        sum(y for _, y in values) / len(values),
+    )
+
+
+def _largest_triangle(
+    bucket: Sequence[Point],
+    anchor: Point,
+    target: Optional[Tuple[float, float]],
+    field: str,
+) -> Optional[Point]:
+    """
+    bucket 中與前一個選點 anchor、下一個區間平均 target 圍成面積最大的點。
+    """
+    ax, ay = anchor[0], anchor[1][field]
+    if target is None and ay is None:
+        return next((p for p in bucket if p[1][field] is not None), None)
+    cx, cy = target if target is not None else (ax, ay)
+    if ay is None:
+        ay = cy
+
+    best, best_area = None, -1.0
+    for point in bucket:
+        px, py = point[0], point[1][field]
+        if py is None:
+            continue
+        area = abs((ax - cx) * (py - ay) - (ax - px) * (cy - ay))
+        if area > best_area:
+            best, best_area = point, area
+    return best
+
+
+def lttb(
+    points: Iterable[Point], n: int, threshold: int, fields: Sequence[str]
+) -> List[Row]:
+    """
+    Largest-Triangle-Three-Buckets：把依 x 排序的 n 個點降到約 threshold 個。
+    - points 逐筆讀取，同時只保留兩個區間的點（資料庫游標可直接串流進來）
+    - 多個欄位時每個欄位各自選點，再依原順序合併，每個欄位最多 threshold 點
+    - 首尾兩點一定保留；None 值不參與選點
+    """
+    it = iter(points)
+    if threshold < 3 or n <= threshold:
+        return [row for _, row in it]
+
+    first = next(it, None)
+    if first is None:
+        return []
+    every = (n - 2) / (threshold - 2)
+    bounds = [int(i * every) + 1 for i in range(threshold - 1)]
+    chunks = _chunked(it, (b - a for a, b in zip(bounds, bounds[1:])))
+
+    rows = [first[1]]
+    anchors = {field: first for field in fields}
+    current = next(chunks, None)
+    while current:
+        following = next(chunks, None)
+        last = following is None
+        if last:
+            # 中間的區間讀完，剩下的是最後一點
+            # （count 與實際讀到的筆數不同時，以讀到的最後一筆為準）
+            rest = list(it) or [current.pop()]
+            following = rest[-1:]
+
+        chosen = set()
+        for field in fields:
+            point = _largest_triangle(
+                current, anchors[field], _average(following, field), field
+            )
+            if point is not None:
+                anchors[field] = point
+                chosen.add(id(point[1]))
+        rows.extend(row for _, row in current if id(row) in chosen)
+
+        if last:
+            rows.append(following[0][1])
+            break
+        current = following
+    return rows
+
+
+def minmax(
+    points: Iterable[Point], n: int, buckets: int, fields: Sequence[str]
+) -> List[Row]:
+    """
+    把 n 個點平均分成 buckets 個區間，每個欄位保留各區間的最小與最大值（依原順序）。
+    """
+    it = iter(points)
+    if buckets < 1 or n <= buckets * 2:
+        return [row for _, row in it]
+
+    rows: List[Row] = []
+    for chunk in _chunked(it, repeat(math.ceil(n / buckets))):
+        chosen = set()
+        for field in fields:
+            values = [(row[field], i) for i, (_, row) in enumerate(chunk)]
+            values = [v for v in values if v[0] is not None]
+            if values:
+                chosen.add(min(values)[1])
+                chosen.add(max(values)[1])
+        rows.extend(chunk[i][1] for i in sorted(chosen))
+    return rows
+
+
+def row_timestamp(row: Row) -> float:
+    """
+    圖表原始資料一筆的時間（epoch 秒）：date 加上選填的 time（ISO 8601 字串，
+    可帶 Z 或 ±hh:mm）；沒有時區時視為 UTC，沒有 time 或格式不符時為當天 00:00。
+    """
+    time = datetime.time()
+    value = row.get("time")
+    if value:
+        try:
+            time = datetime.time.fromisoformat(str(value).strip())
+        except ValueError:
+            pass
+    moment = datetime.datetime.combine(row["date"], time)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.timestamp()
+
+
+def spread_within_day(day_counts: Dict[datetime.date, int]) -> Callable[[Row], float]:
+    """
+    只有日期、沒有時間的資料（rows 依日期排序）：同一天的第 k 筆（共 m 筆）
+    放在當天 k/m 的位置，否則一天內所有點 x 相同，LTTB 的三角形面積都是 0。
+    day_counts 為每天的筆數；整天沒有資料的時段仍保留為缺口。
+    """
+    day, k = None, 0
+
+    def x(row: Row) -> float:
+        nonlocal day, k
+        if row["date"] != day:
+            day, k = row["date"], 0
+        m = max(day_counts.get(day, 0), k + 1)
+        position = row_timestamp(row) + 86400 * k / m
+        k += 1
+        return position
+
+    return x
+
+
+def downsample_series(
+    rows: Iterable[Row],
+    n: int,
+    max_points: int,
+    fields: Sequence[str],
+    method: str = "lttb",
+    x: Callable[[Row], float] = row_timestamp,
+) -> List[Row]:
+    """
+    依時間排序的 rows（共 n 筆）降到最多約 max_points 筆。
+    x 為每筆的時間（預設 row_timestamp；只有日期的資料用 spread_within_day）：
+    LTTB 以實際時間計算三角形面積，資料有缺漏（停機、缺測）的時段不會被當成等間距。
+    多個欄位平分 max_points。
+    """
+    points = ((x(row), row) for row in rows)
+    per_field = max(max_points // max(len(fields), 1), 1)
+    if method == "minmax":
+        return minmax(points, n, max(per_field // 2, 1), fields)
+    return lttb(points, n, max(per_field, 3), fields)
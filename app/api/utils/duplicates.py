@@ -0,0 +1,62 @@
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .jsonl import JSONLinesFile
+
+# 同一批內自然鍵重複時保留哪一筆
+# - last：最後一筆（與 bulk_upsert 相同）
+# - first：第一筆
+# - skip：整組都不寫入（不知道哪一筆才對）
+# - error：該 resource 同步失敗（由呼叫端丟出 DuplicateKeyError）
+DUPLICATE_POLICIES = ("last", "first", "skip", "error")
+
+
+class DuplicateKeyError(Exception):
+    """--on-duplicate error 時，批次內有重複的自然鍵"""
+
+
+class Duplicate(NamedTuple):
+    key: tuple
+    positions: List[int]  # 在批次中的位置
+    kept: Optional[int]  # 保留的位置；skip 時為 None
+
+
+def dedupe_rows(
+    rows: List[Dict[str, Any]],
+    key_func: Callable[[Dict[str, Any]], tuple],
+    policy: str = "last",
+) -> Tuple[List[Dict[str, Any]], List[Duplicate]]:
+    """
+    依自然鍵去除批次內的重複列，回傳 (保留的 rows, 重複的群組)。
+    保留的 rows 維持原本的先後順序。
+    """
+    positions: Dict[tuple, List[int]] = {}
+    for i, row in enumerate(rows):
+        positions.setdefault(key_func(row), []).append(i)
+    if len(positions) == len(rows):
+        return rows, []
+
+    duplicates = []
+    drop = set()
+    for key, found in positions.items():
+        if len(found) < 2:
+            continue
+        kept = {"last": found[-1], "first": found[0]}.get(policy)
+        drop.update(i for i in found if i != kept)
+        duplicates.append(Duplicate(key, found, kept))
+
+    return [row for i, row in enumerate(rows) if i not in drop], duplicates
+
+
+def differing_columns(rows: Iterable[Dict[str, Any]]) -> List[str]:
+    """
+    重複列之間值不同的欄位；空 list 代表完全相同（重複但無衝突）。
+    """
+    rows = list(rows)
+    columns = set().union(*rows)
+    return sorted(c for c in columns if len({repr(r.get(c)) for r in rows}) > 1)
+
+
+class ConflictReport(JSONLinesFile):
+    """
+    --conflict-report：重複的自然鍵，一個鍵一行 JSON。
+    """
@@ -0,0 +1,102 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from .jsonl import JSONLinesFile
+
+# 匯入的各個階段：HTTP 下載 / JSON 解析 / 欄位轉型與檢查 / 寫入 DB
+STAGES = ("fetch", "decode", "coerce", "write")
+
+_END = object()
+
+
+class StageTimer:
+    """
+    各階段累計秒數（可由多個 thread 同時累加）。
+    同一個 thread 中巢狀的階段只算最內層：例如串流解析（decode）時
+    從連線讀取下一段（fetch）的時間會算在 fetch，不會重複算進 decode。
+    --prefetch 時下載在背景 thread 進行，各階段加總可能超過實際經過時間。
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _add(self, name: str, seconds: float):
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str):
+        stack = self._local.__dict__.setdefault("stack", [])
+        now = time.perf_counter()
+        if stack:
+            # 外層階段先結算，內層結束後重新計時
+            outer = stack[-1]
+            self._add(outer[0], now - outer[1])
+        stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            name, started = stack.pop()
+            self._add(name, now - started)
+            if stack:
+                stack[-1][1] = now
+
+    def timed(self, iterable: Iterable, name: str) -> Iterator:
+        """
+        逐項產生 iterable 的內容，每次取下一項的時間算在 name 階段。
+        """
+        it = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(it, _END)
+            if item is _END:
+                return
+            yield item
+
+    def merge(self, seconds: Dict[str, float]):
+        """
+        加上其他 process（--workers）回報的各階段秒數。
+        """
+        for name, value in seconds.items():
+            self._add(name, value)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self.seconds)
+
+
+def timed_stage(timer: Optional[StageTimer], name: str):
+    """
+    timer 可以是 None（不計時）的 timer.stage(name)。
+    """
+    return timer.stage(name) if timer is not None else nullcontext()
+
+
+def stage_delta(before: Dict[str, float], after: Dict[str, float]) -> Dict[str, float]:
+    return {
+        name: round(after.get(name, 0.0) - before.get(name, 0.0), 4) for name in STAGES
+    }
+
+
+def eta_seconds(remaining: Optional[int], rows: int, elapsed: float) -> Optional[float]:
+    """
+    以目前為止的平均速度估計剩餘秒數；不知道總筆數時為 None。
+    """
+    if remaining is None or rows <= 0 or elapsed <= 0:
+        return None
+    return round(max(remaining, 0) * elapsed / rows, 1)
+
+
+class MetricsLog(JSONLinesFile):
+    """
+    --metrics：每一批一行 JSON（各階段耗時、rows/sec、ETA），
+    用來看每個資料集卡在哪個階段。
+    """
+
+    def batch(self, **fields: Any):
+        self.write([fields])
@@ -0,0 +1,115 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..obs_config import OBS_CONFIG
+from .ckan_import import get_importer, merge_sync_stats
+from .map_cache import schedule_map_cache_rebuild
+
+# Celery 分段同步：api.tasks.sync_observations 規劃分段 →
+# 每段一個 sync_observation_chunk task（chord header）→
+# finish_observation_sync 彙整結果、記錄同步進度，最後只排一次地圖 cache 重建
+# Celery prefork worker 是 daemon process，不能再開 process pool，
+# 所以分段一律 workers=1，平行度交給 Celery worker 數量
+
+
+def sync_packages(codes: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    要同步的觀測項目與 package_id（settings.CKAN_PACKAGE_IDS 中有設定的）。
+    """
+    return {
+        code: package_id
+        for code, package_id in settings.CKAN_PACKAGE_IDS.items()
+        if package_id and code in OBS_CONFIG and (codes is None or code in codes)
+    }
+
+
+def plan_observation_sync(
+    code: str,
+    package_id: Optional[str] = None,
+    resource_id: Optional[str] = None,
+    options: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    取得 resources、依同步紀錄決定區段，再切成每段最多 shard_size 筆。
+    回傳可 JSON 序列化的計畫（傳給 chunk task 與 chord callback）：
+    - options：chunk task 重建 importer 用的參數
+    - resources：要同步的 resources（記錄同步進度用，不含區段）
+    - shards：各分段的統計（見 new_sync_stats）
+    - error：規劃失敗時的錯誤訊息（此時沒有 options / shards）
+    """
+    options = {**(options or {}), "workers": 1}
+    history = bool(options.pop("history", False))
+    plan: Dict[str, Any] = {
+        "code": code,
+        "started_at": timezone.now().isoformat(),
+        "resources": [],
+        "shards": [],
+    }
+
+    try:
+        importer = get_importer(code)(code, log_prefix=f"[{code}] ", **options)
+        resources = importer.prepare(package_id=package_id, resource_id=resource_id)
+        plan["shards"] = importer.plan_shards(resources)
+        plan["resources"] = [
+            {k: v for k, v in res.items() if k != "ranges"} for res in resources
+        ]
+        # plan_incremental 已套用 full / resume 等設定，分段只需要同步用的參數
+        plan["options"] = {
+            **importer.options(),
+            "max_records": importer.max_records,
+            "history": history,
+        }
+    except Exception as e:
+        plan["error"] = str(e)
+    return plan
+
+
+def finish_observation_sync(
+    results: List[List[Any]], plans: List[Dict[str, Any]]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    chord callback：results 為各 chunk 回傳的 [code, stats]。
+    依觀測項目合併統計、記錄同步進度（與 --history），
+    有任何分段寫入資料時排一次地圖 / 篩選 cache 重建。
+    回傳每個觀測項目的摘要。
+    """
+    by_code: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for code, stats in results:
+        by_code[code].append(stats)
+
+    dirty = False
+    summary: Dict[str, Dict[str, Any]] = {}
+    for plan in plans:
+        code = plan["code"]
+        if plan.get("error"):
+            summary[code] = {"error": plan["error"]}
+            continue
+
+        options = {k: v for k, v in plan["options"].items() if k != "log_prefix"}
+        importer = get_importer(code)(code, log_prefix=f"[{code}] ", **options)
+        for stats in by_code[code]:
+            dirty |= importer.merge_shard_result(stats)
+        per_resource = merge_sync_stats(by_code[code])
+        importer.finish_resources(plan["resources"], per_resource)
+        failed = importer.report(per_resource)
+        if importer.history:
+            started_at = datetime.fromisoformat(plan["started_at"])
+            importer.save_history(
+                started_at,
+                (timezone.now() - started_at).total_seconds(),
+                per_resource,
+            )
+
+        summary[code] = {
+            "resources": len(per_resource),
+            "chunks": len(by_code[code]),
+            "failed": [s["name"] for s in failed],
+        }
+
+    if dirty:
+        schedule_map_cache_rebuild(countdown=0)
+    return summary
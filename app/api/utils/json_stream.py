@@ -0,0 +1,122 @@
+import codecs
+import json
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = ",:]}"
+
+
+class _Reader:
+    """
+    把一段段 bytes 解碼成字串緩衝區，供逐步解析 JSON 用。
+    已解析過的部分會丟掉，緩衝區只保留尚未處理的內容。
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def more(self) -> bool:
+        if self.eof:
+            return False
+        # 丟掉已處理的部分，避免緩衝區隨回應大小成長
+        self.buf = self.buf[self.pos :]
+        self.pos = 0
+        for chunk in self.chunks:
+            text = self.decoder.decode(chunk)
+            if text:
+                self.buf += text
+                return True
+        self.buf += self.decoder.decode(b"", final=True)
+        self.eof = True
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.more():
+                raise ValueError("unexpected end of JSON stream")
+
+    def expect(self, chars: str) -> str:
+        ch = self.peek()
+        if ch not in chars:
+            raise ValueError(f"expected one of {chars!r}, got {ch!r}")
+        self.pos += 1
+        return ch
+
+    def value(self) -> Any:
+        """
+        解析下一個完整的 JSON 值；資料還沒到齊就再讀一段。
+        """
+        self.peek()
+        while True:
+            try:
+                obj, end = self.json.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.more():
+                    raise
+                continue
+            # 數字可能剛好被切在緩衝區中（例如 "3.5" | "e-07"），
+            # 後面接著分隔符號才算完整
+            nxt = end
+            while nxt < len(self.buf) and self.buf[nxt] in _WHITESPACE:
+                nxt += 1
+            if (nxt == len(self.buf) or self.buf[nxt] not in _DELIMITERS) and (
+                self.more()
+            ):
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_json_records(
+    chunks: Iterable[bytes],
+    meta: Optional[Dict[str, Any]] = None,
+    path: tuple = ("result", "records"),
+) -> Iterator[Any]:
+    """
+    逐筆解析 CKAN 回應中 result.records 陣列的元素，不必先把整個回應讀進記憶體。
+    - chunks：回應內容的 bytes 片段（例如 response.iter_content()）
+    - meta：有給時，path 以外的欄位（例如 result.total）解析完後放進這個 dict
+      （CKAN 的 total 排在 records 之後，要整個回應讀完才會有值）
+    """
+    reader = _Reader(chunks)
+    if meta is None:
+        meta = {}
+    yield from _walk_object(reader, path, meta)
+
+
+def _walk_object(reader: _Reader, path: tuple, meta: Dict[str, Any]) -> Iterator[Any]:
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.pos += 1
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == path[0] and len(path) > 1 and reader.peek() == "{":
+            yield from _walk_object(reader, path[1:], meta)
+        elif key == path[0] and len(path) == 1 and reader.peek() == "[":
+            yield from _walk_array(reader)
+        else:
+            meta[key] = reader.value()
+        if reader.expect(",}") == "}":
+            return
+
+
+def _walk_array(reader: _Reader) -> Iterator[Any]:
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(",]") == "]":
+            return
@@ -0,0 +1,35 @@
+import datetime
+import json
+import threading
+from typing import Any, Dict, List
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+class JSONLinesFile:
+    """
+    附加寫入的 JSON lines 檔案。
+    每次 write() 只呼叫一次 f.write（append 模式），
+    多個 thread / process 寫同一個檔案也不會交錯。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def reset(self):
+        open(self.path, "w", encoding="utf-8").close()
+
+    def write(self, entries: List[Dict[str, Any]]):
+        if not entries:
+            return
+        lines = "".join(
+            json.dumps(e, ensure_ascii=False, default=_json_default) + "\n"
+            for e in entries
+        )
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
@@ -0,0 +1,238 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import ExtractYear
+
+from ..models import Location, LocationYearAvailability
+from ..obs_config import OBS_CONFIG
+from ..serializers import LocationMapSerializer
+from .bulk_upsert import bulk_upsert
+from .date_filters import year_filter
+
+AVAILABILITY_UNIQUE_FIELDS = ["location_id", "year", "obs_code"]
+
+YearKey = Tuple[str, int]  # (locationID, 年份)
+
+# 樣站列表的 (年份, 觀測項目) 組合由重建 task 全部預先算好；
+# 沒算到的（沒有資料的年份）在 API 現算，只 cache 一段時間，避免任意年份塞滿 cache
+MAP_LIST_MISS_CACHE_TIMEOUT = 60 * 60
+
+
+def location_year_keys(keys: Iterable[Tuple[str, Any]]) -> Set[YearKey]:
+    """
+    (locationID, 日期) → 涉及的 (locationID, 年份)，日期沿用 rollup_keys 的結果。
+    """
+    return {(location_id, date.year) for location_id, date in keys}
+
+
+def _year_rows(code: str, keys: Iterable[YearKey]) -> List[Dict[str, Any]]:
+    # 依 (樣站, 年份) 排序，並行匯入時各 transaction 以相同順序取得 row lock
+    return [
+        {"location_id": location_id, "year": year, "obs_code": code}
+        for location_id, year in sorted(keys)
+    ]
+
+
+def mark_location_years(code: str, keys: Iterable[YearKey]) -> int:
+    """
+    匯入用：把這批涉及的 (locationID, 年份) 標記為有資料，回傳新增的筆數。
+    只做 INSERT ... ON CONFLICT DO NOTHING，不讀原始資料；
+    匯入只會新增 / 更新資料，已經沒有資料的年份由 refresh_location_years 清除。
+    """
+    keys = {(loc, int(year)) for loc, year in keys if loc and year}
+    if not keys:
+        return 0
+    result = bulk_upsert(
+        LocationYearAvailability, _year_rows(code, keys), AVAILABILITY_UNIQUE_FIELDS
+    )
+    return result.inserted
+
+
+def refresh_location_years(code: str, keys: Optional[Iterable[YearKey]] = None) -> int:
+    """
+    從原始資料重算樣站各年份是否有資料，回傳有資料的 (樣站, 年份) 數。
+    每個觀測項目一個 DISTINCT (locationID, 年份) 查詢，供重建指令與 signals 使用。
+    - keys：只重算這些 (locationID, 年份)；None 代表整個觀測項目全部重建
+    - 已經沒有資料的 (樣站, 年份) 一併刪除
+    """
+    cfg = OBS_CONFIG[code]
+    date_field = cfg["date_field"]
+
+    source = cfg["model"].objects.filter(
+        locationID__isnull=False, **{f"{date_field}__isnull": False}
+    )
+    existing = LocationYearAvailability.objects.filter(obs_code=code)
+    if keys is not None:
+        keys = {(loc, int(year)) for loc, year in keys if loc and year}
+        if not keys:
+            return 0
+        # 每個 (樣站, 年份) 都是 (locationID, 日期) index 上的一段 range
+        q = Q()
+        for location_id, year in keys:
+            q |= Q(locationID=location_id) & year_filter(date_field, year)
+        source = source.filter(q)
+        existing = existing.filter(
+            location_id__in={loc for loc, _ in keys},
+            year__in={year for _, year in keys},
+        )
+
+    # 原始資料可能有 year 欄位，分組用的別名避開
+    found = set(
+        source.annotate(obs_year=ExtractYear(date_field))
+        .values_list("locationID", "obs_year")
+        .order_by()
+        .distinct()
+    )
+    with transaction.atomic():
+        stale = [
+            pk
+            for pk, location_id, year in existing.values_list(
+                "pk", "location_id", "year"
+            )
+            if (location_id, year) not in found
+            and (keys is None or (location_id, year) in keys)
+        ]
+        if stale:
+            LocationYearAvailability.objects.filter(pk__in=stale).delete()
+        bulk_upsert(
+            LocationYearAvailability,
+            _year_rows(code, found),
+            AVAILABILITY_UNIQUE_FIELDS,
+        )
+    return len(found)
+
+
+def item_obs_codes(item: Optional[str]) -> List[str]:
+    """
+    首頁地圖的 item 參數 → 觀測項目 code 列表（依 OBS_CONFIG 順序）。
+    item 可能是中文名稱，也可能是 code；都查不到時為空列表。
+    """
+    if not item:
+        return list(OBS_CONFIG.keys())
+    label_to_code = {cfg["label"]: code for code, cfg in OBS_CONFIG.items()}
+    # 先當作中文去查，查不到再當作 code 用
+    code = label_to_code.get(item, item)
+    return [code] if code in OBS_CONFIG else []
+
+
+MapListParams = Tuple[Optional[int], Optional[str]]  # (年份, 觀測項目 code)
+
+
+def location_map_list_params(
+    year: Optional[str], item: Optional[str]
+) -> Optional[MapListParams]:
+    """
+    year / item 參數正規化成 (年份, code)，作為 cache key；
+    中文名稱與 code 對應到同一個 key。年份沒帶或為空字串時不篩選年份；
+    年份不是正整數或 item 查不到時回傳 None（沒有資料）。
+    """
+    code = None
+    if item:
+        codes = item_obs_codes(item)
+        if not codes:
+            return None
+        code = codes[0]
+    if year is None or year == "":
+        return None, code
+    try:
+        year = int(year)
+    except ValueError:
+        return None
+    # year=0 不能落到「所有年份」的 key
+    if year <= 0:
+        return None
+    return year, code
+
+
+AvailabilityMap = Dict[str, Dict[int, Set[str]]]  # 樣站 → 年份 → 觀測項目 code
+
+
+def _availability_map(qs) -> AvailabilityMap:
+    years_map = defaultdict(lambda: defaultdict(set))
+    for location_id, y, code in qs.values_list("location_id", "year", "obs_code"):
+        years_map[location_id][y].add(code)
+    return years_map
+
+
+def _map_locations() -> List[Tuple[str, Dict[str, Any]]]:
+    locations = Location.objects.order_by("location_id").distinct("location_id")
+    return [(loc.location_id, LocationMapSerializer(loc).data) for loc in locations]
+
+
+def _map_list(
+    locations: List[Tuple[str, Dict[str, Any]]],
+    years_map: AvailabilityMap,
+    year: Optional[int],
+    code: Optional[str],
+) -> List[Dict[str, Any]]:
+    obs_codes = [code] if code is not None else list(OBS_CONFIG.keys())
+    result = []
+    for location_id, data in locations:
+        loc_years = {
+            y: codes
+            for y, codes in years_map.get(location_id, {}).items()
+            if (year is None or y == year) and (code is None or code in codes)
+        }
+        # 如果有帶 year / item，但這個站點完全沒有符合條件的資料 → 跳過
+        if (year is not None or code is not None) and not loc_years:
+            continue
+
+        base = dict(data)
+        base["years"] = {
+            str(y): [OBS_CONFIG[c]["label"] for c in obs_codes if c in codes]
+            for y, codes in sorted(loc_years.items())
+        }
+        result.append(base)
+    return result
+
+
+def location_map_list_data(
+    year: Optional[int] = None, code: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    首頁觀測地圖的樣站列表（參數見 location_map_list_params）：
+    每個樣站各年份有資料的觀測項目（中文名稱）。
+    - 不帶參數：所有樣站及其所有年份的觀測項目
+    - 帶 year / code：只留下符合條件、有資料的樣站
+    """
+    qs = LocationYearAvailability.objects.filter(obs_code__in=OBS_CONFIG.keys())
+    if year is not None:
+        qs = qs.filter(year=year)
+    if code is not None:
+        qs = qs.filter(obs_code=code)
+    return _map_list(_map_locations(), _availability_map(qs), year, code)
+
+
+def location_map_list_variants() -> Dict[MapListParams, List[Dict[str, Any]]]:
+    """
+    所有 (年份, 觀測項目) 組合的樣站列表，含不指定年份 / 觀測項目（None）。
+    彙總表與樣站各只讀一次，其餘在記憶體中組合。
+    """
+    years_map = _availability_map(
+        LocationYearAvailability.objects.filter(obs_code__in=OBS_CONFIG.keys())
+    )
+    locations = _map_locations()
+    years = sorted({y for loc_years in years_map.values() for y in loc_years})
+    return {
+        (year, code): _map_list(locations, years_map, year, code)
+        for year in [None, *years]
+        for code in [None, *OBS_CONFIG.keys()]
+    }
+
+
+def location_map_filter_data() -> Dict[str, List[str]]:
+    """
+    首頁觀測地圖的下拉選單：每個年份有資料的觀測項目（中文名稱）。
+    """
+    year_map = defaultdict(set)
+    rows = LocationYearAvailability.objects.values_list("year", "obs_code").distinct()
+    for year, code in rows:
+        if code in OBS_CONFIG:
+            year_map[year].add(code)
+
+    return {
+        str(year): [OBS_CONFIG[code]["label"] for code in sorted(obs_codes)]
+        for year, obs_codes in sorted(year_map.items())
+    }
@@ -0,0 +1,62 @@
+import threading
+from contextlib import ContextDecorator
+
+from django.core.cache import cache
+from django.db import transaction
+
+from ..tasks import rebuild_location_map_caches
+from .cache_keys import map_cache_rebuild_pending_key
+
+# 這段時間內的多次異動只會排一次重建
+REBUILD_DEBOUNCE_SECONDS = 30
+
+_local = threading.local()
+
+
+def schedule_map_cache_rebuild(countdown: int = REBUILD_DEBOUNCE_SECONDS) -> bool:
+    """
+    排一次首頁地圖 cache 重建。
+    已經有一次排程但 task 還沒開始時直接略過（debounce）；task 開始時會清掉標記。
+    回傳是否有真的送進 Celery。
+    """
+    # 標記多留一點時間，避免 worker 沒起來時永遠排不進去
+    if not cache.add(map_cache_rebuild_pending_key(), 1, timeout=countdown + 300):
+        return False
+    rebuild_location_map_caches.apply_async(countdown=countdown)
+    return True
+
+
+def request_map_cache_rebuild():
+    """
+    觀測資料 / 樣站有異動時呼叫。
+    在 defer_map_cache_rebuild() 範圍內只做標記，離開時合併成一次重建。
+    """
+    if getattr(_local, "depth", 0):
+        _local.changes = getattr(_local, "changes", 0) + 1
+        return
+    transaction.on_commit(schedule_map_cache_rebuild)
+
+
+class defer_map_cache_rebuild(ContextDecorator):
+    """
+    批次匯入、admin 批次操作時使用，暫停逐筆觸發 cache 重建。
+    可巢狀使用，以最外層離開時為準；中途失敗時已寫入的資料一樣會觸發重建。
+    .dirty 記錄這個範圍內是否有異動；schedule=False 時離開不排重建，
+    讓呼叫端（例如匯入的 worker process）自行回報給主程序。
+    """
+
+    def __init__(self, schedule: bool = True):
+        self.schedule = schedule
+        self.dirty = False
+
+    def __enter__(self):
+        _local.depth = getattr(_local, "depth", 0) + 1
+        self._changes_before = getattr(_local, "changes", 0)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.depth -= 1
+        self.dirty = getattr(_local, "changes", 0) > self._changes_before
+        if _local.depth == 0 and self.dirty and self.schedule:
+            schedule_map_cache_rebuild(countdown=0)
+        return False
@@ -0,0 +1,35 @@
+import threading
+from collections import defaultdict
+from typing import Any, Iterable, Tuple
+
+from django.db import transaction
+
+from .daily_rollup import refresh_daily_rollups
+from .location_years import refresh_location_years
+
+_local = threading.local()
+
+
+def queue_rollup_refresh(code: str, keys: Iterable[Tuple[str, Any]]):
+    """
+    逐筆異動觀測資料（signals）時呼叫：先收集涉及的 (locationID, 日期)，
+    transaction commit 後每個觀測項目只重算一次每日彙總與樣站年份。
+    QuerySet.delete() 等整批操作在同一個 transaction 內，不會逐筆重算。
+    """
+    pending = getattr(_local, "pending", None)
+    if pending is None:
+        pending = _local.pending = defaultdict(set)
+    pending[code].update((loc, date) for loc, date in keys if loc and date)
+    # 每筆都登記，但只有第一個 callback 會真的重算（其餘拿到空的）；
+    # transaction rollback 時留下的 keys 由下一次 commit 一併重算
+    transaction.on_commit(flush_rollup_refresh)
+
+
+def flush_rollup_refresh():
+    pending = getattr(_local, "pending", None)
+    _local.pending = None
+    if not pending:
+        return
+    for code, keys in pending.items():
+        refresh_daily_rollups(code, keys)
+        refresh_location_years(code, {(loc, date.year) for loc, date in keys})
@@ -0,0 +1,126 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import ImportCheckpoint, ImportRun, ImportSyncState
+
+
+def load_sync_states(model, resource_ids: Iterable[str]) -> Dict[str, ImportSyncState]:
+    qs = ImportSyncState.objects.filter(
+        model=model._meta.label, resource_id__in=list(resource_ids)
+    )
+    return {state.resource_id: state for state in qs}
+
+
+def resource_unchanged(state: ImportSyncState, res: Dict[str, Any]) -> bool:
+    """
+    上游 resource 的 last_modified / metadata_modified 與上次完整同步時相同。
+    CKAN 沒給修改時間時一律視為有變。
+    """
+    stamps = (res.get("last_modified"), res.get("metadata_modified"))
+    if not any(stamps):
+        return False
+    return (state.last_modified, state.metadata_modified) == stamps
+
+
+def save_sync_state(
+    model, res: Dict[str, Any], next_offset: int, complete: bool
+) -> ImportSyncState:
+    """
+    記錄同步進度。
+    - complete: 這次有抓到 resource 結尾；否則（例如有設 --max-records）
+      不記修改時間，下次才不會被當成沒變而跳過
+    """
+    defaults = {
+        "resource_name": res.get("name") or "",
+        "last_offset": next_offset,
+    }
+    if complete:
+        defaults.update(
+            last_modified=res.get("last_modified"),
+            metadata_modified=res.get("metadata_modified"),
+            row_count=next_offset,
+        )
+    else:
+        defaults.update(last_modified=None, metadata_modified=None)
+
+    state, _ = ImportSyncState.objects.update_or_create(
+        model=model._meta.label, resource_id=res["id"], defaults=defaults
+    )
+    return state
+
+
+def load_checkpoints(
+    model, resource_ids: Iterable[str]
+) -> Dict[str, List[ImportCheckpoint]]:
+    qs = ImportCheckpoint.objects.filter(
+        model=model._meta.label, resource_id__in=list(resource_ids)
+    ).order_by("resource_id", "range_start")
+    out: Dict[str, List[ImportCheckpoint]] = defaultdict(list)
+    for cp in qs:
+        out[cp.resource_id].append(cp)
+    return out
+
+
+def save_checkpoint(model, stats: Dict[str, Any]) -> None:
+    """
+    記錄一個區段的進度；需與該批資料的寫入在同一個 transaction 內呼叫，
+    中途中斷時兩者一起 rollback，--resume 重跑不會重複計數。
+    """
+    ImportCheckpoint.objects.update_or_create(
+        model=model._meta.label,
+        resource_id=stats["resource_id"],
+        range_start=stats["start"],
+        defaults={
+            "range_end": stats["end"],
+            "next_offset": stats["next_offset"],
+            "rows": stats["rows"],
+            "inserted": stats["inserted"],
+            "updated": stats["updated"],
+            "unchanged": stats["unchanged"],
+        },
+    )
+
+
+def save_checkpoints(model, shards: Iterable[Dict[str, Any]]) -> None:
+    """
+    分段同步開始前先記下每一段的 checkpoint。
+    分段要等第一批 commit 才會寫 checkpoint；還沒 commit 過的分段中斷後，
+    --resume 才不會漏掉它的 offset 區段。
+    """
+    with transaction.atomic():
+        for stats in shards:
+            save_checkpoint(model, stats)
+
+
+def clear_checkpoints(model, resource_id: str) -> None:
+    ImportCheckpoint.objects.filter(
+        model=model._meta.label, resource_id=resource_id
+    ).delete()
+
+
+def record_import_run(
+    model,
+    code: str,
+    started_at,
+    seconds: float,
+    error: Optional[str] = None,
+    **fields,
+) -> ImportRun:
+    """
+    存一筆匯入執行紀錄；rows_per_sec 依 rows / seconds 計算。
+    """
+    rows = fields.get("rows", 0)
+    return ImportRun.objects.create(
+        model=model._meta.label,
+        obs_code=code,
+        status=ImportRun.STATUS_FAILED if error else ImportRun.STATUS_SUCCESS,
+        started_at=started_at,
+        finished_at=timezone.now(),
+        seconds=seconds,
+        rows_per_sec=rows / seconds if seconds > 0 else 0,
+        error_message=error or "",
+        **fields,
+    )
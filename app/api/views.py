@@ -1,6 +1,5 @@
 import os
 import pytz
-from collections import defaultdict
 
 from core.base import BaseViewSet
 from django.core.cache import cache
@@ -14,9 +13,6 @@ from rest_framework.permissions import IsAuthenticated
 from django.http import FileResponse, Http404
 from django.utils import timezone
 
-from django.db.models import Count, Avg, Sum
-from django.db.models.functions import TruncDate
-
 from django_filters.rest_framework import DjangoFilterBackend
 
 
@@ -30,6 +26,13 @@ from .utils.cache_keys import (
 )
 from .utils.transform_segis_data import transform_pyramid
 from .utils.download import normalize_items_to_labels
+from .utils.chart_cache import CHART_FIELDS, cached_chart_rows, compare_stations
+from .utils.location_years import (
+    MAP_LIST_MISS_CACHE_TIMEOUT,
+    location_map_filter_data,
+    location_map_list_data,
+    location_map_list_params,
+)
 
 from .tasks import generate_download_zip
 
@@ -82,19 +85,12 @@ class PlantPhenologyChartView(APIView):
         location_id = params["locationID"]
         year = params.get("year")
 
-        qs = PlantPhenology.objects.filter(locationID=location_id)
-
-        if year is not None:
-            qs = qs.filter(eventDate__year=year)
-
-        qs = (
-            qs.annotate(date=TruncDate("eventDate"))
-            .values("date")
-            .annotate(species_count=Count("scientificName", distinct=True))
-            .order_by("date")
+        # 讀每日彙總表，結果依資料版本 cache（utils.chart_cache）
+        rows = cached_chart_rows(
+            "plantphenology", location_id, year, interval=params["interval"]
         )
 
-        serializer = PlantPhenologyChartSerializer(qs, many=True)
+        serializer = PlantPhenologyChartSerializer(rows, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -131,19 +127,12 @@ class CameratrapChartView(APIView):
         location_id = params["locationID"]
         year = params.get("year")
 
-        qs = Cameratrap.objects.filter(locationID=location_id)
-
-        if year is not None:
-            qs = qs.filter(eventDate__year=year)
-
-        qs = (
-            qs.annotate(date=TruncDate("eventDate"))
-            .values("date")
-            .annotate(species_count=Count("scientificName", distinct=True))
-            .order_by("date")
+        # 讀每日彙總表，結果依資料版本 cache（utils.chart_cache）
+        rows = cached_chart_rows(
+            "cameratrap", location_id, year, interval=params["interval"]
         )
 
-        serializer = CameratrapChartSerializer(qs, many=True)
+        serializer = CameratrapChartSerializer(rows, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -182,25 +171,17 @@ class TerreSoundChartView(APIView):
         location_id = params["locationID"]
         year = params.get("year")
 
-        qs = TerreSoundIndex.objects.filter(locationID=location_id)
-
-        if year is not None:
-            qs = qs.filter(measurementDeterminedDate__year=year)
-
-        # 依日期聚合，計算每天平均的 ACI / ADI / BI / NDSI
-        qs = (
-            qs.annotate(date=TruncDate("measurementDeterminedDate"))
-            .values("date")
-            .annotate(
-                aci=Avg("ACI"),
-                adi=Avg("ADI"),
-                bi=Avg("BI"),
-                ndsi=Avg("NDSI"),
-            )
-            .order_by("date")
+        # 讀每日彙總表，結果依資料版本 cache（utils.chart_cache）
+        rows = cached_chart_rows(
+            "terresoundindex",
+            location_id,
+            year,
+            interval=params["interval"],
+            max_points=params["max_points"],
+            downsample=params["downsample"],
         )
 
-        serializer = TerreSoundIndexChartSerializer(qs, many=True)
+        serializer = TerreSoundIndexChartSerializer(rows, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -237,18 +218,12 @@ class BirdnetSoundChartView(APIView):
         location_id = params["locationID"]
         year = params.get("year")
 
-        qs = BirdnetSound.objects.filter(locationID=location_id)
-
-        if year is not None:
-            qs = qs.filter(measurementDeterminedDate__year=year)
-
-        qs = (
-            qs.annotate(date=TruncDate("measurementDeterminedDate"))
-            .values("date")
-            .annotate(species_count=Count("scientificName", distinct=True))
+        # 讀每日彙總表，結果依資料版本 cache（utils.chart_cache）
+        rows = cached_chart_rows(
+            "birdnetsound", location_id, year, interval=params["interval"]
         )
 
-        serializer = BirdnetSoundChartSerializer(qs, many=True)
+        serializer = BirdnetSoundChartSerializer(rows, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -285,18 +260,12 @@ class BioSoundChartView(APIView):
         location_id = params["locationID"]
         year = params.get("year")
 
-        qs = BioSound.objects.filter(locationID=location_id)
-
-        if year is not None:
-            qs = qs.filter(measurementDeterminedDate__year=year)
-
-        qs = (
-            qs.annotate(date=TruncDate("measurementDeterminedDate"))
-            .values("date")
-            .annotate(species_count=Count("scientificName", distinct=True))
+        # 讀每日彙總表，結果依資料版本 cache（utils.chart_cache）
+        rows = cached_chart_rows(
+            "biosound", location_id, year, interval=params["interval"]
         )
 
-        serializer = BioSoundChartSerializer(qs, many=True)
+        serializer = BioSoundChartSerializer(rows, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -333,24 +302,70 @@ class WeatherChartView(APIView):
         location_id = params["locationID"]
         year = params.get("year")
 
-        qs = Weather.objects.filter(locationID=location_id)
+        # 讀每日彙總表，結果依資料版本 cache（utils.chart_cache）
+        rows = cached_chart_rows(
+            "weather",
+            location_id,
+            year,
+            interval=params["interval"],
+            max_points=params["max_points"],
+            downsample=params["downsample"],
+        )
 
-        if year is not None:
-            qs = qs.filter(eventDate__year=year)
+        serializer = WeatherChartSerializer(rows, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
-        # 依日期聚合，計算每天平均的氣溫 / 每天累積降雨量
-        qs = (
-            qs.annotate(date=TruncDate("eventDate"))
-            .values("date")
-            .annotate(
-                air_temperature=Avg("AirTemperature"),
-                precipitation=Sum("Precipitation"),
-            )
-            .order_by("date")
+
+class ObservationCompareChartView(APIView):
+    """
+    多樣站比較圖表：一次取得多個樣站、多個欄位的資料（單一分組查詢），
+    各樣站的序列對齊到共同的時間軸。
+    """
+
+    @swagger_auto_schema(
+        query_serializer=ObservationCompareChartQuerySerializer,
+        responses={
+            200: openapi.Response(
+                description=(
+                    "dates：共同的時間軸；"
+                    "series：{locationID: {欄位: [與 dates 對齊的值，缺值為 null]}}"
+                ),
+            ),
+            400: openapi.Response(
+                description="Bad Request",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={"detail": openapi.Schema(type=openapi.TYPE_STRING)},
+                ),
+            ),
+        },
+    )
+    def get(self, request, model):
+        fields = CHART_FIELDS.get(model)
+        if fields is None:
+            raise NotFound({"detail": f"未知的 model: {model}"})
+
+        query_serializer = ObservationCompareChartQuerySerializer(
+            data=request.query_params
         )
+        query_serializer.is_valid(raise_exception=True)
+        params = query_serializer.validated_data
 
-        serializer = WeatherChartSerializer(qs, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        metrics = params.get("metrics") or list(fields)
+        unknown = [name for name in metrics if name not in fields]
+        if unknown:
+            raise ValidationError(
+                {"metrics": f"未知的欄位：{', '.join(unknown)}（可用：{', '.join(fields)}）"}
+            )
+
+        data = compare_stations(
+            model,
+            params["locationID"],
+            metrics,
+            year=params.get("year"),
+            interval=params["interval"],
+        )
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class DataFieldViewSet(viewsets.ReadOnlyModelViewSet):
@@ -444,67 +459,22 @@ def location_map_list(request):
     """
     給首頁觀測地圖畫樣站點位
     """
-    OBS_LABEL_TO_CODE = {cfg["label"]: code for code, cfg in OBS_CONFIG.items()}
-
-    year = request.query_params.get("year")
-    item = request.query_params.get("item")
+    params = location_map_list_params(
+        request.query_params.get("year"), request.query_params.get("item")
+    )
+    if params is None:
+        # 年份不是數字或觀測項目不存在 → 沒資料
+        return Response([], status=status.HTTP_200_OK)
 
-    cache_key = location_map_list_key(year, item)
+    # 所有組合由 rebuild_location_map_list_cache 預先寫入，不過期，資料更新時重算
+    cache_key = location_map_list_key(*params)
     cached = cache.get(cache_key)
     if cached is not None:
         return Response(cached, status=status.HTTP_200_OK)
 
-    # item 可能是中文，也可能是 code
-    item_code = None
-    if item:
-        # 先當作中文去查，查不到再當作 code 用
-        item_code = OBS_LABEL_TO_CODE.get(item, item)
-
-    # 要使用的觀測項目 code 列表
-    if item_code:
-        # 如果傳來的 code 不在 OBS_CONFIG，就會變成空列表 → 沒資料
-        obs_codes = [item_code] if item_code in OBS_CONFIG else []
-    else:
-        obs_codes = list(OBS_CONFIG.keys())
-
-    locations = Location.objects.order_by("location_id").distinct("location_id")
-    result = []
-
-    for loc in locations:
-        base = LocationMapSerializer(loc).data
-        years_map = defaultdict(list)
-
-        for code in obs_codes:
-            cfg = OBS_CONFIG[code]
-            model = cfg["model"]
-            date_field = cfg["date_field"]
-
-            qs = model.objects.filter(locationID=loc.location_id)
-
-            if year:
-                qs = qs.filter(**{f"{date_field}__year": year})
-
-            if year:
-                # 只關心這一年：有資料就記錄一次
-                if qs.exists():
-                    y = int(year)
-                    years_map[y].append(cfg["label"])
-            else:
-                # 沒指定年份 → 把所有有資料的年份列出來
-                year_dates = qs.dates(date_field, "year", order="ASC")
-                for d in year_dates:
-                    y = d.year
-                    years_map[y].append(cfg["label"])
-
-        # 如果有帶 year / item，但這個站點完全沒有符合條件的資料 → 跳過
-        if year or item:
-            if not years_map:
-                continue
-
-        base["years"] = {str(y): items for y, items in sorted(years_map.items())}
-        result.append(base)
-
-        cache.set(cache_key, result, timeout=None)  # 不過期，等資料更新時再清掉或重算
+    # 由 (樣站, 年份, 觀測項目) 彙總表一次查出
+    result = location_map_list_data(*params)
+    cache.set(cache_key, result, timeout=MAP_LIST_MISS_CACHE_TIMEOUT)
 
     return Response(result, status=status.HTTP_200_OK)
 
@@ -587,21 +557,7 @@ def location_map_filter(request):
     if cached is not None:
         return Response(cached, status=status.HTTP_200_OK)
 
-    year_map = defaultdict(set)
-
-    for code, cfg in OBS_CONFIG.items():
-        model = cfg["model"]
-        date_field = cfg["date_field"]
-
-        year_dates = model.objects.dates(date_field, "year", order="ASC")
-        for d in year_dates:
-            year = d.year
-            year_map[year].add(code)
-
-    result = {
-        str(year): [OBS_CONFIG[code]["label"] for code in sorted(obs_codes)]
-        for year, obs_codes in sorted(year_map.items())
-    }
+    result = location_map_filter_data()
 
     cache.set(cache_key, result, timeout=None)
 
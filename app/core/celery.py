@@ -29,4 +29,9 @@ app.conf.beat_schedule = {
         "task": "api.tasks.cache_town_industry",
         "schedule": crontab(hour=2, minute=30),
     },
+    "sync-observations": {
+        "task": "api.tasks.sync_observations",
+        "schedule": crontab(hour=1, minute=0),  # 增量同步 CKAN 觀測資料
+        "kwargs": {"options": {"history": True}},
+    },
 }
@@ -0,0 +1,389 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.obs_config import OBS_CONFIG
+from api.utils.ckan import CKANError
+from api.utils.ckan_import import ImporterError, ObservationImporter, get_importer
+from api.utils.duplicates import DUPLICATE_POLICIES, ConflictReport, DuplicateKeyError
+from api.utils.map_cache import defer_map_cache_rebuild, request_map_cache_rebuild
+
+
+def _run_importer(importer: ObservationImporter, run_kwargs: Dict[str, Any]):
+    """
+    --all：在 thread 中同步一個觀測項目，回傳 (per_resource, error, dirty)。
+    """
+    per_resource: Dict[str, Dict[str, Any]] = {}
+    error: Optional[str] = None
+    # 由主 thread 統一排 cache 重建
+    with defer_map_cache_rebuild(schedule=False) as deferred:
+        try:
+            per_resource = importer.run(**run_kwargs)
+        except Exception as e:
+            error = str(e)
+        finally:
+            connections.close_all()
+    return per_resource, error, deferred.dirty
+
+
+class Command(BaseCommand):
+    help = (
+        "由 package_show 取得所有資源，再用 datastore_search 分批拉取，"
+        "每批以單一 INSERT ... ON CONFLICT 批次 upsert 到 OBS_CONFIG 對應的觀測資料 model。"
+    )
+
+    # import_weather 等舊指令繼承這個類別，固定觀測項目
+    obs_code: Optional[str] = None
+
+    def add_arguments(self, parser):
+        if self.obs_code is None:
+            parser.add_argument(
+                "code",
+                nargs="?",
+                choices=list(OBS_CONFIG.keys()),
+                help="觀測項目（OBS_CONFIG 的 key）",
+            )
+            parser.add_argument(
+                "--all",
+                action="store_true",
+                help="同步 CKAN_PACKAGE_IDS 有設定的所有觀測項目，各項目同時進行",
+            )
+        # 用 --from-dir 重播時不需要 package / resource，必填與否在 handle() 檢查
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument(
+            "--package-id",
+            help="CKAN package_id（先抓所有 resource，再逐一同步）",
+        )
+        group.add_argument(
+            "--resource-id",
+            help="直接指定單一 datastore resource_id（跳過 package_show）",
+        )
+
+        parser.add_argument(
+            "--unique-fields",
+            help=(
+                "以逗號分隔的自然鍵欄位（例如：eventID,dataID），"
+                "需對應模型上的 unique constraint；預設使用模型的自然鍵"
+            ),
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=1000,
+            help="每批抓取的筆數（limit；自動調整時為第一頁的筆數），預設 1000",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=int,
+            default=120,
+            help="HTTP 逾時秒數，預設 120",
+        )
+        parser.add_argument(
+            "--max-records",
+            type=int,
+            help="本次最多處理筆數（測試/保護用）；不設定代表抓全量",
+        )
+        parser.add_argument(
+            "--formats",
+            help="只同步指定格式的資源，多個以逗號分隔（例如 CSV,json）；預設不限制",
+        )
+        parser.add_argument(
+            "--include-non-datastore",
+            action="store_true",
+            help="包含非 datastore_active 的資源（預設不包含）",
+        )
+        parser.add_argument(
+            "--prefetch",
+            type=int,
+            default=0,
+            help="背景預先抓取的頁數，讓下載與寫入 DB 同時進行；預設 0（依序抓取）",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help=(
+                "同一個 resource 同時抓取的頁數（datastore_search 改用 offset 分頁，"
+                "等同 --paging offset --prefetch N）；適合上游延遲是瓶頸的 package。"
+                "package_show 仍一次一個 request，預設 1"
+            ),
+        )
+        parser.add_argument(
+            "--paging",
+            choices=("keyset", "offset"),
+            default="keyset",
+            help=(
+                "keyset：以 datastore_search_sql 的 _id > last 分頁，深處的頁面不會越抓越慢"
+                "（伺服器不支援時自動改用 offset）；預設 keyset"
+            ),
+        )
+        parser.add_argument(
+            "--target-latency",
+            type=float,
+            default=2.0,
+            help="依每頁耗時自動調整每頁筆數，目標秒數；0 代表固定使用 --limit，預設 2",
+        )
+        parser.add_argument(
+            "--max-limit",
+            type=int,
+            default=10000,
+            help="自動調整時每頁最多筆數，預設 10000",
+        )
+        parser.add_argument(
+            "--stream",
+            action="store_true",
+            help=(
+                "串流解析 CKAN 回應，邊下載邊逐筆產生 records，"
+                "每頁筆數調大（例如 --limit 50000）時記憶體也不會跟著變大"
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="每次寫入 DB 的筆數（一頁切成多批）；預設每頁一批，--stream 時 1000",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="以多個 process 平行同步各 resource（大 resource 依 offset 切段）；預設 1",
+        )
+        parser.add_argument(
+            "--shard-size",
+            type=int,
+            default=200000,
+            help="--workers > 1 時，單一 resource 每段的筆數，預設 200000",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="忽略同步紀錄，所有 resource 都從頭重新同步",
+        )
+        parser.add_argument(
+            "--append-only",
+            action="store_true",
+            help="上游 resource 只會往後新增資料：有更新時只抓上次同步位置之後的新資料",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="從上次中斷時各 resource 的 checkpoint 接續同步",
+        )
+        parser.add_argument(
+            "--bulk-load",
+            action="store_true",
+            help=(
+                "初次大量匯入：先以 COPY 灌進 unlogged staging table，"
+                "再一次合併進資料表（不寫 checkpoint）。"
+                "資料表是空的時會暫時移除次要索引，"
+                "期間整張表被鎖住（ACCESS EXCLUSIVE），所有讀取都要等到合併完成；"
+                "已有資料時保留索引，合併期間只有寫入會被擋住"
+            ),
+        )
+        parser.add_argument(
+            "--record",
+            metavar="DIR",
+            help="把抓到的 datastore_search 原始頁面另存為 gzip NDJSON（--all 時每個觀測項目一個子目錄）",
+        )
+        parser.add_argument(
+            "--from-dir",
+            metavar="DIR",
+            help="從 --record 錄下的目錄重播，不連線 CKAN（測試寫入效能、由快照重建資料庫）",
+        )
+        parser.add_argument(
+            "--on-duplicate",
+            choices=DUPLICATE_POLICIES,
+            default="last",
+            help=(
+                "同一批內自然鍵重複時：last 保留最後一筆、first 保留第一筆、"
+                "skip 整組不寫入、error 該 resource 同步失敗；預設 last"
+            ),
+        )
+        parser.add_argument(
+            "--conflict-report",
+            metavar="PATH",
+            help=(
+                "把重複的自然鍵寫成 JSON lines（批次內的重複，以及跨頁 / 跨 resource 的重複；"
+                "後者需記住本次所有的鍵）"
+            ),
+        )
+        parser.add_argument(
+            "--metrics",
+            metavar="PATH",
+            help=(
+                "每批附加一行 JSON 到 PATH：抓取 / 解析 / 轉型 / 寫入各階段耗時、"
+                "rows/sec 與依 CKAN total 估計的 ETA"
+            ),
+        )
+        parser.add_argument(
+            "--history",
+            action="store_true",
+            help="把這次執行的結果與各階段耗時存一筆到 ImportRun（追蹤匯入效能變化）",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="僅計算 insert/update，不寫入資料庫",
+        )
+
+    def build_importer(
+        self, code: str, opts: Dict[str, Any], log_prefix: str = ""
+    ) -> ObservationImporter:
+        unique_fields = None
+        if opts.get("unique_fields"):
+            unique_fields = [
+                x.strip() for x in opts["unique_fields"].split(",") if x.strip()
+            ]
+        try:
+            return get_importer(code)(
+                code,
+                unique_fields=unique_fields,
+                limit=opts["limit"],
+                timeout=opts["timeout"],
+                max_records=opts.get("max_records"),
+                dry_run=opts["dry_run"],
+                prefetch=opts["prefetch"],
+                workers=opts["workers"],
+                shard_size=opts["shard_size"],
+                full=opts["full"],
+                append_only=opts["append_only"],
+                resume=opts["resume"],
+                record_dir=opts.get("record"),
+                replay_dir=opts.get("from_dir"),
+                bulk_load=opts["bulk_load"],
+                paging=opts["paging"],
+                target_latency=opts["target_latency"],
+                max_limit=opts["max_limit"],
+                stream=opts["stream"],
+                batch_size=opts.get("batch_size"),
+                on_duplicate=opts["on_duplicate"],
+                conflict_report=opts.get("conflict_report"),
+                metrics=opts.get("metrics"),
+                history=opts["history"],
+                concurrency=opts["concurrency"],
+                stdout=self.stdout,
+                style=self.style,
+                log_prefix=log_prefix,
+            )
+        except ImporterError as e:
+            raise CommandError(str(e))
+
+    def handle(self, *args, **opts):
+        formats_opt = opts.get("formats")
+        formats: Optional[List[str]] = None
+        if formats_opt:
+            formats = [f.strip().upper() for f in formats_opt.split(",") if f.strip()]
+        if opts.get("conflict_report"):
+            # 每次執行重新產生報告（各觀測項目 / worker 之後都附加到同一個檔案）
+            ConflictReport(opts["conflict_report"]).reset()
+
+        if opts.get("all"):
+            if opts.get("code") or opts.get("package_id") or opts.get("resource_id"):
+                raise CommandError(
+                    "--all 不能與觀測項目、--package-id、--resource-id 同時使用"
+                )
+            return self.handle_all(opts, formats)
+
+        code = self.obs_code or opts.get("code")
+        if not code:
+            raise CommandError(
+                f"請指定觀測項目（{', '.join(OBS_CONFIG.keys())}）或使用 --all"
+            )
+        if not (
+            opts.get("package_id") or opts.get("resource_id") or opts.get("from_dir")
+        ):
+            raise CommandError("請提供 --package-id 或 --resource-id")
+
+        importer = self.build_importer(code, opts)
+        try:
+            per_resource = importer.run(
+                package_id=opts.get("package_id"),
+                resource_id=opts.get("resource_id"),
+                formats=formats,
+                include_non_datastore=opts["include_non_datastore"],
+            )
+        except (ImporterError, CKANError, DuplicateKeyError) as e:
+            raise CommandError(str(e))
+
+        failed = importer.report(per_resource)
+        if failed:
+            raise CommandError(
+                f"{len(failed)} resource(s) failed to sync; rerun with --resume to continue."
+            )
+
+    def handle_all(self, opts: Dict[str, Any], formats: Optional[List[str]]):
+        """
+        每個觀測項目一個 thread 同時同步（各自的 HTTP session 與 DB 連線），
+        全部結束後只重建一次地圖 cache。
+        """
+        if opts.get("from_dir"):
+            # 重播：以錄製目錄下有哪些觀測項目子目錄為準
+            packages = {
+                code: None
+                for code in OBS_CONFIG
+                if os.path.isdir(os.path.join(opts["from_dir"], code))
+            }
+            if not packages:
+                raise CommandError(f"{opts['from_dir']} 下沒有任何觀測項目的錄製資料")
+        else:
+            packages = {
+                code: package_id
+                for code, package_id in settings.CKAN_PACKAGE_IDS.items()
+                if package_id and code in OBS_CONFIG
+            }
+            if not packages:
+                raise CommandError(
+                    "沒有任何觀測項目設定 package_id（環境變數 CKAN_PACKAGE_<CODE>）"
+                )
+        self.stdout.write(f"Sync observation types: {', '.join(packages)}")
+
+        importers = {}
+        for code in packages:
+            code_opts = dict(opts)
+            for key in ("record", "from_dir"):
+                if opts.get(key):
+                    code_opts[key] = os.path.join(opts[key], code)
+            importers[code] = self.build_importer(
+                code, code_opts, log_prefix=f"[{code}] "
+            )
+
+        results = {}
+        with defer_map_cache_rebuild():
+            with ThreadPoolExecutor(
+                max_workers=len(importers), thread_name_prefix="import"
+            ) as pool:
+                futures = {
+                    code: pool.submit(
+                        _run_importer,
+                        importer,
+                        {
+                            "package_id": packages[code],
+                            "formats": formats,
+                            "include_non_datastore": opts["include_non_datastore"],
+                        },
+                    )
+                    for code, importer in importers.items()
+                }
+                for code, future in futures.items():
+                    results[code] = future.result()
+                    if results[code][2]:
+                        request_map_cache_rebuild()
+
+        failed = []
+        for code, (per_resource, error, _) in results.items():
+            importer = importers[code]
+            if error:
+                importer.write(f"FAILED: {error}", self.style.ERROR)
+                failed.append(code)
+                continue
+            if importer.report(per_resource):
+                failed.append(code)
+
+        if failed:
+            raise CommandError(
+                f"Failed to sync: {', '.join(failed)}; rerun with --resume to continue."
+            )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.obs_config import OBS_CONFIG
+from api.utils.daily_rollup import refresh_daily_rollups
+from api.utils.location_years import refresh_location_years
+
+
+class Command(BaseCommand):
+    help = (
+        "由原始觀測資料全部重建圖表用的每日彙總（ObservationDailyRollup）"
+        "與首頁地圖用的樣站年份（LocationYearAvailability）。"
+        "平常由匯入引擎逐日更新，只有初次部署或資料被直接改動時需要執行；"
+        "匯入只新增樣站年份，資料的樣站或日期被改掉後留下的空年份也在此清除。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "codes",
+            nargs="*",
+            help=f"觀測項目（{', '.join(OBS_CONFIG.keys())}），未指定時全部重建",
+        )
+
+    def handle(self, *args, **opts):
+        codes = opts["codes"] or list(OBS_CONFIG.keys())
+        unknown = [code for code in codes if code not in OBS_CONFIG]
+        if unknown:
+            raise CommandError(f"未知的觀測項目：{', '.join(unknown)}")
+
+        for code in codes:
+            days = refresh_daily_rollups(code)
+            self.stdout.write(f"[{code}] daily rollups rebuilt: {days} day(s)")
+            years = refresh_location_years(code)
+            self.stdout.write(f"[{code}] location years rebuilt: {years} row(s)")
@@ -228,3 +228,13 @@ FRONTEND_BASE_URL = "https://ltsertw-alishan.org"
 
 SEGIS_API_ID = os.getenv("SEGIS_API_ID")
 SEGIS_API_KEY = os.getenv("SEGIS_API_KEY")
+
+# CKAN（depositar）上各觀測項目的 package_id，import_observations --all 使用
+CKAN_PACKAGE_IDS = {
+    "plantphenology": os.getenv("CKAN_PACKAGE_PLANTPHENOLOGY"),
+    "cameratrap": os.getenv("CKAN_PACKAGE_CAMERATRAP"),
+    "terresoundindex": os.getenv("CKAN_PACKAGE_TERRESOUNDINDEX"),
+    "birdnetsound": os.getenv("CKAN_PACKAGE_BIRDNETSOUND"),
+    "biosound": os.getenv("CKAN_PACKAGE_BIOSOUND"),
+    "weather": os.getenv("CKAN_PACKAGE_WEATHER"),
+}